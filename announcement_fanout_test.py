@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Announcement Fan-out Test
+Starts a local SMTP sink and its own backend sending mail through it, seeds subscribers,
+posts an urgent announcement and kills the backend with SIGKILL partway through the
+fan-out. After a restart the reclaimed fan-out task has to resume from its checkpoint:
+every subscriber gets the announcement, at most one batch (FANOUT_BATCH_SIZE) is sent
+twice, the progress counters add up, and every email carries a working one-click
+List-Unsubscribe link.
+
+Needs a reachable MongoDB and the backend's requirements installed. The test uses a
+throwaway database (dropped at the end unless KEEP_DB=true). TASK_LEASE_SECONDS is
+lowered so the killed backend's fan-out task can be reclaimed within seconds.
+
+Usage: python announcement_fanout_test.py [subscribers]
+"""
+
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from email import message_from_bytes
+from pathlib import Path
+
+import bcrypt
+import requests
+from pymongo import MongoClient
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("TEST_DB_NAME", f"fanout_test_{uuid.uuid4().hex[:8]}")
+BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8013"))
+BACKEND_URL = f"http://127.0.0.1:{BACKEND_PORT}/api"
+BACKEND_DIR = Path(__file__).resolve().parent / "backend"
+ADMIN_EMAIL = "fanout-admin@loadtest.example.com"
+ADMIN_PASSWORD = uuid.uuid4().hex
+BRAND_ID = "load-test"
+BATCH_SIZE = 50
+LEASE_SECONDS = 6
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Accepts every message and keeps it, enough of SMTP for smtplib without STARTTLS or AUTH"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.messages = []
+        self.lock = threading.Lock()
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 sink ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif command.startswith("MAIL FROM"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT TO"):
+                recipients.append(line.decode().split(":", 1)[1].strip().strip("<>").lower())
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = []
+                for data_line in iter(self.rfile.readline, b""):
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    data.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                with self.server.lock:
+                    self.server.messages.append((recipients, message_from_bytes(b"".join(data))))
+                self.reply("250 OK queued")
+            elif command in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+def start_backend(smtp_port):
+    env = {
+        **os.environ,
+        "MONGO_URL": MONGO_URL,
+        "DB_NAME": DB_NAME,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_STARTTLS": "false",
+        "SMTP_USERNAME": "",
+        "ANNOUNCEMENT_FANOUT": "urgent",
+        "FANOUT_BATCH_SIZE": str(BATCH_SIZE),
+        "FANOUT_RATE_PER_SECOND": "100",
+        "PUBLIC_API_URL": f"http://127.0.0.1:{BACKEND_PORT}",
+        "TASK_WORKERS_ENABLED": "true",
+        "TASK_LEASE_SECONDS": str(LEASE_SECONDS),
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(BACKEND_PORT)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            if requests.get(f"{BACKEND_URL}/brands", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Backend did not become ready within 60s")
+
+def seed(db, subscribers):
+    now = datetime.now(timezone.utc).isoformat()
+    db.admins.insert_one({
+        "id": str(uuid.uuid4()),
+        "email": ADMIN_EMAIL,
+        "password_hash": bcrypt.hashpw(ADMIN_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8"),
+        "role": "admin",
+        "created_at": now,
+    })
+    db.subscribers.insert_many([
+        {"id": str(uuid.uuid4()), "email": f"subscriber{i}@loadtest.example.com", "phone": None, "brand_id": BRAND_ID, "created_at": now}
+        for i in range(subscribers)
+    ])
+
+def login():
+    response = requests.post(f"{BACKEND_URL}/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}, timeout=10)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+def main():
+    subscribers = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    sink = SMTPSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    db = MongoClient(MONGO_URL)[DB_NAME]
+    print(f"🔍 Announcement fan-out test: {subscribers} subscribers, batches of {BATCH_SIZE}, database {DB_NAME}")
+    backend = None
+
+    try:
+        seed(db, subscribers)
+        backend = start_backend(sink.server_address[1])
+        response = requests.post(f"{BACKEND_URL}/announcements", headers=login(), json={
+            "title": "Fan-out test", "content": "Service moved to 11am.", "is_urgent": True, "brand_id": BRAND_ID
+        }, timeout=10)
+        response.raise_for_status()
+        announcement_id = response.json()["id"]
+
+        print("🔍 Killing the backend mid fan-out...")
+        deadline = time.time() + 60
+        while len(sink.messages) < subscribers // 3 and time.time() < deadline:
+            time.sleep(0.05)
+        backend.kill()
+        backend.wait()
+        sent_before_kill = len(sink.messages)
+        checkpoint = db.announcement_fanouts.find_one({"announcement_id": announcement_id}) or {}
+        interrupted = 0 < sent_before_kill < subscribers and checkpoint.get("status") == "running"
+        print(f"   {'✅' if interrupted else '❌'} Killed after {sent_before_kill} emails, "
+              f"checkpoint at {checkpoint.get('sent')} sent, status {checkpoint.get('status')}")
+
+        print(f"🔍 Restarting; the fan-out resumes once its {LEASE_SECONDS}s lease expires...")
+        backend = start_backend(sink.server_address[1])
+        headers = login()
+        progress = {}
+        deadline = time.time() + LEASE_SECONDS + 120
+        while time.time() < deadline:
+            progress = requests.get(f"{BACKEND_URL}/announcements/{announcement_id}/fanout", headers=headers, timeout=10).json()
+            if progress.get("status") == "completed":
+                break
+            time.sleep(0.5)
+        completed = progress.get("status") == "completed" and progress.get("sent") == subscribers and progress.get("failed") == 0
+        print(f"   {'✅' if completed else '❌'} Fan-out {progress.get('status')}: {progress.get('sent')}/{progress.get('total')} sent, {progress.get('failed')} failed")
+
+        received = Counter(recipient for recipients, _ in sink.messages for recipient in recipients)
+        missing = subscribers - len(received)
+        resent = sum(count - 1 for count in received.values())
+        delivered = missing == 0 and resent <= BATCH_SIZE
+        print(f"   {'✅' if delivered else '❌'} {len(received)}/{subscribers} subscribers reached, {resent} emails sent twice (at most {BATCH_SIZE} allowed)")
+
+        links = [message["List-Unsubscribe"] for _, message in sink.messages]
+        one_click = all(message["List-Unsubscribe-Post"] == "List-Unsubscribe=One-Click" for _, message in sink.messages)
+        headers_ok = all(link and link.startswith("<http") for link in links) and one_click
+        print(f"   {'✅' if headers_ok else '❌'} Every email has List-Unsubscribe and List-Unsubscribe-Post headers")
+
+        print("🔍 One-click unsubscribe through the List-Unsubscribe link...")
+        recipients, message = sink.messages[0]
+        response = requests.post(message["List-Unsubscribe"].strip("<>"), data="List-Unsubscribe=One-Click", timeout=10)
+        unsubscribed = response.status_code == 200 and db.subscribers.count_documents({"email": recipients[0]}) == 0
+        print(f"   {'✅' if unsubscribed else '❌'} Unsubscribe answered {response.status_code}, {recipients[0]} removed from the mailing list")
+    finally:
+        if backend is not None and backend.poll() is None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        sink.shutdown()
+        if os.environ.get("KEEP_DB", "false").lower() != "true":
+            db.client.drop_database(DB_NAME)
+
+    if interrupted and completed and delivered and headers_ok and unsubscribed:
+        print("🎉 ANNOUNCEMENT FAN-OUT TEST PASSED")
+        return 0
+    print("⚠️  ANNOUNCEMENT FAN-OUT TEST FAILED")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for read routes.
+
+Compares FastAPI's standard response path (revalidate against response_model,
+jsonable encode, stdlib json) with the ModelSerializer fast path used by the
+read routes in server.py.
+
+Usage: python benchmark_serialization.py [documents] [repeats]
+"""
+
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from server import (
+    Event, Ministry, Announcement, SermonMessage, Testimonial,
+    event_serializer, ministry_serializer, announcement_serializer,
+    sermon_serializer, testimonial_serializer,
+)
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+def make_event(i):
+    return {"id": str(uuid.uuid4()), "title": f"Revival Night {i}", "description": "Worship and teaching " * 10,
+            "date": "2025-11-02", "time": "18:00", "location": "Main Sanctuary", "is_free": True,
+            "image_url": "https://images.unsplash.com/photo-1?w=1920", "brand_id": "ndm", "created_at": now()}
+
+def make_ministry(i):
+    return {"id": str(uuid.uuid4()), "title": f"Ministry {i}", "description": "Serving our community " * 10,
+            "image_url": None, "brand_id": "ndm", "created_at": now()}
+
+def make_announcement(i):
+    return {"id": str(uuid.uuid4()), "title": f"Announcement {i}", "content": "Please join us " * 20,
+            "is_urgent": i % 10 == 0, "scheduled_start": None, "scheduled_end": None, "brand_id": "ndm", "created_at": now()}
+
+def make_sermon(i):
+    return {"id": str(uuid.uuid4()), "title": f"Sermon {i}", "description": "A message of faith " * 10,
+            "speaker": "Ps. Nehemiah David", "date": "2025-10-12", "media_type": "video",
+            "media_url": "https://www.youtube.com/watch?v=ToQZD74z6vs", "thumbnail_url": None,
+            "transcript": "And the Lord said " * 200, "brand_id": "ndm", "created_at": now()}
+
+def make_testimonial(i):
+    return {"id": str(uuid.uuid4()), "name": f"Member {i}", "content": "God has been faithful " * 15,
+            "image_url": None, "featured": i % 5 == 0, "brand_id": "ndm", "created_at": now()}
+
+ROUTES = [
+    ("GET /api/events", Event, event_serializer, make_event),
+    ("GET /api/ministries", Ministry, ministry_serializer, make_ministry),
+    ("GET /api/announcements", Announcement, announcement_serializer, make_announcement),
+    ("GET /api/sermons", SermonMessage, sermon_serializer, make_sermon),
+    ("GET /api/testimonials", Testimonial, testimonial_serializer, make_testimonial),
+]
+
+async def standard_path(field, docs):
+    content = await serialize_response(field=field, response_content=docs, is_coroutine=True)
+    return JSONResponse(content).body
+
+def best_of(repeats, fn):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    loop = asyncio.new_event_loop()
+
+    print(f"📊 Serialization time for {documents} documents (best of {repeats})")
+    print(f"{'route':<26}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}")
+    for route, model, serializer, factory in ROUTES:
+        docs = [factory(i) for i in range(documents)]
+        field = create_response_field(name="Response", type_=List[model])
+        before = best_of(repeats, lambda: loop.run_until_complete(standard_path(field, docs)))
+        after = best_of(repeats, lambda: serializer.many(docs).body)
+        print(f"{route:<26}{before * 1000:>14.2f}{after * 1000:>14.2f}{before / after:>9.1f}x")
+    loop.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Image derivative rendering.
+
+Runs inside the image pipeline's process pool, so it only depends on Pillow and
+the standard library and stays cheap to import in a spawned worker.
+"""
+
+import base64
+import io
+import json
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps, features
+
+IMAGE_WIDTHS = (320, 640, 960, 1280, 1920)
+PLACEHOLDER_WIDTH = 16
+QUALITY = {"avif": 50, "webp": 75, "jpeg": 80}
+
+class UnsupportedImage(ValueError):
+    """The original is not an image Pillow can decode"""
+
+def supported_formats():
+    formats = ["webp", "jpeg"]
+    try:
+        if features.check("avif"):
+            formats.insert(0, "avif")
+    except ValueError:
+        pass  # Pillow builds that predate AVIF do not know the feature name
+    return formats
+
+FORMATS = supported_formats()
+
+def _write_atomic(path: Path, image: Image.Image, fmt: str):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")  # another process may render the same original
+    options = {"quality": QUALITY[fmt]}
+    if fmt == "jpeg":
+        options.update(optimize=True, progressive=True)
+    image.save(tmp, format=fmt.upper(), **options)
+    os.replace(tmp, path)
+
+def render_variants(original: bytes, out_dir: str) -> dict:
+    """Write resized AVIF/WebP/JPEG copies of `original` into out_dir and return its manifest.
+
+    Widths above the original's are skipped (the original width is used when it is
+    narrower than the smallest one). The manifest is written last, so its presence
+    means every variant is complete.
+    """
+    out = Path(out_dir)
+    manifest_path = out / "manifest.json"
+    if manifest_path.exists():
+        return json.loads(manifest_path.read_text())
+
+    try:
+        with Image.open(io.BytesIO(original)) as source:
+            image = ImageOps.exif_transpose(source)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:  # undecodable or truncated data
+        raise UnsupportedImage(str(e)) from None
+    width, height = image.size
+    out.mkdir(parents=True, exist_ok=True)
+    widths = [w for w in IMAGE_WIDTHS if w <= width] or [width]
+
+    files = {fmt: [] for fmt in FORMATS}
+    for w in widths:
+        resized = image if w == width else image.resize((w, round(height * w / width)), Image.LANCZOS)
+        for fmt in FORMATS:
+            variant = resized.convert("RGB") if fmt == "jpeg" else resized
+            name = f"{w}.{'jpg' if fmt == 'jpeg' else fmt}"
+            _write_atomic(out / name, variant, fmt)
+            files[fmt].append([w, name])
+
+    tiny = image.convert("RGB").resize((PLACEHOLDER_WIDTH, max(1, round(height * PLACEHOLDER_WIDTH / width))), Image.BILINEAR)
+    buffer = io.BytesIO()
+    tiny.save(buffer, format="WEBP", quality=30)
+    manifest = {
+        "width": width,
+        "height": height,
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+        "files": files,
+    }
+    tmp = manifest_path.with_name(f".manifest.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, manifest_path)
+    return manifest
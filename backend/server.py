@@ -1,27 +1,66 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import PlainTextResponse, HTMLResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import PyMongoError, DuplicateKeyError, BulkWriteError
 import os
 import logging
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import time
+import re
+import html
+import math
+import random
+import bisect
+import unicodedata
+import mimetypes
+import stat
+import email.policy
+import email.utils
+import smtplib
+import queue
+import threading
+import shutil
+import fcntl
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from email.message import EmailMessage
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter
 from typing import List, Optional, Dict
 import uuid
 from datetime import datetime, timezone, timedelta
 import bcrypt
 import jwt
+import httpx
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+from imaging import render_variants, UnsupportedImage
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
 # JWT Configuration
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = "HS256"
@@ -35,6 +74,286 @@ security = HTTPBearer()
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+# ========== METRICS ==========
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+EVENT_LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metrics:
+    """Process-wide counters, gauges and histograms, rendered in the Prometheus text exposition format at /metrics.
+
+    Recording takes no lock: each thread (the event loop, the bcrypt and SMTP pools, the Mongo
+    driver's threads) writes to its own shard and render() sums the shards. Gauges changed with
+    inc() are summed the same way; set_gauge() keeps the last value written.
+    """
+
+    def __init__(self):
+        self._help: Dict[str, str] = {}
+        self._kinds: Dict[str, str] = {}
+        self._buckets: Dict[str, tuple] = {}
+        self._gauges: Dict[tuple, float] = {}
+        self._collectors: list = []
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()  # only taken the first time a thread records
+
+    def describe(self, name: str, help_text: str, kind: str = "counter", buckets: tuple = LATENCY_BUCKETS):
+        self._help[name] = help_text
+        self._kinds[name] = kind
+        if kind == "histogram":
+            self._buckets[name] = tuple(buckets)
+
+    def add_collector(self, collect):
+        """Call collect(samples) on every scrape, e.g. to set gauges derived from the summed samples"""
+        self._collectors.append(collect)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        shard[key] = shard.get(key, 0.0) + value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self._buckets[name]
+        shard = self._shard()
+        key = (name, tuple(sorted(labels.items())))
+        counts = shard.get(key)
+        if counts is None:
+            # one count per bucket plus +Inf, then the running sum
+            counts = shard[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def samples(self) -> Dict[tuple, object]:
+        merged: Dict[tuple, object] = {}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                if isinstance(value, list):
+                    total = merged.get(key)
+                    merged[key] = [a + b for a, b in zip(total, value)] if total else list(value)
+                else:
+                    merged[key] = merged.get(key, 0.0) + value
+        return merged
+
+    @staticmethod
+    def _sample(name: str, labels: tuple, value) -> str:
+        if not labels:
+            return f"{name} {value}"
+        label_str = ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels)
+        return f"{name}{{{label_str}}} {value}"
+
+    def render(self) -> str:
+        merged = self.samples()
+        for collect in self._collectors:
+            collect(merged)
+        merged.update(self._gauges)
+        by_name: Dict[str, list] = {}
+        for (name, labels), value in sorted(merged.items(), key=lambda item: item[0]):
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for name, samples in by_name.items():
+            kind = self._kinds.get(name, "counter")
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(self._sample(name, labels, value))
+                    continue
+                cumulative = 0
+                for bound, count in zip(self._buckets[name] + (None,), value[:-1]):
+                    cumulative += count
+                    lines.append(self._sample(f"{name}_bucket", labels + (("le", "+Inf" if bound is None else bound),), cumulative))
+                lines.append(self._sample(f"{name}_sum", labels, value[-1]))
+                lines.append(self._sample(f"{name}_count", labels, cumulative))
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+metrics.describe("http_request_duration_seconds", "Request latency by method, route template and status", kind="histogram")
+metrics.describe("http_requests_in_flight", "Requests currently being handled", kind="gauge")
+metrics.describe("mongo_command_duration_seconds", "MongoDB command latency by collection and command", kind="histogram", buckets=FAST_LATENCY_BUCKETS)
+metrics.describe("mongo_command_failures_total", "MongoDB commands that failed, by collection and command")
+metrics.describe("event_loop_lag_seconds", "How late the event loop woke a periodic timer", kind="histogram", buckets=FAST_LATENCY_BUCKETS)
+
+class MetricsMiddleware:
+    """Times every request by route template (not raw path, to keep label cardinality bounded)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.inc("http_requests_in_flight")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.inc("http_requests_in_flight", -1)
+            # The router stores the matched route in the shared scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe(
+                "http_request_duration_seconds", time.perf_counter() - started,
+                method=scope["method"], route=route, status=str(status_code)
+            )
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Driver command listener; runs on whichever thread the driver uses for the command"""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else "-"
+
+    def _record(self, event) -> str:
+        collection = self._collections.pop((event.connection_id, event.request_id), "-")
+        metrics.observe(
+            "mongo_command_duration_seconds", event.duration_micros / 1e6,
+            collection=collection, command=event.command_name
+        )
+        return collection
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        collection = self._record(event)
+        metrics.inc("mongo_command_failures_total", collection=collection, command=event.command_name)
+
+async def monitor_event_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+        metrics.observe("event_loop_lag_seconds", max(0.0, loop.time() - started - EVENT_LOOP_LAG_INTERVAL_SECONDS))
+
+_event_loop_monitor: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    global _event_loop_monitor
+    _event_loop_monitor = asyncio.create_task(monitor_event_loop_lag())
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    if _event_loop_monitor is not None:
+        _event_loop_monitor.cancel()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# MongoDB connection
+mongo_url = os.environ['MONGO_URL']
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()])
+db = client[os.environ['DB_NAME']]
+
+# ========== BACKGROUND HELPERS ==========
+
+_background_tasks: set = set()
+
+def spawn_background(coro, name: str = "background task") -> asyncio.Task:
+    """Run a coroutine detached from the request, keeping a reference and logging failures"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+
+    def _done(t: asyncio.Task):
+        _background_tasks.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.error(f"{name} failed: {t.exception()}")
+
+    task.add_done_callback(_done)
+    return task
+
+# ========== CACHING HELPERS ==========
+
+metrics.describe("cache_requests_total", "In-process cache lookups by cache and result")
+metrics.describe("singleflight_coalesced_total", "Calls that joined an identical call already in flight")
+metrics.describe("cache_hit_ratio", "Share of in-process cache lookups served from the cache, since start", kind="gauge")
+
+def collect_cache_hit_ratios(samples: dict):
+    lookups: Dict[str, Dict[str, float]] = {}
+    for (name, labels), value in samples.items():
+        if name == "cache_requests_total":
+            labels = dict(labels)
+            lookups.setdefault(labels["cache"], {})[labels["result"]] = value
+    for cache, results in lookups.items():
+        metrics.set_gauge("cache_hit_ratio", results.get("hit", 0.0) / sum(results.values()), cache=cache)
+
+metrics.add_collector(collect_cache_hit_ratios)
+
+class TTLCache:
+    """In-process cache with per-entry expiry and an LRU bound"""
+
+    def __init__(self, name: str, ttl: float, max_entries: int = 10000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            metrics.inc("cache_requests_total", cache=self.name, result="miss")
+            return default
+        metrics.inc("cache_requests_total", cache=self.name, result="hit")
+        return entry[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[object, asyncio.Task] = {}
+
+    async def do(self, key, coro_factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            metrics.inc("singleflight_coalesced_total", flight=self.name)
+        # shield: one caller going away must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
 # ========== MODELS ==========
 
 class Admin(BaseModel):
@@ -79,6 +398,15 @@ class BrandCreate(BaseModel):
     service_times: Optional[str] = None
     location: Optional[str] = None
 
+class ImageVariants(BaseModel):
+    """Resized copies of an image; srcset maps avif/webp/jpeg to a ready-made srcset attribute value"""
+    key: str  # sha256 of the original
+    width: int
+    height: int
+    placeholder: str  # tiny data: URI to show while the image loads
+    src: str  # largest JPEG, for clients without srcset support
+    srcset: Dict[str, str] = {}
+
 class Event(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -89,6 +417,9 @@ class Event(BaseModel):
     location: str
     is_free: bool = True
     image_url: Optional[str] = None
+    image_variants: Optional[ImageVariants] = None
+    capacity: Optional[int] = None  # seats including guests; None means unlimited
+    seats_taken: int = 0
     brand_id: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
@@ -100,6 +431,7 @@ class EventCreate(BaseModel):
     location: str
     is_free: bool = True
     image_url: Optional[str] = None
+    capacity: Optional[int] = None
     brand_id: str
 
 class EventAttendee(BaseModel):
@@ -111,6 +443,8 @@ class EventAttendee(BaseModel):
     phone: Optional[str] = None
     guests: int = 1
     notes: Optional[str] = None
+    status: str = "registered"  # registered, waitlisted, cancelled
+    waitlist_position: Optional[int] = None
     brand_id: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
@@ -129,6 +463,7 @@ class Ministry(BaseModel):
     title: str
     description: str
     image_url: Optional[str] = None
+    image_variants: Optional[ImageVariants] = None
     brand_id: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
@@ -298,6 +633,7 @@ class Gallery(BaseModel):
     title: str
     description: Optional[str] = None
     image_url: str
+    image_variants: Optional[ImageVariants] = None
     event_id: Optional[str] = None
     brand_id: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
@@ -420,7 +756,9 @@ class Foundation(BaseModel):
     title: str
     description: str
     image_url: str
+    image_variants: Optional[ImageVariants] = None
     gallery_images: List[str] = []
+    gallery_image_variants: List[Optional[ImageVariants]] = []  # parallel to gallery_images
     goal_amount: Optional[float] = None
     raised_amount: float = 0.0
     is_active: bool = True
@@ -465,6 +803,7 @@ class PageBanner(BaseModel):
     title: str
     subtitle: Optional[str] = None
     image_url: str
+    image_variants: Optional[ImageVariants] = None
     is_active: bool = True
     brand_id: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
@@ -485,13 +824,98 @@ class PageBannerUpdate(BaseModel):
     image_url: Optional[str] = None
     is_active: Optional[bool] = None
 
+# ========== FAST JSON RESPONSES ==========
+
+# Set FAST_JSON_TRUSTED=false to fully revalidate read responses through a prebuilt TypeAdapter
+FAST_JSON_TRUSTED = os.environ.get('FAST_JSON_TRUSTED', 'true').lower() == 'true'
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson when available"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class ModelSerializer:
+    """Prebuilt read path for one API model.
+
+    Documents this API wrote itself already match the model, so instead of letting FastAPI
+    revalidate them against response_model we project exactly the model's fields in Mongo,
+    fill in plain defaults for rows written before a field existed, and encode once.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        self.defaults = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        self.adapter = TypeAdapter(model)
+        self.list_adapter = TypeAdapter(List[model])
+
+    def one(self, doc: dict) -> Response:
+        if FAST_JSON_TRUSTED:
+            return FastJSONResponse({**self.defaults, **doc})
+        return Response(self.adapter.dump_json(self.adapter.validate_python(doc)), media_type="application/json")
+
+    def many(self, docs: List[dict]) -> Response:
+        if FAST_JSON_TRUSTED:
+            defaults = self.defaults
+            return FastJSONResponse([{**defaults, **doc} for doc in docs])
+        return Response(self.list_adapter.dump_json(self.list_adapter.validate_python(docs)), media_type="application/json")
+
+brand_serializer = ModelSerializer(Brand)
+event_serializer = ModelSerializer(Event)
+attendee_serializer = ModelSerializer(EventAttendee)
+ministry_serializer = ModelSerializer(Ministry)
+announcement_serializer = ModelSerializer(Announcement)
+volunteer_serializer = ModelSerializer(VolunteerApplication)
+subscriber_serializer = ModelSerializer(Subscriber)
+contact_serializer = ModelSerializer(ContactMessage)
+sermon_serializer = ModelSerializer(SermonMessage)
+testimonial_serializer = ModelSerializer(Testimonial)
+prayer_serializer = ModelSerializer(PrayerRequest)
+donation_serializer = ModelSerializer(Donation)
+gallery_serializer = ModelSerializer(Gallery)
+user_serializer = ModelSerializer(User)
+giving_category_serializer = ModelSerializer(GivingCategory)
+live_stream_serializer = ModelSerializer(LiveStream)
+foundation_serializer = ModelSerializer(Foundation)
+page_banner_serializer = ModelSerializer(PageBanner)
+
 # ========== AUTH UTILITIES ==========
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+metrics.describe("bcrypt_pool_wait_seconds", "Time bcrypt calls waited for a free bcrypt thread", kind="histogram", buckets=FAST_LATENCY_BUCKETS)
+metrics.describe("bcrypt_duration_seconds", "Time spent hashing or checking a password", kind="histogram")
+
+# Its own pool, so a burst of logins neither blocks the event loop nor queues behind other to_thread work
+bcrypt_executor = ThreadPoolExecutor(BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+async def run_bcrypt(operation: str, fn, *args):
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        metrics.observe("bcrypt_pool_wait_seconds", started - submitted, operation=operation)
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe("bcrypt_duration_seconds", time.perf_counter() - started, operation=operation)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return await asyncio.get_running_loop().run_in_executor(bcrypt_executor, timed)
+
+async def hash_password(password: str) -> str:
+    hashed = await run_bcrypt("hash", bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt())
+    return hashed.decode('utf-8')
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await run_bcrypt("verify", bcrypt.checkpw, plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -549,6 +973,968 @@ async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials]
         pass
     return None
 
+# ========== TASK QUEUE ==========
+
+TASK_WORKERS_ENABLED = os.environ.get('TASK_WORKERS_ENABLED', 'true').lower() == 'true'  # false when backend/worker.py runs the queues
+TASK_QUEUE_CONCURRENCY = {"default": 4, "notifications": 4, "fanout": 1, "media": 2, **json.loads(os.environ.get('TASK_QUEUE_CONCURRENCY', '{}'))}
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', '5'))
+TASK_LEASE_SECONDS = float(os.environ.get('TASK_LEASE_SECONDS', '300'))
+TASK_POLL_SECONDS = 2
+TASK_RETRY_BASE_SECONDS = 5
+TASK_RETRY_MAX_SECONDS = 600
+TASK_DRAIN_SECONDS = 10
+
+metrics.describe("tasks_total", "Background tasks by queue, task name and outcome")
+
+class TaskQueue:
+    """Durable background tasks in named queues.
+
+    enqueue() stores the task in `tasks` and returns at once. Each queue has its own worker
+    loop that claims due tasks under a lease, runs up to TASK_QUEUE_CONCURRENCY[queue] at a
+    time and retries failures with jittered exponential backoff. Tasks that exhaust their
+    attempts move to `dead_letter_tasks`. A task whose worker died is claimed again once
+    its lease runs out (running tasks keep extending theirs), so handlers must tolerate
+    running more than once.
+    """
+
+    def __init__(self, concurrency: Dict[str, int]):
+        self.concurrency = concurrency
+        self.handlers: Dict[str, tuple] = {}
+        self._wakeups: Dict[str, asyncio.Event] = {}
+        self._workers: List[asyncio.Task] = []
+        self._running: set = set()
+
+    def task(self, queue: str = "default", max_attempts: int = TASK_MAX_ATTEMPTS, timeout: Optional[float] = TASK_LEASE_SECONDS):
+        """Register a coroutine function as a task handler under its own name"""
+        def register(fn):
+            self.handlers[fn.__name__] = (fn, queue, max_attempts, timeout)
+            return fn
+        return register
+
+    async def ensure_indexes(self):
+        await db.tasks.create_index("id", unique=True)
+        await db.tasks.create_index([("queue", 1), ("status", 1), ("run_at", 1)])
+
+    def build(self, handler, delay: float = 0.0, **payload) -> dict:
+        """The task document enqueue() stores, for callers that write it along with other documents"""
+        fn, queue_name, max_attempts, _ = self.handlers[handler.__name__]
+        now = datetime.now(timezone.utc).isoformat()
+        return {
+            "id": str(uuid.uuid4()),
+            "queue": queue_name,
+            "name": handler.__name__,
+            "payload": payload,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "last_error": None,
+            "run_at": utc_after(delay) if delay else now,
+            "created_at": now,
+        }
+
+    async def submit(self, task: dict) -> str:
+        await db.tasks.insert_one(task)
+        metrics.inc("tasks_total", queue=task["queue"], task=task["name"], outcome="enqueued")
+        if task["queue"] in self._wakeups and task["run_at"] == task["created_at"]:
+            self._wakeups[task["queue"]].set()
+        return task["id"]
+
+    async def enqueue(self, handler, delay: float = 0.0, **payload) -> str:
+        return await self.submit(self.build(handler, delay, **payload))
+
+    async def submit_after_commit(self, task: dict) -> Optional[str]:
+        """submit() for follow-up work of a write that already succeeded. A failure is logged
+        rather than raised, so the client is not told (and does not retry) a write that happened."""
+        try:
+            return await self.submit(task)
+        except PyMongoError as e:
+            metrics.inc("tasks_total", queue=task["queue"], task=task["name"], outcome="enqueue_failed")
+            logger.error(f"Could not enqueue {task['name']} ({task['id']}): {e}")
+            return None
+
+    async def enqueue_after_commit(self, handler, **payload) -> Optional[str]:
+        return await self.submit_after_commit(self.build(handler, **payload))
+
+    async def _claim(self, queue_name: str) -> Optional[dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        return await db.tasks.find_one_and_update(
+            {"queue": queue_name, "$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lte": now}},
+            ]},
+            {"$set": {"status": "running", "locked_until": utc_after(TASK_LEASE_SECONDS), "started_at": now}, "$inc": {"attempts": 1}},
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _heartbeat(self, task_id: str):
+        while True:
+            await asyncio.sleep(TASK_LEASE_SECONDS / 3)
+            try:
+                await db.tasks.update_one(
+                    {"id": task_id, "status": "running"}, {"$set": {"locked_until": utc_after(TASK_LEASE_SECONDS)}}
+                )
+            except PyMongoError as e:
+                logger.warning(f"Could not extend the lease of task {task_id}: {e}")
+
+    async def _execute(self, task: dict):
+        handler = self.handlers.get(task["name"])
+        labels = {"queue": task["queue"], "task": task["name"]}
+        heartbeat = asyncio.create_task(self._heartbeat(task["id"]))
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for task {task['name']}")
+            await asyncio.wait_for(handler[0](**task["payload"]), timeout=handler[3])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if task["attempts"] >= task["max_attempts"]:
+                await db.dead_letter_tasks.insert_one({
+                    **task, "status": "dead", "last_error": error, "failed_at": datetime.now(timezone.utc).isoformat()
+                })
+                await db.tasks.delete_one({"id": task["id"]})
+                metrics.inc("tasks_total", outcome="dead", **labels)
+                logger.error(f"Task {task['name']} ({task['id']}) moved to the dead-letter queue: {error}")
+            else:
+                delay = min(TASK_RETRY_BASE_SECONDS * 2 ** (task["attempts"] - 1), TASK_RETRY_MAX_SECONDS)
+                await db.tasks.update_one({"id": task["id"]}, {"$set": {
+                    "status": "queued", "run_at": utc_after(delay * random.uniform(0.8, 1.2)), "last_error": error,
+                }})
+                metrics.inc("tasks_total", outcome="retried", **labels)
+                logger.warning(f"Task {task['name']} ({task['id']}) failed on attempt {task['attempts']}, retrying: {error}")
+            return
+        finally:
+            heartbeat.cancel()
+        await db.tasks.delete_one({"id": task["id"]})
+        metrics.inc("tasks_total", outcome="succeeded", **labels)
+
+    async def _worker(self, queue_name: str):
+        slots = asyncio.Semaphore(self.concurrency.get(queue_name, 1))
+        wakeup = self._wakeups[queue_name]
+        while True:
+            await slots.acquire()
+            wakeup.clear()
+            try:
+                task = await self._claim(queue_name)
+            except PyMongoError as e:
+                slots.release()
+                logger.error(f"Task queue {queue_name} cannot claim work: {e}")
+                await asyncio.sleep(TASK_POLL_SECONDS)
+                continue
+            if task is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=TASK_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            running = asyncio.create_task(self._execute(task))
+            self._running.add(running)
+            running.add_done_callback(lambda t: (self._running.discard(t), slots.release()))
+
+    def start(self, queues: Optional[List[str]] = None):
+        for queue_name in queues or self.concurrency:
+            self._wakeups[queue_name] = asyncio.Event()
+            self._workers.append(asyncio.create_task(self._worker(queue_name)))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        # Give running tasks a moment; anything unfinished is reclaimed after its lease
+        if self._running:
+            await asyncio.wait(self._running, timeout=TASK_DRAIN_SECONDS)
+
+task_queue = TaskQueue(TASK_QUEUE_CONCURRENCY)
+
+@app.on_event("startup")
+async def start_task_queue():
+    try:
+        await task_queue.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create task queue indexes: {e}")
+    if TASK_WORKERS_ENABLED:
+        task_queue.start()
+
+@app.on_event("shutdown")
+async def stop_task_queue():
+    await task_queue.stop()
+
+@api_router.get("/tasks/stats")
+async def get_task_stats(admin = Depends(get_current_admin)):
+    rows = await db.tasks.aggregate([
+        {"$group": {"_id": {"queue": "$queue", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    stats: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        stats.setdefault(row["_id"]["queue"], {})[row["_id"]["status"]] = row["count"]
+    dead = await db.dead_letter_tasks.count_documents({})
+    return {"queues": stats, "dead_letter": dead}
+
+@api_router.get("/tasks/dead")
+async def get_dead_letter_tasks(queue: Optional[str] = None, admin = Depends(get_current_admin)):
+    query = {"queue": queue} if queue else {}
+    return await db.dead_letter_tasks.find(query, {"_id": 0}).sort("failed_at", -1).to_list(200)
+
+@api_router.post("/tasks/dead/{task_id}/retry")
+async def retry_dead_letter_task(task_id: str, admin = Depends(get_current_admin)):
+    task = await db.dead_letter_tasks.find_one({"id": task_id}, {"_id": 0})
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    now = datetime.now(timezone.utc).isoformat()
+    await db.tasks.insert_one({
+        **{k: v for k, v in task.items() if k not in ("failed_at", "locked_until", "started_at")},
+        "status": "queued", "attempts": 0, "run_at": now,
+    })
+    await db.dead_letter_tasks.delete_one({"id": task_id})
+    return {"message": "Task requeued"}
+
+# ========== EMAIL DELIVERY ==========
+
+SMTP_HOST = os.environ.get('SMTP_HOST')  # unset disables outgoing email
+SMTP_PORT = int(os.environ.get('SMTP_PORT', '587'))
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', '8'))
+MAIL_FROM = os.environ.get('MAIL_FROM', 'no-reply@nehemiahdavid.com')
+ADMIN_NOTIFICATION_EMAILS = [e.strip() for e in os.environ.get('ADMIN_NOTIFICATION_EMAILS', '').split(',') if e.strip()]
+
+# RFC 5322's hard line limit, so long header values such as List-Unsubscribe URLs are not folded into encoded words
+MAIL_POLICY = email.policy.SMTP.clone(max_line_length=998)
+
+def build_email(to: str, subject: str, body: str, headers: Optional[Dict[str, str]] = None) -> EmailMessage:
+    message = EmailMessage(policy=MAIL_POLICY)
+    message["From"] = MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    for name, value in (headers or {}).items():
+        message[name] = value
+    message.set_content(body)
+    return message
+
+class SMTPConnectionPool:
+    """Keep-alive SMTP connections shared by the threads that send mail.
+
+    At most `size` connections exist; send() blocks its thread until one is free. A
+    connection the relay dropped while idle is replaced once, transparently.
+    """
+
+    # The relay rejected this message, but the connection itself is still usable
+    MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: "queue.LifoQueue[smtplib.SMTP]" = queue.LifoQueue()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10)
+        if SMTP_STARTTLS:
+            smtp.starttls()
+        if SMTP_USERNAME:
+            smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
+        return smtp
+
+    @staticmethod
+    def _discard(smtp: smtplib.SMTP):
+        try:
+            smtp.close()
+        except OSError:
+            pass
+
+    def send(self, message: EmailMessage):
+        with self._slots:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            try:
+                try:
+                    smtp.send_message(message)
+                except smtplib.SMTPServerDisconnected:
+                    self._discard(smtp)
+                    smtp = self._connect()
+                    smtp.send_message(message)
+            except self.MESSAGE_ERRORS:
+                self._idle.put(smtp)
+                raise
+            except Exception:
+                self._discard(smtp)
+                raise
+            self._idle.put(smtp)
+
+    def close(self):
+        while True:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._discard(smtp)
+
+smtp_pool = SMTPConnectionPool(SMTP_POOL_SIZE)
+EMAIL_DELIVERY_RECORD_SECONDS = 7 * 24 * 3600  # longer than any task retries for
+
+@app.on_event("shutdown")
+async def close_smtp_pool():
+    await asyncio.to_thread(smtp_pool.close)
+
+async def send_email(to: str, subject: str, body: str):
+    if not SMTP_HOST:
+        logger.info(f"SMTP_HOST not set, skipping email to {to}: {subject}")
+        return
+    await asyncio.to_thread(smtp_pool.send, build_email(to, subject, body))
+
+async def send_email_once(notification: str, to: str, subject: str, body: str):
+    """send_email() that a retried task can call again without mailing the same recipient twice"""
+    delivery = {"notification": notification, "recipient": to}
+    if await db.email_deliveries.find_one(delivery, {"_id": 1}):
+        return
+    await send_email(to, subject, body)
+    await db.email_deliveries.update_one(delivery, {"$setOnInsert": {"sent_at": datetime.now(timezone.utc)}}, upsert=True)
+
+@app.on_event("startup")
+async def create_email_delivery_indexes():
+    try:
+        await db.email_deliveries.create_index([("notification", 1), ("recipient", 1)], unique=True)
+        await db.email_deliveries.create_index("sent_at", expireAfterSeconds=EMAIL_DELIVERY_RECORD_SECONDS)
+    except PyMongoError as e:
+        logger.error(f"Could not create email delivery indexes: {e}")
+
+async def admin_notification_recipients() -> List[str]:
+    if ADMIN_NOTIFICATION_EMAILS:
+        return ADMIN_NOTIFICATION_EMAILS
+    return [admin["email"] for admin in await db.admins.find({}, {"_id": 0, "email": 1}).to_list(100)]
+
+# ========== IMAGE VARIANTS ==========
+
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', ROOT_DIR / 'media'))
+MEDIA_URL_PREFIX = "/api/media"
+MEDIA_BASE_URL = os.environ.get('MEDIA_BASE_URL', '')  # e.g. https://api.example.org when clients need absolute URLs
+IMAGE_PROCESS_WORKERS = int(os.environ.get('IMAGE_PROCESS_WORKERS', '2'))
+IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', str(25 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT_SECONDS = 30
+
+# Per collection: image URL field -> field holding its variants (a list field gets a parallel list)
+IMAGE_FIELDS = {
+    "events": {"image_url": "image_variants"},
+    "ministries": {"image_url": "image_variants"},
+    "gallery": {"image_url": "image_variants"},
+    "page_banners": {"image_url": "image_variants"},
+    "foundations": {"image_url": "image_variants", "gallery_images": "gallery_image_variants"},
+}
+IMAGE_SNAPSHOT_SECTIONS = {"events": "events", "ministries": "ministries", "page_banners": "banners"}
+
+metrics.describe("image_variants_total", "Image originals processed by outcome")
+
+class ImagePipeline:
+    """Resized WebP/AVIF/JPEG variants of the site's images, rendered in a process pool.
+
+    Variants are stored under MEDIA_ROOT/images/<sha256 of the original>/ and served from
+    MEDIA_URL_PREFIX, so the same photo used by several documents is rendered once.
+    `image_sources` remembers which key each source URL resolved to, so a URL is only
+    downloaded the first time it is seen.
+    """
+
+    def __init__(self, root: Path, workers: int):
+        self.root = root / "images"
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._renders = SingleFlight("image_variants")
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking a process that holds an event loop and Mongo client threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def ensure_indexes(self):
+        await db.image_sources.create_index("url", unique=True)
+
+    async def fetch(self, url: str) -> bytes:
+        if url.startswith(MEDIA_URL_PREFIX + "/"):
+            # Files this API already hosts are read from disk instead of fetched over HTTP
+            path = (MEDIA_ROOT / url[len(MEDIA_URL_PREFIX) + 1:]).resolve()
+            if not path.is_relative_to(MEDIA_ROOT.resolve()):
+                raise UnsupportedImage(f"{url} is outside the media root")
+            return await asyncio.to_thread(path.read_bytes)
+        chunks, size = [], 0
+        async with httpx.AsyncClient(timeout=IMAGE_FETCH_TIMEOUT_SECONDS, follow_redirects=True) as http:
+            async with http.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > IMAGE_MAX_BYTES:
+                        raise UnsupportedImage(f"{url} is larger than {IMAGE_MAX_BYTES} bytes")
+                    chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _read_manifest(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads((self.root / key / "manifest.json").read_text())
+        except FileNotFoundError:
+            return None
+
+    def describe(self, key: str, manifest: dict) -> ImageVariants:
+        base = f"{MEDIA_BASE_URL}{MEDIA_URL_PREFIX}/images/{key}"
+        srcset = {
+            fmt: ", ".join(f"{base}/{name} {width}w" for width, name in files)
+            for fmt, files in manifest["files"].items()
+        }
+        return ImageVariants(
+            key=key,
+            width=manifest["width"],
+            height=manifest["height"],
+            placeholder=manifest["placeholder"],
+            src=f"{base}/{manifest['files']['jpeg'][-1][1]}",
+            srcset=srcset,
+        )
+
+    async def variants_for(self, url: str) -> Optional[ImageVariants]:
+        """Variants for one source URL; None when the source is not a usable image"""
+        source = await db.image_sources.find_one({"url": url}, {"_id": 0, "key": 1})
+        if source:
+            manifest = await asyncio.to_thread(self._read_manifest, source["key"])
+            if manifest is not None:
+                metrics.inc("image_variants_total", outcome="reused")
+                return self.describe(source["key"], manifest)
+        try:
+            original = await self.fetch(url)
+            key = hashlib.sha256(original).hexdigest()
+            manifest = await self._renders.do(key, lambda: asyncio.get_running_loop().run_in_executor(
+                self._executor(), render_variants, original, str(self.root / key)
+            ))
+        except UnsupportedImage as e:
+            metrics.inc("image_variants_total", outcome="unsupported")
+            logger.warning(f"No image variants for {url}: {e}")
+            return None
+        await db.image_sources.update_one(
+            {"url": url}, {"$set": {"key": key, "updated_at": datetime.now(timezone.utc).isoformat()}}, upsert=True
+        )
+        metrics.inc("image_variants_total", outcome="rendered")
+        return self.describe(key, manifest)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+image_pipeline = ImagePipeline(MEDIA_ROOT, IMAGE_PROCESS_WORKERS)
+
+@task_queue.task(queue="media")
+async def generate_image_variants(collection: str, doc_id: str):
+    fields = IMAGE_FIELDS[collection]
+    doc = await db[collection].find_one({"id": doc_id}, {"_id": 0, "brand_id": 1, **{field: 1 for field in fields}})
+    if not doc:
+        return
+    update = {}
+    for field, target in fields.items():
+        value = doc.get(field)
+        if isinstance(value, list):
+            variants = [await image_pipeline.variants_for(url) for url in value]
+            update[target] = [v.model_dump() if v else None for v in variants]
+        else:
+            variants = await image_pipeline.variants_for(value) if value else None
+            update[target] = variants.model_dump() if variants else None
+    # Only store the variants if the images were not replaced while they rendered
+    result = await db[collection].update_one({"id": doc_id, **{field: doc.get(field) for field in fields}}, {"$set": update})
+    if result.modified_count and collection in IMAGE_SNAPSHOT_SECTIONS:
+        site_snapshots.invalidate(IMAGE_SNAPSHOT_SECTIONS[collection], doc.get("brand_id"))
+
+@app.on_event("startup")
+async def start_image_pipeline():
+    try:
+        MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+        await image_pipeline.ensure_indexes()
+    except (OSError, PyMongoError) as e:
+        logger.error(f"Could not prepare image variant storage: {e}")
+
+@app.on_event("shutdown")
+async def stop_image_pipeline():
+    image_pipeline.close()
+
+@api_router.post("/images/backfill")
+async def backfill_image_variants(admin = Depends(get_current_admin)):
+    """Queue variant generation for every document with images but no variants yet"""
+    queued = {}
+    for collection, fields in IMAGE_FIELDS.items():
+        missing = {"$or": [
+            {field: {"$nin": [None, "", []]}, target: {"$in": [None, []]}} for field, target in fields.items()
+        ]}
+        docs = await db[collection].find(missing, {"_id": 0, "id": 1}).to_list(None)
+        for doc in docs:
+            await task_queue.enqueue(generate_image_variants, collection=collection, doc_id=doc["id"])
+        queued[collection] = len(docs)
+    return {"queued": queued}
+
+# ========== MEDIA UPLOADS ==========
+
+UPLOAD_TMP_DIR = Path(os.environ.get('UPLOAD_TMP_DIR', ROOT_DIR / 'cache' / 'uploads'))
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+UPLOAD_MIN_CHUNK_SIZE = 256 * 1024
+UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(4 * 1024 * 1024 * 1024)))
+UPLOAD_EXPIRY_HOURS = int(os.environ.get('UPLOAD_EXPIRY_HOURS', '24'))
+UPLOAD_SWEEP_INTERVAL_SECONDS = 3600
+UPLOAD_WRITE_BUFFER = 1024 * 1024
+UPLOAD_CONTENT_TYPES = ("image/", "audio/", "video/", "application/pdf")
+
+metrics.describe("media_upload_bytes_total", "Bytes received by the chunked upload endpoint")
+metrics.describe("media_uploads_total", "Chunked uploads finished by outcome")
+
+class MediaUpload(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    filename: str
+    content_type: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: List[int] = []
+    sha256: Optional[str] = None  # whole-file digest; declared by the client or computed on completion
+    status: str = "uploading"  # uploading, completing, complete
+    url: Optional[str] = None
+    created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+class MediaUploadCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = None
+
+class MediaUploadStore:
+    """Resumable chunked uploads into MEDIA_ROOT/files.
+
+    An upload is one preallocated temp file under UPLOAD_TMP_DIR. Each chunk is streamed
+    to a staging file of its own and checked against the SHA-256 the client sent with it,
+    and only a verified chunk is copied to its offset, so chunks can arrive in any order,
+    in parallel, and be retried without a bad attempt touching bytes already accepted.
+    Completing the upload hashes the whole file and moves it to a path named after that
+    hash (with the extension of its validated content type), so uploading the same file
+    twice stores it once. `media_files` records every stored file by hash.
+    """
+
+    def __init__(self, tmp_dir: Path, media_root: Path):
+        self.tmp_dir = tmp_dir
+        self.files_dir = media_root / "files"
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await db.uploads.create_index("id", unique=True)
+        await db.uploads.create_index("updated_at")
+        await db.media_files.create_index("sha256", unique=True)
+
+    def temp_path(self, upload_id: str) -> Path:
+        return self.tmp_dir / f"{upload_id}.part"
+
+    def create_temp(self, upload_id: str, size: int):
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.temp_path(upload_id), "wb") as f:
+            f.truncate(size)
+
+    def stage_path(self, upload_id: str, index: int) -> Path:
+        # One file per attempt, so parallel retries of the same chunk do not share one
+        return self.tmp_dir / f"{upload_id}.{index}.{uuid.uuid4().hex}.chunk"
+
+    @staticmethod
+    def _write(f, data: bytes, digest):
+        digest.update(data)
+        f.write(data)
+
+    def _commit(self, staged: Path, upload_id: str, offset: int):
+        """Copy a verified chunk from its staging file to its offset in the upload"""
+        fd = os.open(self.temp_path(upload_id), os.O_WRONLY)
+        try:
+            with open(staged, "rb") as f:
+                while block := f.read(UPLOAD_WRITE_BUFFER):
+                    os.pwrite(fd, block, offset)
+                    offset += len(block)
+        finally:
+            os.close(fd)
+
+    async def write_chunk(self, upload: dict, index: int, stream, expected_sha256: str):
+        """Stream one chunk from the request body, verify it and store it at its offset; returns its size"""
+        offset = index * upload["chunk_size"]
+        expected_length = min(upload["chunk_size"], upload["size"] - offset)
+        if not self.temp_path(upload["id"]).exists():
+            raise HTTPException(status_code=410, detail="Upload has expired")
+        digest = hashlib.sha256()
+        written = 0
+        buffer = bytearray()
+        staged = self.stage_path(upload["id"], index)
+        f = await asyncio.to_thread(open, staged, "wb")
+        try:
+            try:
+                async for piece in stream:
+                    if written + len(buffer) + len(piece) > expected_length:
+                        raise HTTPException(status_code=413, detail=f"Chunk {index} is larger than {expected_length} bytes")
+                    buffer += piece
+                    if len(buffer) >= UPLOAD_WRITE_BUFFER:
+                        await asyncio.to_thread(self._write, f, bytes(buffer), digest)
+                        written += len(buffer)
+                        buffer.clear()
+                if buffer:
+                    await asyncio.to_thread(self._write, f, bytes(buffer), digest)
+                    written += len(buffer)
+            finally:
+                await asyncio.to_thread(f.close)
+            metrics.inc("media_upload_bytes_total", written)
+            if written != expected_length:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} should be {expected_length} bytes, got {written}")
+            if digest.hexdigest() != expected_sha256.lower():
+                raise HTTPException(status_code=422, detail=f"Checksum mismatch for chunk {index}")
+            try:
+                await asyncio.to_thread(self._commit, staged, upload["id"], offset)
+            except FileNotFoundError:
+                raise HTTPException(status_code=410, detail="Upload has expired")
+        finally:
+            await asyncio.to_thread(staged.unlink, missing_ok=True)
+        return written
+
+    def _hash_file(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            while block := f.read(UPLOAD_WRITE_BUFFER):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def stored_path(self, sha256: str, content_type: str) -> Path:
+        # The extension decides the Content-Type media is served with, so it comes from the
+        # validated content type rather than the client's filename
+        extension = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ""
+        return self.files_dir / sha256[:2] / f"{sha256}{extension}"
+
+    def url_for(self, path: Path) -> str:
+        return f"{MEDIA_BASE_URL}{MEDIA_URL_PREFIX}/{path.relative_to(MEDIA_ROOT).as_posix()}"
+
+    def _store(self, temp: Path, target: Path) -> bool:
+        """Move a finished upload into place; False when an identical file was already stored"""
+        if target.exists():
+            temp.unlink()
+            return False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(temp), target)
+        return True
+
+    async def complete(self, upload: dict) -> dict:
+        temp = self.temp_path(upload["id"])
+        sha256 = await asyncio.to_thread(self._hash_file, temp)
+        if upload.get("sha256") and upload["sha256"].lower() != sha256:
+            raise HTTPException(status_code=422, detail="Checksum mismatch for the assembled file")
+        target = self.stored_path(sha256, upload["content_type"])
+        stored = await asyncio.to_thread(self._store, temp, target)
+        url = self.url_for(target)
+        now = datetime.now(timezone.utc).isoformat()
+        await db.media_files.update_one(
+            {"sha256": sha256},
+            {"$setOnInsert": {
+                "sha256": sha256, "url": url, "size": upload["size"], "content_type": upload["content_type"],
+                "filename": upload["filename"], "created_at": now,
+            }},
+            upsert=True
+        )
+        metrics.inc("media_uploads_total", outcome="stored" if stored else "deduplicated")
+        return {"sha256": sha256, "url": url, "status": "complete", "updated_at": now}
+
+    def remove_temp(self, upload_id: str):
+        self.temp_path(upload_id).unlink(missing_ok=True)
+        for staged in self.tmp_dir.glob(f"{upload_id}.*.chunk"):
+            staged.unlink(missing_ok=True)
+
+    async def sweep(self):
+        """Drop uploads nobody has touched for UPLOAD_EXPIRY_HOURS, with their temp files"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=UPLOAD_EXPIRY_HOURS)).isoformat()
+        stale = await db.uploads.find({"status": {"$ne": "complete"}, "updated_at": {"$lt": cutoff}}, {"_id": 0, "id": 1}).to_list(None)
+        for upload in stale:
+            await asyncio.to_thread(self.remove_temp, upload["id"])
+            await db.uploads.delete_one({"id": upload["id"]})
+            metrics.inc("media_uploads_total", outcome="expired")
+        return len(stale)
+
+    async def run(self):
+        while True:
+            try:
+                await self.sweep()
+            except PyMongoError as e:
+                logger.error(f"Upload sweep failed: {e}")
+            await asyncio.sleep(UPLOAD_SWEEP_INTERVAL_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+media_uploads = MediaUploadStore(UPLOAD_TMP_DIR, MEDIA_ROOT)
+
+@app.on_event("startup")
+async def start_media_uploads():
+    try:
+        await media_uploads.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create upload indexes: {e}")
+    media_uploads.start()
+
+@app.on_event("shutdown")
+async def stop_media_uploads():
+    await media_uploads.stop()
+
+async def get_upload(upload_id: str) -> dict:
+    upload = await db.uploads.find_one({"id": upload_id}, {"_id": 0})
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+@api_router.post("/uploads", response_model=MediaUpload)
+async def create_upload(upload_data: MediaUploadCreate, admin = Depends(get_current_admin)):
+    """Start a chunked upload. When the client already knows the file's SHA-256 and that file is stored, it completes at once."""
+    if not upload_data.content_type.startswith(UPLOAD_CONTENT_TYPES):
+        raise HTTPException(status_code=415, detail=f"Unsupported content type {upload_data.content_type}")
+    if not 0 < upload_data.size <= UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads must be between 1 and {UPLOAD_MAX_BYTES} bytes")
+    chunk_size = min(max(upload_data.chunk_size or UPLOAD_CHUNK_SIZE, UPLOAD_MIN_CHUNK_SIZE), UPLOAD_MAX_CHUNK_SIZE)
+    upload = MediaUpload(
+        filename=Path(upload_data.filename).name,
+        content_type=upload_data.content_type,
+        size=upload_data.size,
+        chunk_size=chunk_size,
+        total_chunks=math.ceil(upload_data.size / chunk_size),
+        sha256=upload_data.sha256.lower() if upload_data.sha256 else None,
+    )
+    existing = await db.media_files.find_one({"sha256": upload.sha256}, {"_id": 0, "url": 1}) if upload.sha256 else None
+    if existing:
+        upload.status = "complete"
+        upload.url = existing["url"]
+        metrics.inc("media_uploads_total", outcome="deduplicated")
+    else:
+        await asyncio.to_thread(media_uploads.create_temp, upload.id, upload.size)
+    await db.uploads.insert_one(upload.model_dump())
+    return upload
+
+@api_router.get("/uploads/{upload_id}", response_model=MediaUpload)
+async def get_upload_status(upload_id: str, admin = Depends(get_current_admin)):
+    """Resume point for a client: received_chunks lists the chunks already stored"""
+    return await get_upload(upload_id)
+
+@api_router.put("/uploads/{upload_id}/chunks/{index}")
+async def upload_chunk(upload_id: str, index: int, request: Request, admin = Depends(get_current_admin)):
+    """Store one chunk, sent as the raw request body with its hex SHA-256 in X-Chunk-SHA256"""
+    upload = await get_upload(upload_id)
+    if upload["status"] != "uploading":
+        raise HTTPException(status_code=409, detail=f"Upload is {upload['status']}")
+    if not 0 <= index < upload["total_chunks"]:
+        raise HTTPException(status_code=400, detail=f"Chunk index must be between 0 and {upload['total_chunks'] - 1}")
+    checksum = request.headers.get("x-chunk-sha256")
+    if not checksum:
+        raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header is required")
+    size = await media_uploads.write_chunk(upload, index, request.stream(), checksum)
+    await db.uploads.update_one(
+        {"id": upload_id},
+        {"$addToSet": {"received_chunks": index}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    return {"index": index, "size": size}
+
+@api_router.post("/uploads/{upload_id}/complete", response_model=MediaUpload)
+async def complete_upload(upload_id: str, admin = Depends(get_current_admin)):
+    """Assemble the upload; the returned url can be used as any media or image URL field"""
+    upload = await get_upload(upload_id)
+    if upload["status"] == "complete":
+        return upload
+    missing = sorted(set(range(upload["total_chunks"])) - set(upload["received_chunks"]))
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Missing chunks: {missing[:20]}")
+    # Claim the upload so a second complete call cannot move the file twice
+    claimed = await db.uploads.find_one_and_update(
+        {"id": upload_id, "status": "uploading"},
+        {"$set": {"status": "completing", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    if not claimed:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+    try:
+        result = await media_uploads.complete(upload)
+    except BaseException:
+        await db.uploads.update_one({"id": upload_id}, {"$set": {"status": "uploading"}})
+        raise
+    await db.uploads.update_one({"id": upload_id}, {"$set": result})
+    return {**upload, **result}
+
+@api_router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, admin = Depends(get_current_admin)):
+    upload = await get_upload(upload_id)
+    if upload["status"] != "complete":
+        await asyncio.to_thread(media_uploads.remove_temp, upload_id)
+    await db.uploads.delete_one({"id": upload_id})
+    return {"message": "Upload deleted"}
+
+# ========== MEDIA SERVING ==========
+
+MEDIA_READ_CHUNK_SIZE = 256 * 1024
+MEDIA_CACHE_SECONDS = int(os.environ.get('MEDIA_CACHE_SECONDS', '3600'))
+MEDIA_IMMUTABLE_PREFIXES = ("files/", "images/")  # content-addressed: a path never changes content
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+metrics.describe("media_responses_total", "Media file responses by status and send path")
+metrics.describe("media_bytes_sent_total", "Media file bytes sent by send path")
+
+class MediaFileResponse(Response):
+    """Sends a byte range of a file, zero-copy when the ASGI server allows it.
+
+    Servers with the `http.response.zerocopysend` extension get the open file and send it
+    with sendfile(2). Servers with `http.response.pathsend` get the path, for whole files.
+    Otherwise the range is read in MEDIA_READ_CHUNK_SIZE pieces in the thread pool,
+    stopping early if the client goes away.
+    """
+
+    def __init__(self, path: Path, status_code: int, headers: Dict[str, str], offset: int, count: int, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers)
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.send_body = send_body
+        self.whole_file = status_code == 200
+
+    async def __call__(self, scope, receive, send):
+        extensions = scope.get("extensions") or {}
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.count == 0:
+            await send({"type": "http.response.body", "body": b""})
+            mode = "empty"
+        elif "http.response.zerocopysend" in extensions:
+            f = await asyncio.to_thread(open, self.path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": self.offset, "count": self.count})
+            finally:
+                await asyncio.to_thread(f.close)
+            mode = "zerocopysend"
+        elif "http.response.pathsend" in extensions and self.whole_file:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            mode = "pathsend"
+        else:
+            await self._stream(receive, send)
+            mode = "threadpool"
+        metrics.inc("media_responses_total", status=str(self.status_code), mode=mode)
+        if self.send_body:
+            metrics.inc("media_bytes_sent_total", self.count, mode=mode)
+
+    async def _stream(self, receive, send):
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        fd = await asyncio.to_thread(os.open, self.path, os.O_RDONLY)
+        try:
+            position, remaining = self.offset, self.count
+            while remaining > 0 and not disconnected.is_set():
+                chunk = await asyncio.to_thread(os.pread, fd, min(MEDIA_READ_CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    break  # truncated under us; Content-Length already promised more, so just end
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0 and not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+            await asyncio.to_thread(os.close, fd)
+
+def parse_byte_range(header: str, size: int) -> Optional[tuple]:
+    """(start, end) for a single `bytes=` range; None to ignore the header, ValueError when unsatisfiable"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None  # other units and multi-range requests get the whole file
+    start, sep, end = spec.strip().partition("-")
+    if not sep or not (start.isdigit() or end.isdigit()) or (start and not start.isdigit()) or (end and not end.isdigit()):
+        return None
+    if not start:
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise ValueError("empty suffix range")
+        return max(size - suffix, 0), size - 1
+    first = int(start)
+    if end and int(end) < first:
+        return None  # an invalid range-spec is ignored, not unsatisfiable (RFC 9110 14.1.1)
+    if first >= size:
+        raise ValueError("range outside the file")
+    return first, min(int(end), size - 1) if end else size - 1
+
+def etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+def not_modified_since(header: str, mtime: float) -> bool:
+    try:
+        return int(mtime) <= email.utils.parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def stat_media(relative: str) -> Optional[tuple]:
+    root = MEDIA_ROOT.resolve()
+    path = (root / relative).resolve()
+    if not path.is_relative_to(root) or any(part.startswith(".") for part in path.relative_to(root).parts):
+        return None
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (path, st) if stat.S_ISREG(st.st_mode) else None
+
+@api_router.api_route("/media/{relative:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def get_media_file(relative: str, request: Request):
+    """Serve uploaded media and image variants with conditional and single-range request support"""
+    found = await asyncio.to_thread(stat_media, relative)
+    if found is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    path, st = found
+    size = st.st_size
+    etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+    immutable = relative.startswith(MEDIA_IMMUTABLE_PREFIXES)
+    headers = {
+        "accept-ranges": "bytes",
+        "x-content-type-options": "nosniff",
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": "public, max-age=31536000, immutable" if immutable else f"public, max-age={MEDIA_CACHE_SECONDS}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (etag_matches(if_none_match, etag) if if_none_match else if_modified_since and not_modified_since(if_modified_since, st.st_mtime)):
+        metrics.inc("media_responses_total", status="304", mode="empty")
+        return Response(status_code=304, headers=headers)
+
+    content_type, encoding = mimetypes.guess_type(path.name)
+    headers["content-type"] = content_type or "application/octet-stream"
+    status_code, offset, count = 200, 0, size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: only honour the range when the client's copy is still current
+    if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            metrics.inc("media_responses_total", status="416", mode="empty")
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            status_code, offset, count = 206, start, end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(count)
+    return MediaFileResponse(path, status_code, headers, offset, count, send_body=request.method != "HEAD")
+
 # ========== AUTH ROUTES ==========
 
 @api_router.post("/auth/register")
@@ -560,7 +1946,7 @@ async def register_admin(admin_data: AdminCreate):
     
     admin = Admin(email=admin_data.email)
     doc = admin.model_dump()
-    doc["password_hash"] = hash_password(admin_data.password)
+    doc["password_hash"] = await hash_password(admin_data.password)
     
     await db.admins.insert_one(doc)
     
@@ -570,7 +1956,7 @@ async def register_admin(admin_data: AdminCreate):
 @api_router.post("/auth/login")
 async def login_admin(login_data: AdminLogin):
     admin = await db.admins.find_one({"email": login_data.email}, {"_id": 0})
-    if not admin or not verify_password(login_data.password, admin["password_hash"]):
+    if not admin or not await verify_password(login_data.password, admin["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"email": admin["email"], "role": "admin"})
@@ -581,16 +1967,132 @@ async def login_admin(login_data: AdminLogin):
 async def get_me(admin = Depends(get_current_admin)):
     return Admin(**admin)
 
+# ========== BRAND REGISTRY ==========
+
+BRAND_REGISTRY_REFRESH_SECONDS = float(os.environ.get('BRAND_REGISTRY_REFRESH_SECONDS', '10'))
+# Only honour X-Forwarded-Host behind a proxy that sets it; otherwise any client could pick its brand
+TRUST_FORWARDED_HOST = os.environ.get('TRUST_FORWARDED_HOST', 'false').lower() == 'true'
+
+def normalize_domain(value: str) -> str:
+    value = value.strip().lower()
+    if "://" in value:
+        value = value.split("://", 1)[1]
+    value = value.split("/", 1)[0].split(":", 1)[0]
+    return value[4:] if value.startswith("www.") else value
+
+class BrandRegistry:
+    """In-memory id -> brand and domain -> brand maps, loaded at startup, updated on this process's
+    brand writes and reloaded every BRAND_REGISTRY_REFRESH_SECONDS to pick up other workers' writes"""
+
+    def __init__(self):
+        self._by_id: Dict[str, dict] = {}
+        self._by_domain: Dict[str, dict] = {}
+        self.loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, brands: List[dict]):
+        self._by_id = {b["id"]: b for b in brands}
+        self._by_domain = {normalize_domain(b["domain"]): b for b in brands if b.get("domain")}
+        self.loaded = True
+
+    def put(self, brand: dict):
+        previous = self._by_id.get(brand["id"])
+        if previous and previous.get("domain"):
+            self._by_domain.pop(normalize_domain(previous["domain"]), None)
+        self._by_id[brand["id"]] = brand
+        if brand.get("domain"):
+            self._by_domain[normalize_domain(brand["domain"])] = brand
+
+    def get(self, brand_id: str) -> Optional[dict]:
+        return self._by_id.get(brand_id)
+
+    def all(self) -> List[dict]:
+        return list(self._by_id.values())
+
+    def resolve_host(self, host: str) -> Optional[dict]:
+        """Match the host or any parent domain, so api.example.org resolves to the brand for example.org"""
+        if not host or not self._by_domain:
+            return None
+        labels = normalize_domain(host).split(".")
+        for i in range(len(labels) - 1):
+            brand = self._by_domain.get(".".join(labels[i:]))
+            if brand:
+                return brand
+        return None
+
+    async def refresh(self):
+        brands = await db.brands.find({}, {"_id": 0}).to_list(100)
+        self.load(brands)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(BRAND_REGISTRY_REFRESH_SECONDS)
+            try:
+                await self.refresh()
+            except PyMongoError as e:
+                logger.warning(f"Could not refresh brand registry, keeping the loaded brands: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+brand_registry = BrandRegistry()
+
+class BrandResolutionMiddleware:
+    """Resolve the brand from the Host header and expose it as request.state.brand_id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = dict(scope["headers"])
+            forwarded = headers.get(b"x-forwarded-host") if TRUST_FORWARDED_HOST else None
+            if forwarded:
+                host = forwarded.decode("latin-1").split(",")[-1]  # the value our own proxy added
+            else:
+                host = (headers.get(b"host") or b"").decode("latin-1")
+            brand = brand_registry.resolve_host(host.strip())
+            scope.setdefault("state", {})["brand_id"] = brand["id"] if brand else None
+        await self.app(scope, receive, send)
+
+def resolve_brand_id(request: Request, brand_id: Optional[str] = None) -> Optional[str]:
+    """An explicit brand_id query param wins; otherwise default to the brand resolved from the Host header"""
+    return brand_id or getattr(request.state, "brand_id", None)
+
+@app.on_event("startup")
+async def load_brand_registry():
+    try:
+        await brand_registry.refresh()
+    except PyMongoError as e:
+        logger.error(f"Could not load brand registry: {e}")
+    brand_registry.start()
+
+@app.on_event("shutdown")
+async def stop_brand_registry():
+    await brand_registry.stop()
+
 # ========== BRAND ROUTES ==========
 
 @api_router.get("/brands", response_model=List[Brand])
 async def get_brands():
-    brands = await db.brands.find({}, {"_id": 0}).to_list(100)
-    return brands
+    if brand_registry.loaded:
+        return brand_serializer.many(brand_registry.all())
+    brands = await db.brands.find({}, brand_serializer.projection).to_list(100)
+    return brand_serializer.many(brands)
 
 @api_router.get("/brands/{brand_id}", response_model=Brand)
 async def get_brand(brand_id: str):
-    brand = await db.brands.find_one({"id": brand_id}, {"_id": 0})
+    brand = brand_registry.get(brand_id)
+    if brand:
+        return brand
+    brands = await find_published("brands", {"id": brand_id}, "brand", brand_id, 1)
+    brand = brands[0] if brands else None
     if not brand:
         raise HTTPException(status_code=404, detail="Brand not found")
     return brand
@@ -599,6 +2101,8 @@ async def get_brand(brand_id: str):
 async def create_brand(brand_data: BrandCreate, admin = Depends(get_current_admin)):
     brand = Brand(**brand_data.model_dump())
     await db.brands.insert_one(brand.model_dump())
+    brand_registry.put(brand.model_dump())
+    site_snapshots.invalidate("brand", brand.id)
     return brand
 
 @api_router.put("/brands/{brand_id}", response_model=Brand)
@@ -610,38 +2114,54 @@ async def update_brand(brand_id: str, brand_data: BrandCreate, admin = Depends(g
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Brand not found")
     brand = await db.brands.find_one({"id": brand_id}, {"_id": 0})
+    brand_registry.put(brand)
+    site_snapshots.invalidate("brand", brand_id)
     return brand
 
 # ========== EVENT ROUTES ==========
 
 @api_router.get("/events", response_model=List[Event])
-async def get_events(brand_id: Optional[str] = None):
+async def get_events(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id} if brand_id else {}
-    events = await db.events.find(query, {"_id": 0}).to_list(1000)
-    return events
+    events = await find_published("events", query, "events", brand_id, 1000, event_serializer.projection)
+    return event_serializer.many(events)
 
 @api_router.get("/events/{event_id}", response_model=Event)
 async def get_event(event_id: str):
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    event = await db.events.find_one({"id": event_id}, event_serializer.projection)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
-    return event
+    return event_serializer.one(event)
 
 @api_router.post("/events", response_model=Event)
 async def create_event(event_data: EventCreate, admin = Depends(get_current_admin)):
     event = Event(**event_data.model_dump())
     await db.events.insert_one(event.model_dump())
+    site_search.index("events", event.model_dump())
+    site_snapshots.invalidate("events", event.brand_id)
+    if event.image_url:
+        await task_queue.enqueue(generate_image_variants, collection="events", doc_id=event.id)
     return event
 
 @api_router.put("/events/{event_id}", response_model=Event)
 async def update_event(event_id: str, event_data: EventCreate, admin = Depends(get_current_admin)):
-    result = await db.events.update_one(
+    previous = await db.events.find_one_and_update(
         {"id": event_id},
-        {"$set": event_data.model_dump()}
+        {"$set": event_data.model_dump()},
+        projection={"_id": 0, "image_url": 1}
     )
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Event not found")
+    # Variants stay valid unless the image itself changed
+    if event_data.image_url != previous.get("image_url"):
+        await db.events.update_one({"id": event_id, "image_url": event_data.image_url}, {"$set": {"image_variants": None}})
+        if event_data.image_url:
+            await task_queue.enqueue(generate_image_variants, collection="events", doc_id=event_id)
+    site_snapshots.invalidate("events")
+    # A raised capacity frees seats for whoever is waiting
+    await promote_waitlist(event_id)
     event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    site_search.index("events", event)
     return event
 
 @api_router.delete("/events/{event_id}")
@@ -649,55 +2169,233 @@ async def delete_event(event_id: str, admin = Depends(get_current_admin)):
     result = await db.events.delete_one({"id": event_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Event not found")
+    site_snapshots.invalidate("events")
+    site_search.remove("events", event_id)
     return {"message": "Event deleted"}
 
 # ========== EVENT ATTENDEE ROUTES ==========
 
+ACTIVE_ATTENDEE_STATUSES = ["registered", "waitlisted"]
+
+async def normalize_attendee_emails():
+    """Lowercase legacy emails and report duplicates, which block the unique (event_id, email) index"""
+    await db.event_attendees.update_many({"email": {"$regex": "[A-Z]"}}, [{"$set": {"email": {"$toLower": "$email"}}}])
+    duplicates = await db.event_attendees.aggregate([
+        {"$group": {"_id": {"event_id": "$event_id", "email": "$email"}, "ids": {"$push": "$id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]).to_list(None)
+    for dup in duplicates:
+        logger.error(
+            f"Duplicate registrations for {dup['_id']['email']} on event {dup['_id']['event_id']}: {dup['ids']}; "
+            "remove all but one so duplicate registrations can be rejected"
+        )
+    return len(duplicates)
+
+async def backfill_seats_taken():
+    """Events created before capacity tracking have no seats_taken; count their registered attendees once"""
+    events = await db.events.find({"seats_taken": {"$exists": False}}, {"_id": 0, "id": 1}).to_list(None)
+    for event in events:
+        rows = await db.event_attendees.aggregate([
+            {"$match": {"event_id": event["id"], "status": {"$in": ["registered", None]}}},
+            {"$group": {"_id": None, "seats": {"$sum": {"$ifNull": ["$guests", 1]}}}},
+        ]).to_list(1)
+        await db.events.update_one(
+            {"id": event["id"], "seats_taken": {"$exists": False}},
+            {"$set": {"seats_taken": rows[0]["seats"] if rows else 0}}
+        )
+    return len(events)
+
+async def ensure_attendee_indexes():
+    await db.event_attendees.create_index([("event_id", 1), ("email", 1)], unique=True)
+    await db.event_attendees.create_index([("event_id", 1), ("status", 1), ("waitlist_position", 1)])
+
+@app.on_event("startup")
+async def create_attendee_indexes():
+    try:
+        await backfill_seats_taken()
+        duplicates = await normalize_attendee_emails()
+    except PyMongoError as e:
+        logger.error(f"Could not prepare event attendee data: {e}")
+        duplicates = 0
+    try:
+        await ensure_attendee_indexes()
+    except PyMongoError as e:
+        if getattr(e, "code", None) == 11000:
+            logger.critical(
+                f"Unique (event_id, email) index not created, so duplicate registrations are NOT being rejected "
+                f"({duplicates} duplicate groups logged above): {e}"
+            )
+        else:
+            logger.error(f"Could not create event attendee indexes: {e}")
+
+async def claim_seats(event_id: str, capacity: Optional[int], seats: int) -> bool:
+    """Atomically take seats only if they still fit, so concurrent registrations never overbook"""
+    if capacity is not None and seats > capacity:
+        return False
+    query = {"id": event_id}
+    if capacity is not None:
+        # A missing counter is zero: $inc creates it
+        query["$or"] = [{"seats_taken": {"$exists": False}}, {"seats_taken": {"$lte": capacity - seats}}]
+    result = await db.events.update_one(query, {"$inc": {"seats_taken": seats}})
+    return result.modified_count == 1
+
+async def release_seats(event_id: str, seats: int):
+    await db.events.update_one({"id": event_id}, {"$inc": {"seats_taken": -seats}})
+
+async def next_waitlist_position(event_id: str) -> int:
+    event = await db.events.find_one_and_update(
+        {"id": event_id},
+        {"$inc": {"waitlist_seq": 1}},
+        projection={"waitlist_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return event["waitlist_seq"]
+
+async def promote_waitlist(event_id: str) -> int:
+    """Move waitlisted attendees into freed seats strictly in waitlist order"""
+    promoted = 0
+    while True:
+        event = await db.events.find_one({"id": event_id}, {"_id": 0, "capacity": 1})
+        if not event:
+            return promoted
+        candidate = await db.event_attendees.find_one(
+            {"event_id": event_id, "status": "waitlisted"},
+            {"_id": 0, "id": 1, "guests": 1},
+            sort=[("waitlist_position", 1)]
+        )
+        if not candidate or not await claim_seats(event_id, event.get("capacity"), candidate["guests"]):
+            return promoted
+        result = await db.event_attendees.update_one(
+            {"id": candidate["id"], "status": "waitlisted"},
+            {"$set": {"status": "registered", "waitlist_position": None}}
+        )
+        if result.modified_count == 0:
+            # Cancelled, or promoted by a concurrent caller, in the meantime
+            await release_seats(event_id, candidate["guests"])
+            continue
+        promoted += 1
+        await task_queue.enqueue_after_commit(send_registration_confirmation, attendee_id=candidate["id"])
+
+@task_queue.task(queue="notifications")
+async def send_registration_confirmation(attendee_id: str):
+    attendee = await db.event_attendees.find_one({"id": attendee_id}, {"_id": 0})
+    if not attendee or attendee["status"] == "cancelled":
+        return
+    event = await db.events.find_one({"id": attendee["event_id"]}, {"_id": 0, "title": 1, "date": 1, "time": 1, "location": 1})
+    if not event:
+        return
+    when = f"{event['date']} {event.get('time') or ''}".strip()
+    if attendee["status"] == "registered":
+        subject = f"You're registered: {event['title']}"
+        status_line = f"Your place for {attendee['guests']} is confirmed."
+    else:
+        subject = f"You're on the waitlist: {event['title']}"
+        status_line = f"The event is full, so you are number {attendee['waitlist_position']} on the waitlist. We'll email you if a place opens up."
+    body = (
+        f"Hi {attendee['name']},\n\n{status_line}\n\n{event['title']}\n{when}\n{event['location']}\n\n"
+        f"To cancel, use your registration id {attendee['id']}."
+    )
+    await send_email(attendee["email"], subject, body)
+
 @api_router.post("/events/{event_id}/register", response_model=EventAttendee)
 async def register_for_event(event_id: str, attendee_data: EventAttendeeCreate):
     # Check if event exists
-    event = await db.events.find_one({"id": event_id}, {"_id": 0})
+    event = await db.events.find_one({"id": event_id}, {"_id": 0, "id": 1, "capacity": 1})
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
+    if attendee_data.guests < 1:
+        raise HTTPException(status_code=400, detail="At least one seat is required")
+    capacity = event.get("capacity")
+    if capacity is not None and attendee_data.guests > capacity:
+        raise HTTPException(status_code=400, detail=f"This event has only {capacity} seats")
+    
+    attendee = EventAttendee(**{**attendee_data.model_dump(), "event_id": event_id, "email": attendee_data.email.lower()})
     
-    attendee = EventAttendee(**attendee_data.model_dump())
-    await db.event_attendees.insert_one(attendee.model_dump())
+    # Nobody skips the queue: once people are waiting, new registrations join the waitlist
+    queue_open = capacity is None or not await db.event_attendees.find_one(
+        {"event_id": event_id, "status": "waitlisted"}, {"_id": 1}
+    )
+    if queue_open and await claim_seats(event_id, capacity, attendee.guests):
+        attendee.status = "registered"
+    else:
+        attendee.status = "waitlisted"
+        attendee.waitlist_position = await next_waitlist_position(event_id)
+    
+    for attempt in range(2):
+        try:
+            await db.event_attendees.insert_one(attendee.model_dump())
+            break
+        except DuplicateKeyError:
+            # A cancelled registration may be replaced; an active one may not
+            removed = await db.event_attendees.delete_one({"event_id": event_id, "email": attendee.email, "status": "cancelled"})
+            if removed.deleted_count == 0 or attempt == 1:
+                if attendee.status == "registered":
+                    await release_seats(event_id, attendee.guests)
+                raise HTTPException(status_code=409, detail="This email is already registered for this event")
+    await task_queue.enqueue_after_commit(send_registration_confirmation, attendee_id=attendee.id)
     return attendee
 
+@api_router.post("/events/{event_id}/registrations/{attendee_id}/cancel", response_model=EventAttendee)
+async def cancel_registration(event_id: str, attendee_id: str):
+    attendee = await db.event_attendees.find_one_and_update(
+        {"id": attendee_id, "event_id": event_id, "status": {"$in": ACTIVE_ATTENDEE_STATUSES}},
+        {"$set": {"status": "cancelled", "waitlist_position": None, "cancelled_at": datetime.now(timezone.utc).isoformat()}},
+        projection=attendee_serializer.projection,
+        return_document=ReturnDocument.BEFORE
+    )
+    if not attendee:
+        raise HTTPException(status_code=404, detail="Active registration not found")
+    if attendee["status"] == "registered":
+        await release_seats(event_id, attendee["guests"])
+        await promote_waitlist(event_id)
+    return {**attendee, "status": "cancelled", "waitlist_position": None}
+
 @api_router.get("/events/{event_id}/attendees", response_model=List[EventAttendee])
 async def get_event_attendees(event_id: str, admin = Depends(get_current_admin)):
-    attendees = await db.event_attendees.find({"event_id": event_id}, {"_id": 0}).to_list(1000)
-    return attendees
+    attendees = await db.event_attendees.find({"event_id": event_id}, attendee_serializer.projection).to_list(1000)
+    return attendee_serializer.many(attendees)
 
 @api_router.get("/attendees", response_model=List[EventAttendee])
 async def get_all_attendees(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    attendees = await db.event_attendees.find(query, {"_id": 0}).to_list(1000)
-    return attendees
+    attendees = await db.event_attendees.find(query, attendee_serializer.projection).to_list(1000)
+    return attendee_serializer.many(attendees)
 
 # ========== MINISTRY ROUTES ==========
 
 @api_router.get("/ministries", response_model=List[Ministry])
-async def get_ministries(brand_id: Optional[str] = None):
+async def get_ministries(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id} if brand_id else {}
-    ministries = await db.ministries.find(query, {"_id": 0}).to_list(1000)
-    return ministries
+    ministries = await find_published("ministries", query, "ministries", brand_id, 1000, ministry_serializer.projection)
+    return ministry_serializer.many(ministries)
 
 @api_router.post("/ministries", response_model=Ministry)
 async def create_ministry(ministry_data: MinistryCreate, admin = Depends(get_current_admin)):
     ministry = Ministry(**ministry_data.model_dump())
     await db.ministries.insert_one(ministry.model_dump())
+    site_search.index("ministries", ministry.model_dump())
+    site_snapshots.invalidate("ministries", ministry.brand_id)
+    if ministry.image_url:
+        await task_queue.enqueue(generate_image_variants, collection="ministries", doc_id=ministry.id)
     return ministry
 
 @api_router.put("/ministries/{ministry_id}", response_model=Ministry)
 async def update_ministry(ministry_id: str, ministry_data: MinistryCreate, admin = Depends(get_current_admin)):
-    result = await db.ministries.update_one(
+    previous = await db.ministries.find_one_and_update(
         {"id": ministry_id},
-        {"$set": ministry_data.model_dump()}
+        {"$set": ministry_data.model_dump()},
+        projection={"_id": 0, "image_url": 1}
     )
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Ministry not found")
+    # Variants stay valid unless the image itself changed
+    if ministry_data.image_url != previous.get("image_url"):
+        await db.ministries.update_one({"id": ministry_id, "image_url": ministry_data.image_url}, {"$set": {"image_variants": None}})
+        if ministry_data.image_url:
+            await task_queue.enqueue(generate_image_variants, collection="ministries", doc_id=ministry_id)
+    site_snapshots.invalidate("ministries")
     ministry = await db.ministries.find_one({"id": ministry_id}, {"_id": 0})
+    site_search.index("ministries", ministry)
     return ministry
 
 @api_router.delete("/ministries/{ministry_id}")
@@ -705,18 +2403,20 @@ async def delete_ministry(ministry_id: str, admin = Depends(get_current_admin)):
     result = await db.ministries.delete_one({"id": ministry_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Ministry not found")
+    site_snapshots.invalidate("ministries")
+    site_search.remove("ministries", ministry_id)
     return {"message": "Ministry deleted"}
 
 # ========== ANNOUNCEMENT ROUTES ==========
 
 @api_router.get("/announcements", response_model=List[Announcement])
-async def get_announcements(brand_id: Optional[str] = None):
+async def get_announcements(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id} if brand_id else {}
-    announcements = await db.announcements.find(query, {"_id": 0}).to_list(1000)
-    return announcements
+    announcements = await find_published("announcements", query, "announcements", brand_id, 1000, announcement_serializer.projection)
+    return announcement_serializer.many(announcements)
 
 @api_router.get("/announcements/urgent")
-async def get_urgent_announcements(brand_id: Optional[str] = None):
+async def get_urgent_announcements(brand_id: Optional[str] = Depends(resolve_brand_id)):
     now = datetime.now(timezone.utc).isoformat()
     query = {
         "is_urgent": True,
@@ -740,6 +2440,12 @@ async def get_urgent_announcements(brand_id: Optional[str] = None):
 async def create_announcement(announcement_data: AnnouncementCreate, admin = Depends(get_current_admin)):
     announcement = Announcement(**announcement_data.model_dump())
     await db.announcements.insert_one(announcement.model_dump())
+    site_search.index("announcements", announcement.model_dump())
+    site_snapshots.invalidate("announcements", announcement.brand_id)
+    if should_fan_out(announcement.model_dump()):
+        # Scheduled announcements go out when they start showing on the site
+        delay = seconds_until(announcement.scheduled_start) if announcement.scheduled_start else 0.0
+        await task_queue.enqueue(fan_out_announcement, delay=delay, announcement_id=announcement.id)
     return announcement
 
 @api_router.put("/announcements/{announcement_id}", response_model=Announcement)
@@ -750,7 +2456,9 @@ async def update_announcement(announcement_id: str, announcement_data: Announcem
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Announcement not found")
+    site_snapshots.invalidate("announcements")
     announcement = await db.announcements.find_one({"id": announcement_id}, {"_id": 0})
+    site_search.index("announcements", announcement)
     return announcement
 
 @api_router.delete("/announcements/{announcement_id}")
@@ -758,21 +2466,434 @@ async def delete_announcement(announcement_id: str, admin = Depends(get_current_
     result = await db.announcements.delete_one({"id": announcement_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Announcement not found")
+    site_snapshots.invalidate("announcements")
+    site_search.remove("announcements", announcement_id)
+    await db.announcement_fanouts.update_one(
+        {"announcement_id": announcement_id, "status": "running"}, {"$set": {"status": "cancelled"}}
+    )
     return {"message": "Announcement deleted"}
 
+# ========== ANNOUNCEMENT FAN-OUT ==========
+
+ANNOUNCEMENT_FANOUT = os.environ.get('ANNOUNCEMENT_FANOUT', 'urgent')  # urgent, all or off
+FANOUT_BATCH_SIZE = int(os.environ.get('FANOUT_BATCH_SIZE', '200'))
+FANOUT_CONCURRENCY = int(os.environ.get('FANOUT_CONCURRENCY', str(SMTP_POOL_SIZE)))
+FANOUT_RATE_PER_SECOND = float(os.environ.get('FANOUT_RATE_PER_SECOND', '20'))
+# Absolute base for links in emails, e.g. https://api.example.org; defaults to https://<brand domain>
+PUBLIC_API_URL = os.environ.get('PUBLIC_API_URL', '').rstrip('/')
+
+metrics.describe("announcement_fanout_emails_total", "Announcement emails sent to subscribers, by outcome")
+
+def seconds_until(timestamp: str) -> float:
+    try:
+        moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+def unsubscribe_token(subscriber_id: str) -> str:
+    return hmac.new(JWT_SECRET.encode(), f"unsubscribe:{subscriber_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+def unsubscribe_url(brand: Optional[dict], subscriber_id: str) -> str:
+    base = PUBLIC_API_URL or (f"https://{normalize_domain(brand['domain'])}" if brand and brand.get("domain") else "")
+    return f"{base}/api/subscribers/{subscriber_id}/unsubscribe?token={unsubscribe_token(subscriber_id)}"
+
+def should_fan_out(announcement: dict) -> bool:
+    return ANNOUNCEMENT_FANOUT == "all" or (ANNOUNCEMENT_FANOUT == "urgent" and announcement.get("is_urgent"))
+
+@app.on_event("startup")
+async def create_fanout_indexes():
+    try:
+        await db.subscribers.create_index([("brand_id", 1), ("id", 1)])
+        await db.announcement_fanouts.create_index("announcement_id", unique=True)
+    except PyMongoError as e:
+        logger.error(f"Could not create announcement fan-out indexes: {e}")
+
+@task_queue.task(queue="fanout", timeout=None)
+async def fan_out_announcement(announcement_id: str):
+    """Email an announcement to every subscriber of its brand.
+
+    Subscribers are read in id order, FANOUT_BATCH_SIZE at a time, and the last id of each
+    finished batch is checkpointed in `announcement_fanouts`. A retried or reclaimed task
+    resumes after the checkpoint, so at most one batch is sent twice after a crash.
+    Deleting the announcement cancels a running fan-out at the next batch.
+    """
+    announcement = await db.announcements.find_one({"id": announcement_id}, {"_id": 0})
+    if not announcement:
+        return
+    if not SMTP_HOST:
+        logger.info(f"SMTP_HOST not set, skipping fan-out of announcement {announcement_id}")
+        return
+    brand_id = announcement["brand_id"]
+    recipients_query = {"brand_id": brand_id, "email": {"$nin": [None, ""]}}
+    now = datetime.now(timezone.utc).isoformat()
+    progress = await db.announcement_fanouts.find_one_and_update(
+        {"announcement_id": announcement_id},
+        {"$setOnInsert": {
+            "brand_id": brand_id,
+            "status": "running",
+            "total": await db.subscribers.count_documents(recipients_query),
+            "sent": 0,
+            "failed": 0,
+            "last_subscriber_id": None,
+            "started_at": now,
+            "updated_at": now,
+            "finished_at": None,
+        }},
+        upsert=True,
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if progress["status"] != "running":
+        return
+
+    subject = f"{'Urgent: ' if announcement.get('is_urgent') else ''}{announcement['title']}"
+    brand = brand_registry.get(brand_id) or await db.brands.find_one({"id": brand_id}, {"_id": 0})
+    slots = asyncio.Semaphore(FANOUT_CONCURRENCY)
+    bucket = TokenBucket(FANOUT_RATE_PER_SECOND)
+    seen: set = set()
+
+    async def deliver(email: str, subscriber_id: str) -> bool:
+        url = unsubscribe_url(brand, subscriber_id)
+        body = f"{announcement['content']}\n\n--\nTo stop receiving these emails, unsubscribe here: {url}"
+        # One-click unsubscribe (RFC 8058) for mail clients that show an unsubscribe button
+        headers = {"List-Unsubscribe": f"<{url}>", "List-Unsubscribe-Post": "List-Unsubscribe=One-Click"}
+        async with slots:
+            await bucket.acquire()
+            try:
+                await asyncio.to_thread(smtp_pool.send, build_email(email, subject, body, headers))
+            except (smtplib.SMTPException, OSError) as e:
+                metrics.inc("announcement_fanout_emails_total", outcome="failed")
+                logger.warning(f"Announcement {announcement_id} to {email} failed: {e}")
+                return False
+            metrics.inc("announcement_fanout_emails_total", outcome="sent")
+            return True
+
+    last_id = progress["last_subscriber_id"]
+    while True:
+        query = {**recipients_query, "id": {"$gt": last_id}} if last_id else recipients_query
+        batch = await db.subscribers.find(query, {"_id": 0, "id": 1, "email": 1}).sort("id", 1).limit(FANOUT_BATCH_SIZE).to_list(FANOUT_BATCH_SIZE)
+        if not batch:
+            break
+        recipients = {s["email"].lower(): s["id"] for s in batch if s["email"].lower() not in seen}
+        seen |= recipients.keys()
+        results = await asyncio.gather(*(deliver(email, subscriber_id) for email, subscriber_id in recipients.items()))
+        last_id = batch[-1]["id"]
+        checkpoint = await db.announcement_fanouts.update_one(
+            {"announcement_id": announcement_id, "status": "running"},
+            {"$set": {"last_subscriber_id": last_id, "updated_at": datetime.now(timezone.utc).isoformat()},
+             "$inc": {"sent": sum(results), "failed": len(results) - sum(results)}}
+        )
+        if checkpoint.matched_count == 0:
+            logger.info(f"Fan-out of announcement {announcement_id} was cancelled")
+            return
+    await db.announcement_fanouts.update_one(
+        {"announcement_id": announcement_id, "status": "running"},
+        {"$set": {"status": "completed", "finished_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+async def unsubscribe(subscriber_id: str, token: str):
+    if not hmac.compare_digest(token, unsubscribe_token(subscriber_id)):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    # Keep the row so SMS subscribers keep their phone number; only the email stops
+    await db.subscribers.update_one(
+        {"id": subscriber_id},
+        {"$set": {"email": None, "unsubscribed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+@api_router.get("/subscribers/{subscriber_id}/unsubscribe", response_class=HTMLResponse)
+async def confirm_unsubscribe(subscriber_id: str, token: str):
+    """Landing page for the link in announcement emails; unsubscribing needs the POST, so link scanners can't"""
+    if not hmac.compare_digest(token, unsubscribe_token(subscriber_id)):
+        raise HTTPException(status_code=404, detail="Subscription not found")
+    return HTMLResponse(
+        "<!doctype html><title>Unsubscribe</title>"
+        f"<form method=post action='?token={html.escape(token)}'>"
+        "<p>Stop receiving announcement emails?</p><button type=submit>Unsubscribe</button></form>"
+    )
+
+@api_router.post("/subscribers/{subscriber_id}/unsubscribe")
+async def unsubscribe_subscriber(subscriber_id: str, token: str):
+    """Target of both the landing page and List-Unsubscribe-Post one-click requests"""
+    await unsubscribe(subscriber_id, token)
+    return {"message": "You have been unsubscribed"}
+
+@api_router.get("/announcements/{announcement_id}/fanout")
+async def get_announcement_fanout(announcement_id: str, admin = Depends(get_current_admin)):
+    progress = await db.announcement_fanouts.find_one({"announcement_id": announcement_id}, {"_id": 0})
+    if not progress:
+        raise HTTPException(status_code=404, detail="This announcement has not been sent to subscribers")
+    return progress
+
+# ========== WRITE-BEHIND BUFFER ==========
+
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500'))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', '1'))
+WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', '20000'))
+WRITE_BEHIND_BACKPRESSURE_SECONDS = float(os.environ.get('WRITE_BEHIND_BACKPRESSURE_SECONDS', '5'))
+WRITE_BEHIND_JOURNAL_DIR = Path(os.environ.get('WRITE_BEHIND_JOURNAL_DIR', str(ROOT_DIR / 'cache' / 'write_behind')))
+WRITE_BEHIND_COLLECTIONS = ("contact_messages", "prayer_requests", "subscribers", "volunteer_applications")
+
+metrics.describe("write_behind_documents_total", "Documents passing through the write-behind buffer, by collection and outcome")
+
+class WriteBehindBusy(Exception):
+    pass
+
+class WriteBehindBuffer:
+    """Opt-in write-behind for high-volume public form submissions.
+
+    insert() appends the document to a journal segment on disk and returns, and a
+    background flusher writes the buffer with insert_many every WRITE_BEHIND_FLUSH_SECONDS
+    or as soon as WRITE_BEHIND_BATCH_SIZE documents are waiting. Each flush rotates the
+    journal and deletes the closed segments once their documents are in Mongo, so
+    segments left on disk after a crash are replayed at startup. A unique index on `id`
+    makes replaying a partially flushed segment harmless. Callers wait for room once
+    WRITE_BEHIND_MAX_PENDING documents are buffered or being flushed.
+
+    Every process journals into its own directory under journal_dir and holds an flock on
+    it, so workers sharing journal_dir never replay a segment a live process is still
+    writing; at startup a process adopts the directories whose lock nobody holds any more.
+    """
+
+    def __init__(self, enabled: bool, journal_dir: Path):
+        self.enabled = enabled
+        self.journal_dir = journal_dir
+        self.process_dir = journal_dir / f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.pending: List[tuple] = []
+        self.in_flight = 0
+        self._closed_segments: List[Path] = []
+        self._segment_seq = 0
+        self._journal = None
+        self._lock_file = None
+        self._room = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def insert(self, collection: str, doc: dict, related: List[tuple] = ()):
+        """Buffer doc, plus related (collection, doc) pairs journaled in the same write so they flush together"""
+        if not self.enabled:
+            await db[collection].insert_one(doc)
+            for related_collection, related_doc in related:
+                await db[related_collection].insert_one(related_doc)
+            return
+        if self.buffered >= WRITE_BEHIND_MAX_PENDING:
+            metrics.inc("write_behind_documents_total", collection=collection, outcome="throttled")
+            try:
+                async with self._room:
+                    await asyncio.wait_for(
+                        self._room.wait_for(lambda: self.buffered < WRITE_BEHIND_MAX_PENDING),
+                        timeout=WRITE_BEHIND_BACKPRESSURE_SECONDS
+                    )
+            except asyncio.TimeoutError:
+                raise WriteBehindBusy("Write buffer is full")
+        entries = [(collection, doc), *related]
+        self._journal.write("".join(json.dumps({"collection": c, "doc": d}) + "\n" for c, d in entries))
+        self._journal.flush()
+        self.pending.extend(entries)
+        for entry_collection, _ in entries:
+            metrics.inc("write_behind_documents_total", collection=entry_collection, outcome="buffered")
+        if len(self.pending) >= WRITE_BEHIND_BATCH_SIZE:
+            self._wakeup.set()
+
+    @property
+    def buffered(self) -> int:
+        """Documents held in memory, counting a batch that is being flushed"""
+        return len(self.pending) + self.in_flight
+
+    def _open_segment(self):
+        self._segment_seq += 1
+        path = self.process_dir / f"segment-{int(time.time() * 1000)}-{self._segment_seq:06d}.jsonl"
+        self._journal = open(path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._journal.close()
+        self._closed_segments.append(Path(self._journal.name))
+        self._open_segment()
+
+    def _lock_process_dir(self):
+        self.process_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.process_dir / ".lock", "w")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _adopt_orphaned_segments(self):
+        """Move segments of processes that are gone (and of the old shared layout) into process_dir"""
+        for source in self.journal_dir.iterdir():
+            if source == self.process_dir:
+                continue
+            if source.is_file():
+                if source.name.startswith("segment-") and source.suffix == ".jsonl":
+                    try:
+                        os.rename(source, self.process_dir / f"shared.{source.name}")
+                    except FileNotFoundError:
+                        pass  # another process adopted it first
+                continue
+            try:
+                lock = open(source / ".lock", "a")
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # its owner is still running
+                for segment in source.glob("*.jsonl"):
+                    os.rename(segment, self.process_dir / f"{source.name}.{segment.name}")
+                (source / ".lock").unlink(missing_ok=True)
+                try:
+                    source.rmdir()
+                except OSError:
+                    pass
+            logger.warning(f"Adopted write-behind journal of stopped process {source.name}")
+
+    def _replay_segments(self) -> int:
+        replayed = 0
+        for path in sorted(self.process_dir.glob("*.jsonl")):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from a crash mid-write
+                    self.pending.append((entry["collection"], entry["doc"]))
+                    replayed += 1
+            self._closed_segments.append(path)
+        return replayed
+
+    async def _insert_batch(self, collection: str, docs: List[dict]):
+        try:
+            await db[collection].insert_many([dict(d) for d in docs], ordered=False)
+        except BulkWriteError as e:
+            # Duplicates are documents an earlier, interrupted flush already wrote
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        self._rotate()
+        batch, self.pending = self.pending, []
+        self.in_flight = len(batch)
+        segments, self._closed_segments = self._closed_segments, []
+        by_collection: Dict[str, List[dict]] = {}
+        for collection, doc in batch:
+            by_collection.setdefault(collection, []).append(doc)
+        try:
+            for collection, docs in by_collection.items():
+                for i in range(0, len(docs), WRITE_BEHIND_BATCH_SIZE):
+                    await self._insert_batch(collection, docs[i:i + WRITE_BEHIND_BATCH_SIZE])
+        except (PyMongoError, asyncio.CancelledError):
+            # Keep everything buffered and journaled; the next flush retries the whole batch
+            self.pending = batch + self.pending
+            self._closed_segments = segments + self._closed_segments
+            raise
+        finally:
+            self.in_flight = 0
+        for path in segments:
+            path.unlink(missing_ok=True)
+        for collection, docs in by_collection.items():
+            metrics.inc("write_behind_documents_total", len(docs), collection=collection, outcome="flushed")
+        async with self._room:
+            self._room.notify_all()
+        return len(batch)
+
+    async def run(self):
+        backoff = WRITE_BEHIND_FLUSH_SECONDS
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                backoff = WRITE_BEHIND_FLUSH_SECONDS
+            except PyMongoError as e:
+                backoff = min(backoff * 2, 30)
+                logger.error(f"Write-behind flush failed ({len(self.pending)} buffered), retrying in {backoff:.0f}s: {e}")
+
+    async def start(self):
+        if not self.enabled:
+            return
+        try:
+            for collection in WRITE_BEHIND_COLLECTIONS:
+                await db[collection].create_index("id", unique=True)
+        except PyMongoError as e:
+            logger.error(f"Could not create write-behind indexes: {e}")
+        self._lock_process_dir()
+        self._adopt_orphaned_segments()
+        replayed = self._replay_segments()
+        self._open_segment()
+        if replayed:
+            logger.info(f"Replaying {replayed} buffered writes from {self.process_dir}")
+            for collection, _ in self.pending:
+                metrics.inc("write_behind_documents_total", collection=collection, outcome="replayed")
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except PyMongoError as e:
+            logger.error(f"Write-behind drain failed, {len(self.pending)} writes stay journaled for the next start: {e}")
+        self._journal.close()
+        if not self.pending:
+            Path(self._journal.name).unlink(missing_ok=True)
+            (self.process_dir / ".lock").unlink(missing_ok=True)
+            try:
+                self.process_dir.rmdir()
+            except OSError:
+                pass  # segments left for the next start to adopt
+        self._lock_file.close()
+
+write_behind = WriteBehindBuffer(WRITE_BEHIND_ENABLED, WRITE_BEHIND_JOURNAL_DIR)
+
+@app.on_event("startup")
+async def start_write_behind():
+    await write_behind.start()
+
+@app.on_event("shutdown")
+async def stop_write_behind():
+    await write_behind.stop()
+
+async def insert_submission(collection: str, doc: dict, task: Optional[dict] = None):
+    """Store a public form submission, with an optional follow-up task from task_queue.build().
+
+    Under write-behind the task is journaled in the same write as the submission; otherwise it
+    is queued once the submission is stored, and failing to queue it does not fail the request.
+    """
+    related = [("tasks", task)] if task is not None and write_behind.enabled else []
+    try:
+        await write_behind.insert(collection, doc, related)
+    except WriteBehindBusy:
+        raise HTTPException(status_code=503, detail="We are receiving a lot of submissions, please try again shortly")
+    if task is not None and not write_behind.enabled:
+        await task_queue.submit_after_commit(task)
+
 # ========== VOLUNTEER ROUTES ==========
 
 @api_router.post("/volunteers", response_model=VolunteerApplication)
 async def create_volunteer_application(application_data: VolunteerApplicationCreate):
     application = VolunteerApplication(**application_data.model_dump())
-    await db.volunteer_applications.insert_one(application.model_dump())
+    await insert_submission("volunteer_applications", application.model_dump())
     return application
 
 @api_router.get("/volunteers", response_model=List[VolunteerApplication])
 async def get_volunteer_applications(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    applications = await db.volunteer_applications.find(query, {"_id": 0}).to_list(1000)
-    return applications
+    applications = await db.volunteer_applications.find(query, volunteer_serializer.projection).to_list(1000)
+    return volunteer_serializer.many(applications)
 
 @api_router.put("/volunteers/{application_id}/status")
 async def update_volunteer_status(application_id: str, status: str, admin = Depends(get_current_admin)):
@@ -789,59 +2910,79 @@ async def update_volunteer_status(application_id: str, status: str, admin = Depe
 @api_router.post("/subscribers", response_model=Subscriber)
 async def create_subscriber(subscriber_data: SubscriberCreate):
     subscriber = Subscriber(**subscriber_data.model_dump())
-    await db.subscribers.insert_one(subscriber.model_dump())
+    await insert_submission("subscribers", subscriber.model_dump())
     return subscriber
 
 @api_router.get("/subscribers", response_model=List[Subscriber])
 async def get_subscribers(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    subscribers = await db.subscribers.find(query, {"_id": 0}).to_list(1000)
-    return subscribers
+    subscribers = await db.subscribers.find(query, subscriber_serializer.projection).to_list(1000)
+    return subscriber_serializer.many(subscribers)
 
 # ========== CONTACT ROUTES ==========
 
+@task_queue.task(queue="notifications")
+async def notify_admins_of_contact_message(name: str, email: str, subject: Optional[str], message: str, brand_id: str, message_id: Optional[str] = None):
+    body = f"New contact message from {name} <{email}> ({brand_id}):\n\n{subject or ''}\n\n{message}"
+    for recipient in await admin_notification_recipients():
+        if message_id:
+            await send_email_once(f"contact:{message_id}", recipient, f"New contact message: {subject or name}", body)
+        else:  # tasks queued before message_id was passed
+            await send_email(recipient, f"New contact message: {subject or name}", body)
+
 @api_router.post("/contact", response_model=ContactMessage)
 async def create_contact_message(message_data: ContactMessageCreate):
     message = ContactMessage(**message_data.model_dump())
-    await db.contact_messages.insert_one(message.model_dump())
+    notification = task_queue.build(
+        notify_admins_of_contact_message, message_id=message.id,
+        name=message.name, email=message.email, subject=message.subject, message=message.message, brand_id=message.brand_id
+    )
+    await insert_submission("contact_messages", message.model_dump(), task=notification)
     return message
 
 @api_router.get("/contact", response_model=List[ContactMessage])
 async def get_contact_messages(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    messages = await db.contact_messages.find(query, {"_id": 0}).to_list(1000)
-    return messages
+    messages = await db.contact_messages.find(query, contact_serializer.projection).to_list(1000)
+    return contact_serializer.many(messages)
 
 # ========== SERMON/MESSAGE ROUTES ==========
 
 @api_router.get("/sermons", response_model=List[SermonMessage])
-async def get_sermons(brand_id: Optional[str] = None):
+async def get_sermons(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id} if brand_id else {}
-    sermons = await db.sermons.find(query, {"_id": 0}).to_list(1000)
-    return sermons
+    sermons = await db.sermons.find(query, sermon_serializer.projection).to_list(1000)
+    return sermon_serializer.many(sermons)
 
 @api_router.get("/sermons/{sermon_id}", response_model=SermonMessage)
 async def get_sermon(sermon_id: str):
-    sermon = await db.sermons.find_one({"id": sermon_id}, {"_id": 0})
+    sermon = await db.sermons.find_one({"id": sermon_id}, sermon_serializer.projection)
     if not sermon:
         raise HTTPException(status_code=404, detail="Sermon not found")
-    return sermon
+    return sermon_serializer.one(sermon)
 
 @api_router.post("/sermons", response_model=SermonMessage)
 async def create_sermon(sermon_data: SermonMessageCreate, admin = Depends(get_current_admin)):
     sermon = SermonMessage(**sermon_data.model_dump())
-    await db.sermons.insert_one(sermon.model_dump())
+    await db.sermons.insert_one({**sermon.model_dump(), "transcript_version": 1})
+    site_search.index("sermons", sermon.model_dump())
+    if sermon.transcript:
+        spawn_background(transcript_store.ingest(sermon.id, sermon.transcript, 1), "transcript ingest")
     return sermon
 
 @api_router.put("/sermons/{sermon_id}", response_model=SermonMessage)
 async def update_sermon(sermon_id: str, sermon_data: SermonMessageCreate, admin = Depends(get_current_admin)):
-    result = await db.sermons.update_one(
+    # Every write bumps transcript_version so a slower ingest of an older edit can't overwrite a newer one
+    sermon = await db.sermons.find_one_and_update(
         {"id": sermon_id},
-        {"$set": sermon_data.model_dump()}
+        {"$set": sermon_data.model_dump(), "$inc": {"transcript_version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
     )
-    if result.matched_count == 0:
+    if sermon is None:
         raise HTTPException(status_code=404, detail="Sermon not found")
-    sermon = await db.sermons.find_one({"id": sermon_id}, {"_id": 0})
+    site_search.index("sermons", sermon)
+    spawn_background(transcript_store.ingest(sermon_id, sermon.get("transcript"), sermon["transcript_version"]), "transcript ingest")
     return sermon
 
 @api_router.delete("/sermons/{sermon_id}")
@@ -849,374 +2990,554 @@ async def delete_sermon(sermon_id: str, admin = Depends(get_current_admin)):
     result = await db.sermons.delete_one({"id": sermon_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Sermon not found")
+    site_search.remove("sermons", sermon_id)
+    transcript_store.forget(sermon_id)
+    await db.sermon_transcripts.delete_one({"sermon_id": sermon_id})
     return {"message": "Sermon deleted"}
 
+# ========== SERMON TRANSCRIPTS ==========
+
+TRANSCRIPT_CACHE_SIZE = int(os.environ.get('TRANSCRIPT_CACHE_SIZE', '64'))
+# Used to estimate offsets for transcripts without timestamps (~150 words per minute)
+SPOKEN_WORDS_PER_SECOND = 2.5
+UNTIMED_SEGMENT_WORDS = 50
+
+TIMESTAMP = r"(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:[.,](\d{1,3}))?"
+CUE_RE = re.compile(rf"^\s*{TIMESTAMP}\s*-->\s*{TIMESTAMP}")
+# Bracketed [mm:ss] / (h:mm:ss), or a bare h:mm:ss; a bare mm:ss is too easily a Bible verse
+INLINE_TS_RE = re.compile(rf"^\s*(?:[\[(]{TIMESTAMP}[\])]|(\d{{1,2}}):(\d{{2}}):(\d{{2}})(?=\s))\s*[-–:]?\s*(.*)$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+def _seconds(hours, minutes, seconds, fraction=None) -> float:
+    value = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    return value + (int(fraction.ljust(3, "0")) / 1000 if fraction else 0)
+
+def split_transcript(text: str) -> List[dict]:
+    """Split a transcript into {start, end, text} segments from WebVTT/SRT cues, inline timestamps, or estimates"""
+    lines = text.splitlines()
+    segments: List[dict] = []
+    if any(CUE_RE.match(line) for line in lines):
+        current = None
+        for line in lines:
+            cue = CUE_RE.match(line)
+            if cue:
+                g = cue.groups()
+                current = {"start": _seconds(*g[:4]), "end": _seconds(*g[4:]), "text": ""}
+                segments.append(current)
+            elif current is not None and line.strip() and not line.strip().isdigit():
+                current["text"] = f'{current["text"]} {line.strip()}'.strip()
+            elif not line.strip():
+                current = None
+    elif any(INLINE_TS_RE.match(line) for line in lines):
+        for line in lines:
+            stamp = INLINE_TS_RE.match(line)
+            if stamp:
+                g = stamp.groups()
+                start = _seconds(*g[:4]) if g[2] is not None else _seconds(g[4], g[5], g[6])
+                segments.append({"start": start, "end": None, "text": g[7].strip()})
+            elif segments and line.strip():
+                segments[-1]["text"] = f'{segments[-1]["text"]} {line.strip()}'.strip()
+        for current, following in zip(segments, segments[1:]):
+            current["end"] = following["start"]
+    else:
+        words_before, buffer = 0, []
+        for sentence in SENTENCE_RE.split(text.strip()):
+            buffer.append(sentence)
+            if sum(len(s.split()) for s in buffer) >= UNTIMED_SEGMENT_WORDS:
+                chunk = " ".join(buffer)
+                count = len(chunk.split())
+                segments.append({"start": words_before / SPOKEN_WORDS_PER_SECOND,
+                                 "end": (words_before + count) / SPOKEN_WORDS_PER_SECOND,
+                                 "text": chunk, "estimated": True})
+                words_before += count
+                buffer = []
+        if buffer:
+            chunk = " ".join(buffer)
+            count = len(chunk.split())
+            segments.append({"start": words_before / SPOKEN_WORDS_PER_SECOND,
+                             "end": (words_before + count) / SPOKEN_WORDS_PER_SECOND,
+                             "text": chunk, "estimated": True})
+    return [{"index": i, **segment} for i, segment in enumerate(s for s in segments if s["text"])]
+
+class TranscriptIndex:
+    """Immutable positional index over one sermon's transcript segments"""
+    __slots__ = ("segments", "postings", "vocabulary")
+
+    def __init__(self, segments: List[dict]):
+        self.segments = segments
+        # term -> {segment index -> [(token position, char start, char end), ...]}
+        postings: Dict[str, Dict[int, list]] = {}
+        for i, segment in enumerate(segments):
+            for position, m in enumerate(TOKEN_RE.finditer(segment["text"])):
+                postings.setdefault(m.group(0).lower(), {}).setdefault(i, []).append((position, m.start(), m.end()))
+        self.postings = postings
+        self.vocabulary = sorted(postings)
+
+    def _hits(self, term: str, prefix: bool) -> Dict[int, list]:
+        if not prefix:
+            return self.postings.get(term, {})
+        start = bisect.bisect_left(self.vocabulary, term)
+        merged: Dict[int, list] = {}
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            for seg, hits in self.postings[candidate].items():
+                merged.setdefault(seg, []).extend(hits)
+        return merged
+
+    def search(self, q: str, limit: int) -> List[dict]:
+        """Segments containing every query term (the last one as a prefix); exact phrases first, then by time"""
+        terms = tokenize(q)
+        if not terms:
+            return []
+        hits = [self._hits(term, prefix=(i == len(terms) - 1)) for i, term in enumerate(terms)]
+        smallest = min(hits, key=len)
+        candidates = sorted(seg for seg in smallest if all(seg in term_hits for term_hits in hits))
+        if len(terms) > 1:
+            phrases, others = [], []
+            for seg in candidates:
+                following = [{h[0] for h in term_hits[seg]} for term_hits in hits[1:]]
+                is_phrase = any(
+                    all(pos + k + 1 in positions for k, positions in enumerate(following))
+                    for pos, _, _ in hits[0][seg]
+                )
+                (phrases if is_phrase else others).append(seg)
+            candidates = phrases + others
+            phrase_segments = set(phrases)
+        else:
+            phrase_segments = set(candidates)
+        results = []
+        for seg in candidates[:limit]:
+            offsets = sorted({(start, end) for term_hits in hits for _, start, end in term_hits[seg]})
+            results.append({**self.segments[seg], "phrase": seg in phrase_segments, "offsets": [list(o) for o in offsets]})
+        return results
+
+class TranscriptStore:
+    """Ingests transcripts into timestamped segments (persisted in sermon_transcripts) with an LRU of indexes.
+
+    Each stored transcript carries the sermon's transcript_version, and writes only replace an
+    equal or older version, so background ingests finishing out of order keep the newest edit.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._indexes: "OrderedDict[str, tuple]" = OrderedDict()  # sermon_id -> (version, index)
+
+    async def ensure_indexes(self):
+        await db.sermon_transcripts.create_index("sermon_id", unique=True)
+
+    def _remember(self, sermon_id: str, version: int, index: TranscriptIndex):
+        current = self._indexes.get(sermon_id)
+        if current is not None and current[0] > version:
+            return
+        self._indexes[sermon_id] = (version, index)
+        self._indexes.move_to_end(sermon_id)
+        while len(self._indexes) > self.capacity:
+            self._indexes.popitem(last=False)
+
+    @staticmethod
+    def _not_newer(sermon_id: str, version: int) -> dict:
+        return {"sermon_id": sermon_id, "$or": [{"version": {"$lte": version}}, {"version": {"$exists": False}}]}
+
+    async def ingest(self, sermon_id: str, transcript: Optional[str], version: int = 0) -> Optional[TranscriptIndex]:
+        if not transcript:
+            current = self._indexes.get(sermon_id)
+            if current is not None and current[0] <= version:
+                self.forget(sermon_id)
+            await db.sermon_transcripts.delete_one(self._not_newer(sermon_id, version))
+            return None
+        segments = await asyncio.to_thread(split_transcript, transcript)
+        index = await asyncio.to_thread(TranscriptIndex, segments)
+        try:
+            await db.sermon_transcripts.update_one(
+                self._not_newer(sermon_id, version),
+                {"$set": {"segments": segments, "version": version, "updated_at": datetime.now(timezone.utc).isoformat()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return index  # a newer version is already stored
+        # delete_sermon removes the sermon before its transcript, so a sermon that is gone now
+        # means this write may have landed after that delete and has to be undone
+        if not await db.sermons.find_one({"id": sermon_id}, {"_id": 1}):
+            await db.sermon_transcripts.delete_one({"sermon_id": sermon_id, "version": version})
+            self.forget(sermon_id)
+            return None
+        self._remember(sermon_id, version, index)
+        return index
+
+    async def get(self, sermon_id: str) -> Optional[TranscriptIndex]:
+        cached = self._indexes.get(sermon_id)
+        if cached is not None:
+            self._indexes.move_to_end(sermon_id)
+            return cached[1]
+        stored = await db.sermon_transcripts.find_one({"sermon_id": sermon_id}, {"_id": 0, "segments": 1, "version": 1})
+        if stored:
+            index = await asyncio.to_thread(TranscriptIndex, stored["segments"])
+            self._remember(sermon_id, stored.get("version", 0), index)
+            return index
+        # Sermons created before transcripts were ingested get segmented on first use
+        sermon = await db.sermons.find_one({"id": sermon_id}, {"_id": 0, "transcript": 1, "transcript_version": 1})
+        if sermon is None:
+            return None
+        return await self.ingest(sermon_id, sermon.get("transcript"), sermon.get("transcript_version", 0))
+
+    def forget(self, sermon_id: str):
+        self._indexes.pop(sermon_id, None)
+
+transcript_store = TranscriptStore(TRANSCRIPT_CACHE_SIZE)
+
+@app.on_event("startup")
+async def create_transcript_indexes():
+    try:
+        await transcript_store.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create transcript indexes: {e}")
+
+@api_router.get("/sermons/{sermon_id}/transcript")
+async def get_sermon_transcript(sermon_id: str):
+    """Timestamped transcript segments for the player"""
+    index = await transcript_store.get(sermon_id)
+    return FastJSONResponse({"sermon_id": sermon_id, "segments": index.segments if index else []})
+
+@api_router.get("/sermons/{sermon_id}/transcript/search")
+async def search_sermon_transcript(sermon_id: str, q: str, limit: int = 50):
+    """Transcript segments matching q, with start/end times and character offsets of each hit"""
+    index = await transcript_store.get(sermon_id)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    started = time.perf_counter()
+    matches = index.search(q, max(1, min(limit, 500)))
+    return FastJSONResponse({
+        "sermon_id": sermon_id,
+        "query": q,
+        "matches": matches,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    })
+
 # ========== YOUTUBE INTEGRATION ==========
 
+YOUTUBE_CATALOG_PATH = Path(os.environ.get('YOUTUBE_CATALOG_PATH', str(ROOT_DIR / 'data' / 'youtube_catalog.json')))
+YOUTUBE_MAX_PAGE_SIZE = 100
+
+def format_duration(seconds: int) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes}:{secs:02d}"
+
+def format_views(count: int) -> str:
+    if count >= 1_000_000:
+        return f"{count / 1_000_000:.1f}M"
+    if count >= 1000:
+        return f"{count / 1000:.1f}K"
+    return str(count)
+
+class ChannelIndex:
+    """Precomputed views over one channel's videos: by date, by views, and per category"""
+
+    def __init__(self, videos: List[dict]):
+        videos = [
+            {**v, "duration": format_duration(v["duration_seconds"]), "views": format_views(v["view_count"])}
+            for v in videos
+        ]
+        by_date = sorted(videos, key=lambda v: v["publishedAt"], reverse=True)
+        by_views = sorted(videos, key=lambda v: v["view_count"], reverse=True)
+        self.views = {(None, "date"): by_date, (None, "views"): by_views}
+        for category in {v["category"] for v in videos}:
+            self.views[(category.lower(), "date")] = [v for v in by_date if v["category"] == category]
+            self.views[(category.lower(), "views")] = [v for v in by_views if v["category"] == category]
+        self.search_text = {
+            v["id"]: f'{v["title"]} {v["description"]} {v["category"]}'.lower() for v in videos
+        }
+        self.categories = sorted({v["category"] for v in videos})
+        # The unfiltered listing is what nearly every page load asks for, so encode it once
+        self.full_bodies = {sort: FastJSONResponse(view).body for (category, sort), view in self.views.items() if category is None}
+
+class YouTubeCatalog:
+    """In-memory, indexed video catalog per channel"""
+
+    def __init__(self):
+        self._channels: Dict[str, ChannelIndex] = {}
+
+    def load_file(self, path: Path):
+        with open(path) as f:
+            data = json.load(f)
+        for handle, videos in data["channels"].items():
+            self.set_channel(handle, videos)
+
+    def set_channel(self, handle: str, videos: List[dict]):
+        self._channels[handle] = ChannelIndex(videos)
+
+    def channel(self, handle: str) -> Optional[ChannelIndex]:
+        return self._channels.get(handle)
+
+    def query(self, handle: str, category: Optional[str] = None, sort: str = "date", q: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0):
+        """Return (videos, next_offset); next_offset is None on the last page"""
+        index = self._channels.get(handle)
+        if index is None:
+            return [], None
+        view = index.views.get((category.lower() if category else None, sort), [])
+        if q:
+            terms = q.lower().split()
+            view = [v for v in view if all(t in index.search_text[v["id"]] for t in terms)]
+        end = len(view) if limit is None else offset + limit
+        page = view[offset:end]
+        return page, (end if end < len(view) else None)
+
+youtube_catalog = YouTubeCatalog()
+
+@app.on_event("startup")
+async def load_youtube_catalog():
+    try:
+        youtube_catalog.load_file(YOUTUBE_CATALOG_PATH)
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Could not load YouTube catalog from {YOUTUBE_CATALOG_PATH}: {e}")
+
+# ========== YOUTUBE INGEST ==========
+
+YOUTUBE_CHANNELS = ["faithcenter_in", "nehemiahdavid"]
+YOUTUBE_API_KEY = os.environ.get('YOUTUBE_API_KEY')
+YOUTUBE_API_BASE_URL = os.environ.get('YOUTUBE_API_BASE_URL', 'https://www.googleapis.com/youtube/v3')
+YOUTUBE_REFRESH_INTERVAL_SECONDS = int(os.environ.get('YOUTUBE_REFRESH_INTERVAL_SECONDS', '3600'))
+YOUTUBE_MAX_VIDEOS = int(os.environ.get('YOUTUBE_MAX_VIDEOS', '50'))
+YOUTUBE_CACHE_PATH = Path(os.environ.get('YOUTUBE_CACHE_PATH', str(ROOT_DIR / 'cache' / 'youtube_catalog.json')))
+
+ISO_DURATION_PARTS = (("H", 3600), ("M", 60), ("S", 1))
+
+def parse_iso_duration(value: str) -> int:
+    """PT1H2M3S -> 3723"""
+    total, number = 0, ""
+    for ch in value.split("T", 1)[-1]:
+        if ch.isdigit():
+            number += ch
+            continue
+        for unit, seconds in ISO_DURATION_PARTS:
+            if ch == unit and number:
+                total += int(number) * seconds
+        number = ""
+    return total
+
+def guess_video_category(title: str) -> str:
+    title = title.lower()
+    if "bible study" in title:
+        return "Bible Study"
+    if "prayer" in title or "worship" in title:
+        return "Prayer & Worship"
+    if "youth" in title:
+        return "Youth Services"
+    if "outreach" in title or "community" in title:
+        return "Community"
+    if any(word in title for word in ("conference", "festival", "gathering", "guest", "special")):
+        return "Special Events"
+    return "Sunday Services"
+
+class YouTubeDataAPIFetcher:
+    """Fetch a channel's latest uploads from the YouTube Data API (or anything speaking the same protocol)"""
+
+    def __init__(self, http: "httpx.AsyncClient", api_key: str, base_url: str = YOUTUBE_API_BASE_URL):
+        self.http = http
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+
+    async def _get(self, resource: str, **params) -> dict:
+        response = await self.http.get(f"{self.base_url}/{resource}", params={**params, "key": self.api_key})
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_channel(self, handle: str) -> List[dict]:
+        channels = await self._get("channels", part="contentDetails", forHandle=f"@{handle}")
+        if not channels.get("items"):
+            raise ValueError(f"YouTube channel @{handle} not found")
+        uploads = channels["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        playlist = await self._get("playlistItems", part="contentDetails", playlistId=uploads, maxResults=YOUTUBE_MAX_VIDEOS)
+        video_ids = [item["contentDetails"]["videoId"] for item in playlist.get("items", [])]
+        if not video_ids:
+            return []
+        details = await self._get("videos", part="snippet,contentDetails,statistics", id=",".join(video_ids))
+        return [
+            {
+                "id": item["id"],
+                "videoId": item["id"],
+                "title": item["snippet"]["title"],
+                "publishedAt": item["snippet"]["publishedAt"],
+                "description": item["snippet"].get("description", ""),
+                "category": guess_video_category(item["snippet"]["title"]),
+                "duration_seconds": parse_iso_duration(item["contentDetails"].get("duration", "PT0S")),
+                "view_count": int(item.get("statistics", {}).get("viewCount", 0)),
+            }
+            for item in details.get("items", [])
+        ]
+
+class YouTubeIngestWorker:
+    """Refresh channel catalogs in the background; requests only ever read what is already in memory.
+
+    Results are persisted to YOUTUBE_CACHE_PATH so a restart serves the last fetch immediately,
+    and stale channels keep being served until a refresh succeeds.
+    """
+
+    def __init__(self, catalog: YouTubeCatalog, channels: List[str], cache_path: Path, interval: int):
+        self.catalog = catalog
+        self.channels = channels
+        self.cache_path = cache_path
+        self.interval = interval
+        self.fetcher = None
+        self.fetched_at: Dict[str, float] = {}
+        self._cached_videos: Dict[str, List[dict]] = {}
+        self._wakeup = asyncio.Event()
+        self._retry_at = 0.0  # monotonic deadline while backing off after failed fetches
+        self._task: Optional[asyncio.Task] = None
+
+    def load_cache(self):
+        if not self.cache_path.exists():
+            return
+        with open(self.cache_path) as f:
+            data = json.load(f)
+        for handle, videos in data["channels"].items():
+            self.catalog.set_channel(handle, videos)
+            self._cached_videos[handle] = videos
+        self.fetched_at.update(data.get("fetched_at", {}))
+
+    def _write_cache(self):
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"channels": self._cached_videos, "fetched_at": self.fetched_at}, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def is_stale(self, handle: str) -> bool:
+        return time.time() - self.fetched_at.get(handle, 0) >= self.interval
+
+    def request_refresh(self):
+        """Ask the worker to revalidate now without waiting for it; ignored while backing off after failures"""
+        if time.monotonic() < self._retry_at:
+            return
+        self._wakeup.set()
+
+    async def refresh_channel(self, handle: str):
+        videos = await self.fetcher.fetch_channel(handle)
+        index = self.catalog.channel(handle)
+        if index is not None:
+            # Keep hand-curated categories for videos we already know about
+            known = {v["videoId"]: v["category"] for view in index.views.values() for v in view}
+            for video in videos:
+                video["category"] = known.get(video["videoId"], video["category"])
+        self.catalog.set_channel(handle, videos)
+        self._cached_videos[handle] = videos
+        self.fetched_at[handle] = time.time()
+        await asyncio.to_thread(self._write_cache)
+
+    async def run(self):
+        failures = 0
+        while True:
+            for handle in self.channels:
+                if not self.is_stale(handle):
+                    continue
+                try:
+                    await self.refresh_channel(handle)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    logger.error(f"YouTube ingest for @{handle} failed, serving cached catalog: {e}")
+            delay = self.interval if failures == 0 else min(self.interval, 30 * 2 ** min(failures, 6))
+            self._retry_at = time.monotonic() + delay if failures else 0.0
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self.fetcher is not None and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+youtube_ingest = YouTubeIngestWorker(youtube_catalog, YOUTUBE_CHANNELS, YOUTUBE_CACHE_PATH, YOUTUBE_REFRESH_INTERVAL_SECONDS)
+youtube_http: Optional["httpx.AsyncClient"] = None
+
+@app.on_event("startup")
+async def start_youtube_ingest():
+    global youtube_http
+    try:
+        youtube_ingest.load_cache()
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"Ignoring unreadable YouTube cache {YOUTUBE_CACHE_PATH}: {e}")
+    if youtube_ingest.fetcher is None and YOUTUBE_API_KEY:
+        youtube_http = httpx.AsyncClient(
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+        )
+        youtube_ingest.fetcher = YouTubeDataAPIFetcher(youtube_http, YOUTUBE_API_KEY)
+    youtube_ingest.start()
+
+@app.on_event("shutdown")
+async def stop_youtube_ingest():
+    await youtube_ingest.stop()
+    if youtube_http is not None:
+        await youtube_http.aclose()
+
 @api_router.get("/youtube/channel/{channel_handle}")
-async def get_youtube_videos(channel_handle: str):
+async def get_youtube_videos(
+    channel_handle: str,
+    category: Optional[str] = None,
+    sort: str = "date",
+    q: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
     """
     Fetch videos from YouTube channels
     Supports @faithcenter_in and @nehemiahdavid channels
+    Filter with category= and q=, order with sort=date|views, page with limit= and the X-Next-Cursor header
     """
+    # Convert channel handle to proper format
+    if channel_handle.startswith('@'):
+        channel_handle = channel_handle[1:]
+    
+    if sort not in ("date", "views"):
+        raise HTTPException(status_code=400, detail="sort must be 'date' or 'views'")
+    if limit is not None and not 1 <= limit <= YOUTUBE_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {YOUTUBE_MAX_PAGE_SIZE}")
     try:
-        # Convert channel handle to proper format
-        if channel_handle.startswith('@'):
-            channel_handle = channel_handle[1:]
-        
-        # Return channel-specific curated sermon videos
-        # In production, you would use YouTube Data API
-        
-        if channel_handle == "faithcenter_in":
-            videos = [
-                {
-                    "id": "fc1",
-                    "videoId": "j7Cj8FhyPQI",
-                    "title": "Bible Study w/ Ps. Nehemiah David",
-                    "publishedAt": "2025-10-24T19:00:00Z",
-                    "description": "Bible study session led by Pastor Nehemiah David. Deep dive into God's Word with practical application for daily living.",
-                    "category": "Bible Study",
-                    "duration": "55:30",
-                    "views": "3.2K"
-                },
-                {
-                    "id": "fc2",
-                    "videoId": "ToQZD74z6vs",
-                    "title": "Faith Center Live | October 12th, 2025 - The Ten Best Ways Part 6",
-                    "publishedAt": "2025-10-12T10:00:00Z",
-                    "description": "Part 6 of our teaching series on the ten best ways to grow in your faith and relationship with God.",
-                    "category": "Sunday Services",
-                    "duration": "68:45",
-                    "views": "5.8K"
-                },
-                {
-                    "id": "fc3",
-                    "videoId": "x5CvVMJj2Tg",
-                    "title": "Annual Faith Conference 2025 | Day 1",
-                    "publishedAt": "2025-10-02T09:00:00Z",
-                    "description": "Day 1 of our Annual Faith Conference 2025 featuring worship and powerful teachings. A transformative gathering of believers.",
-                    "category": "Special Events",
-                    "duration": "189:18",
-                    "views": "15.3K"
-                },
-                {
-                    "id": "fc4",
-                    "videoId": "SI_X6LX8G3o",
-                    "title": "How to Hear God's Voice - Festival of Miracles",
-                    "publishedAt": "2025-09-26T18:30:00Z",
-                    "description": "Special message on recognizing and hearing God's voice in your life. Part of our Festival of Miracles series.",
-                    "category": "Special Events",
-                    "duration": "62:30",
-                    "views": "9.2K"
-                },
-                {
-                    "id": "fc5",
-                    "videoId": "vJh6kAyEMs0",
-                    "title": "Faith Center Live | September 14th, 2025 - The Ten Best Ways Part 2",
-                    "publishedAt": "2025-09-14T10:00:00Z",
-                    "description": "Part 2 of our teaching series on practical ways to strengthen your walk with Christ.",
-                    "category": "Sunday Services",
-                    "duration": "71:20",
-                    "views": "6.4K"
-                },
-                {
-                    "id": "fc6",
-                    "videoId": "c61bjEJgjXA",
-                    "title": "God's Hand Brings Miracles | Full Sermon",
-                    "publishedAt": "2025-09-07T10:00:00Z",
-                    "description": "Full sermon by Pastor Nehemiah David on the miraculous hand of God working in our lives today.",
-                    "category": "Sunday Services",
-                    "duration": "62:15",
-                    "views": "11.5K"
-                },
-                {
-                    "id": "fc7",
-                    "videoId": "peUhOXXFxwQ",
-                    "title": "ANNUAL FAITH CONFERENCE 2025 Day 2 - Testimonies & Miracles",
-                    "publishedAt": "2025-09-07T14:00:00Z",
-                    "description": "Day 2 of Annual Faith Conference with amazing testimonies of God's miraculous power and transformative work.",
-                    "category": "Special Events",
-                    "duration": "240:00",
-                    "views": "18.7K"
-                },
-                {
-                    "id": "fc8",
-                    "videoId": "FqI3wT57qzk",
-                    "title": "Faith Center Live | August 10th, 2025 - First Sunday with Pastor A.J. Swoboda",
-                    "publishedAt": "2025-08-10T10:00:00Z",
-                    "description": "Historic first Sunday service with Lead Pastor A.J. Swoboda. A new season of faith and growth.",
-                    "category": "Sunday Services",
-                    "duration": "65:40",
-                    "views": "8.9K"
-                },
-                {
-                    "id": "fc9",
-                    "videoId": "4rV2K5S76qc",
-                    "title": "Favour and Grace of God | Full Sermon",
-                    "publishedAt": "2025-04-28T10:00:00Z",
-                    "description": "Full sermon on God's favour and grace. Understanding how to walk in divine favour and experience God's unmerited grace.",
-                    "category": "Sunday Services",
-                    "duration": "58:45",
-                    "views": "7.2K"
-                },
-                {
-                    "id": "fc10",
-                    "videoId": "zWZIZ2Zu1Us",
-                    "title": "Men's Gathering - A Life Unaffected by the World",
-                    "publishedAt": "2025-03-16T14:00:00Z",
-                    "description": "Special men's gathering focusing on living a life rooted in faith, not worldly standards.",
-                    "category": "Special Events",
-                    "duration": "54:30",
-                    "views": "4.6K"
-                },
-                {
-                    "id": "fc11",
-                    "videoId": "aU21rNmbShk",
-                    "title": "Bible Study w/ Ps. Nehemiah David | January 31, 2025",
-                    "publishedAt": "2025-01-31T19:00:00Z",
-                    "description": "Weekly Bible study session with Pastor Nehemiah David. Exploring God's Word together.",
-                    "category": "Bible Study",
-                    "duration": "52:15",
-                    "views": "3.8K"
-                },
-                {
-                    "id": "fc12",
-                    "videoId": "G3jgHbDB4TU",
-                    "title": "Prayer Meeting - Seeking His Presence",
-                    "publishedAt": "2025-01-22T18:30:00Z",
-                    "description": "A powerful prayer meeting focused on seeking God's presence and interceding for our community.",
-                    "category": "Prayer & Worship",
-                    "duration": "45:20",
-                    "views": "2.9K"
-                },
-                {
-                    "id": "fc13",
-                    "videoId": "ZxLpEQ_4tqY",
-                    "title": "Youth Service - Purpose in Christ",
-                    "publishedAt": "2025-01-12T18:00:00Z",
-                    "description": "A powerful message for our youth about discovering their God-given purpose and calling.",
-                    "category": "Youth Services",
-                    "duration": "48:15",
-                    "views": "5.4K"
-                },
-                {
-                    "id": "fc14",
-                    "videoId": "FNVf6cLYR0s",
-                    "title": "Community Outreach - Love in Action",
-                    "publishedAt": "2025-01-08T14:00:00Z",
-                    "description": "Highlights from our community outreach program. Serving our neighbors with the love of Christ.",
-                    "category": "Community",
-                    "duration": "32:45",
-                    "views": "3.1K"
-                },
-                {
-                    "id": "fc15",
-                    "videoId": "UpzRmMVSEmY",
-                    "title": "Real Talk Kim - Full Sermon",
-                    "publishedAt": "2024-11-04T10:00:00Z",
-                    "description": "Guest speaker Real Talk Kim delivers a powerful message of truth and transformation.",
-                    "category": "Special Events",
-                    "duration": "53:00",
-                    "views": "6.7K"
-                }
-            ]
-        elif channel_handle == "nehemiahdavid":
-            videos = [
-                {
-                    "id": "nd1",
-                    "videoId": "oCTvqUvt3Q8",
-                    "title": "Sharpen Your Weapon — Gain Spiritual Ascendancy",
-                    "publishedAt": "2025-11-02T10:00:00Z",
-                    "description": "Full sermon encouraging spiritual readiness and sharpening your spiritual weapons for victory in Christ.",
-                    "category": "Sunday Services",
-                    "duration": "62:15",
-                    "views": "8.9K"
-                },
-                {
-                    "id": "nd2",
-                    "videoId": "lsNNwxUQ7Eo",
-                    "title": "How to Recognise God's Voice",
-                    "publishedAt": "2025-10-19T10:00:00Z",
-                    "description": "Teaching on discerning and recognizing God's voice in your life. Learning to distinguish His voice from others.",
-                    "category": "Bible Study",
-                    "duration": "55:30",
-                    "views": "6.8K"
-                },
-                {
-                    "id": "nd3",
-                    "videoId": "nDx_qJpAtd4",
-                    "title": "Nehemiah Sermon Series | Steps to Rebuild Faith",
-                    "publishedAt": "2025-09-10T10:00:00Z",
-                    "description": "Part of a series on the mission and faith of Nehemiah, focusing on steps to rebuild faith and recognize God's open doors.",
-                    "category": "Sunday Services",
-                    "duration": "58:45",
-                    "views": "7.2K"
-                },
-                {
-                    "id": "nd4",
-                    "videoId": "CwTXjaR2g_U",
-                    "title": "God's Hand Brings Miracles | September 7, 2025 Full Sermon",
-                    "publishedAt": "2025-09-07T10:00:00Z",
-                    "description": "Witness the miraculous power of God's hand. A powerful message on God's supernatural intervention in our lives.",
-                    "category": "Sunday Services",
-                    "duration": "64:30",
-                    "views": "10.5K"
-                },
-                {
-                    "id": "nd5",
-                    "videoId": "X_XUN97FoAE",
-                    "title": "Partake in Jesus - Step into Restoration | August 3, 2025 Full Sermon",
-                    "publishedAt": "2025-08-03T10:00:00Z",
-                    "description": "A powerful message on restoration through Christ. Understanding how to partake in Jesus and experience complete healing.",
-                    "category": "Sunday Services",
-                    "duration": "68:15",
-                    "views": "9.8K"
-                },
-                {
-                    "id": "nd6",
-                    "videoId": "7b7W4WtVDtg",
-                    "title": "I am doing a TERRIBLE THING | August 17, 2025 Full Sermon",
-                    "publishedAt": "2025-08-17T10:00:00Z",
-                    "description": "A convicting message on self-examination and repentance. Turning away from things that hinder our walk with God.",
-                    "category": "Sunday Services",
-                    "duration": "59:40",
-                    "views": "7.9K"
-                },
-                {
-                    "id": "nd7",
-                    "videoId": "mT0VK8c9NU4",
-                    "title": "A Life Unaffected by the World | Full Sermon",
-                    "publishedAt": "2025-03-16T10:00:00Z",
-                    "description": "Living a life that is not influenced by worldly standards but rooted in God's truth and principles.",
-                    "category": "Sunday Services",
-                    "duration": "52:30",
-                    "views": "11.3K"
-                },
-                {
-                    "id": "nd8",
-                    "videoId": "9rHa_2VIhIQ",
-                    "title": "Secure your Territory | March 9, 2025 Full Sermon",
-                    "publishedAt": "2025-03-09T10:00:00Z",
-                    "description": "A message on spiritual warfare and securing what God has given you. Standing firm in faith.",
-                    "category": "Sunday Services",
-                    "duration": "56:20",
-                    "views": "8.7K"
-                },
-                {
-                    "id": "nd9",
-                    "videoId": "7LCYOWo85ZY",
-                    "title": "Building Consistency in Prayer | February 2, 2025",
-                    "publishedAt": "2025-02-02T10:00:00Z",
-                    "description": "Practical teaching on developing a consistent and powerful prayer life that transforms your walk with God.",
-                    "category": "Prayer & Worship",
-                    "duration": "48:20",
-                    "views": "5.6K"
-                },
-                {
-                    "id": "nd10",
-                    "videoId": "aU21rNmbShk",
-                    "title": "Bible Study w/ Ps. Nehemiah David | January 31, 2025",
-                    "publishedAt": "2025-01-31T19:00:00Z",
-                    "description": "Weekly Bible study session with Pastor Nehemiah David. Exploring God's Word together with practical application.",
-                    "category": "Bible Study",
-                    "duration": "52:15",
-                    "views": "4.2K"
-                },
-                {
-                    "id": "nd11",
-                    "videoId": "x1Nc7Tk-bjA",
-                    "title": "Assignment, Ability & Priority | December 22, 2024 Full Sermon",
-                    "publishedAt": "2024-12-22T10:00:00Z",
-                    "description": "Understanding your God-given assignment, walking in your abilities, and setting right priorities in life.",
-                    "category": "Sunday Services",
-                    "duration": "61:45",
-                    "views": "9.4K"
-                },
-                {
-                    "id": "nd12",
-                    "videoId": "1Pu1ZQW_g5Y",
-                    "title": "What does the Grace of God do? | May 7, 2024",
-                    "publishedAt": "2024-05-07T10:00:00Z",
-                    "description": "A deep dive into understanding God's grace and its transformative power in the believer's life.",
-                    "category": "Bible Study",
-                    "duration": "54:30",
-                    "views": "7.8K"
-                },
-                {
-                    "id": "nd13",
-                    "videoId": "oQktWgYzME8",
-                    "title": "365 Bible Verses Everyone Should Know - Nehemiah 1:4",
-                    "publishedAt": "2024-01-04T08:00:00Z",
-                    "description": "Daily devotional series exploring essential Bible verses. Today: Nehemiah 1:4 on prayer and fasting.",
-                    "category": "Bible Study",
-                    "duration": "12:30",
-                    "views": "2.9K"
-                },
-                {
-                    "id": "nd14",
-                    "videoId": "31U2OGhylAs",
-                    "title": "EXCEEDING GREATNESS | Part 1",
-                    "publishedAt": "2024-11-15T10:00:00Z",
-                    "description": "First part of powerful teaching series on the exceeding greatness of God's power available to believers.",
-                    "category": "Ministry Training",
-                    "duration": "47:20",
-                    "views": "6.5K"
-                },
-                {
-                    "id": "nd15",
-                    "videoId": "J03uAKirX_8",
-                    "title": "Sowing into the Spirit - Part 2",
-                    "publishedAt": "2024-10-20T10:00:00Z",
-                    "description": "Continuation of teaching on spiritual sowing and reaping. Understanding the law of sowing and reaping in the Spirit.",
-                    "category": "Bible Study",
-                    "duration": "51:40",
-                    "views": "5.3K"
-                },
-                {
-                    "id": "nd16",
-                    "videoId": "sevnilB-BfA",
-                    "title": "Pentecost Sunday | Faith Center Live Experience",
-                    "publishedAt": "2024-06-09T10:00:00Z",
-                    "description": "Celebrating Pentecost Sunday with powerful worship and a message on the Holy Spirit's power.",
-                    "category": "Special Events",
-                    "duration": "72:15",
-                    "views": "13.2K"
-                },
-                {
-                    "id": "nd17",
-                    "videoId": "lIQl5xkU9jM",
-                    "title": "Double Honor for Shame - Part 1",
-                    "publishedAt": "2024-04-14T10:00:00Z",
-                    "description": "First part of powerful series on God's restoration. Instead of shame, God gives double honor and blessing.",
-                    "category": "Sunday Services",
-                    "duration": "58:50",
-                    "views": "8.1K"
-                }
-            ]
-        else:
-            videos = []
-        
-        return videos
-        
-    except Exception as e:
-        logging.error(f"Error fetching YouTube videos: {e}")
-        raise HTTPException(status_code=500, detail=f"Error fetching YouTube videos: {str(e)}")
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    if channel_handle in youtube_ingest.channels and youtube_ingest.is_stale(channel_handle):
+        youtube_ingest.request_refresh()
+    
+    index = youtube_catalog.channel(channel_handle)
+    if index is not None and not (category or q or limit or offset):
+        return Response(content=index.full_bodies[sort], media_type="application/json")
+    
+    videos, next_offset = youtube_catalog.query(channel_handle, category, sort, q, limit, offset)
+    headers = {"X-Next-Cursor": str(next_offset)} if next_offset is not None else None
+    return FastJSONResponse(videos, headers=headers)
+
+@api_router.get("/youtube/channel/{channel_handle}/categories")
+async def get_youtube_categories(channel_handle: str):
+    index = youtube_catalog.channel(channel_handle.lstrip('@'))
+    return index.categories if index else []
 
 
 # ========== TESTIMONIAL ROUTES ==========
 
 @api_router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials(brand_id: Optional[str] = None, featured: Optional[bool] = None):
+async def get_testimonials(brand_id: Optional[str] = Depends(resolve_brand_id), featured: Optional[bool] = None):
     query = {"brand_id": brand_id} if brand_id else {}
     if featured is not None:
         query["featured"] = featured
-    testimonials = await db.testimonials.find(query, {"_id": 0}).to_list(1000)
-    return testimonials
+    testimonials = await find_published("testimonials", query, "testimonials", brand_id, 1000, testimonial_serializer.projection)
+    return testimonial_serializer.many(testimonials)
 
 @api_router.post("/testimonials", response_model=Testimonial)
 async def create_testimonial(testimonial_data: TestimonialCreate, admin = Depends(get_current_admin)):
     testimonial = Testimonial(**testimonial_data.model_dump())
     await db.testimonials.insert_one(testimonial.model_dump())
+    site_search.index("testimonials", testimonial.model_dump())
+    site_snapshots.invalidate("testimonials", testimonial.brand_id)
     return testimonial
 
 @api_router.put("/testimonials/{testimonial_id}", response_model=Testimonial)
@@ -1227,7 +3548,9 @@ async def update_testimonial(testimonial_id: str, testimonial_data: TestimonialC
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Testimonial not found")
+    site_snapshots.invalidate("testimonials")
     testimonial = await db.testimonials.find_one({"id": testimonial_id}, {"_id": 0})
+    site_search.index("testimonials", testimonial)
     return testimonial
 
 @api_router.delete("/testimonials/{testimonial_id}")
@@ -1235,6 +3558,8 @@ async def delete_testimonial(testimonial_id: str, admin = Depends(get_current_ad
     result = await db.testimonials.delete_one({"id": testimonial_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Testimonial not found")
+    site_snapshots.invalidate("testimonials")
+    site_search.remove("testimonials", testimonial_id)
     return {"message": "Testimonial deleted"}
 
 # ========== PRAYER REQUEST ROUTES ==========
@@ -1242,14 +3567,14 @@ async def delete_testimonial(testimonial_id: str, admin = Depends(get_current_ad
 @api_router.post("/prayer-requests", response_model=PrayerRequest)
 async def create_prayer_request(prayer_data: PrayerRequestCreate):
     prayer = PrayerRequest(**prayer_data.model_dump())
-    await db.prayer_requests.insert_one(prayer.model_dump())
+    await insert_submission("prayer_requests", prayer.model_dump())
     return prayer
 
 @api_router.get("/prayer-requests", response_model=List[PrayerRequest])
 async def get_prayer_requests(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    prayers = await db.prayer_requests.find(query, {"_id": 0}).to_list(1000)
-    return prayers
+    prayers = await db.prayer_requests.find(query, prayer_serializer.projection).to_list(1000)
+    return prayer_serializer.many(prayers)
 
 @api_router.put("/prayer-requests/{prayer_id}/status")
 async def update_prayer_status(prayer_id: str, status: str, admin = Depends(get_current_admin)):
@@ -1262,7 +3587,7 @@ async def update_prayer_status(prayer_id: str, status: str, admin = Depends(get_
     return {"message": "Status updated"}
 
 @api_router.get("/prayer-requests/public")
-async def get_public_prayer_requests(brand_id: Optional[str] = None):
+async def get_public_prayer_requests(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id, "is_anonymous": False} if brand_id else {"is_anonymous": False}
     prayers = await db.prayer_requests.find(query, {"_id": 0, "email": 0}).to_list(100)
     return prayers
@@ -1278,8 +3603,8 @@ async def create_donation(donation_data: DonationCreate, admin = Depends(get_cur
 @api_router.get("/donations", response_model=List[Donation])
 async def get_donations(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    donations = await db.donations.find(query, {"_id": 0}).to_list(1000)
-    return donations
+    donations = await db.donations.find(query, donation_serializer.projection).to_list(1000)
+    return donation_serializer.many(donations)
 
 @api_router.get("/donations/stats")
 async def get_donation_stats(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
@@ -1302,19 +3627,20 @@ async def get_donation_stats(brand_id: Optional[str] = None, admin = Depends(get
 # ========== GALLERY ROUTES ==========
 
 @api_router.get("/gallery", response_model=List[Gallery])
-async def get_gallery_images(brand_id: Optional[str] = None, event_id: Optional[str] = None):
+async def get_gallery_images(brand_id: Optional[str] = Depends(resolve_brand_id), event_id: Optional[str] = None):
     query = {}
     if brand_id:
         query["brand_id"] = brand_id
     if event_id:
         query["event_id"] = event_id
-    images = await db.gallery.find(query, {"_id": 0}).to_list(1000)
-    return images
+    images = await db.gallery.find(query, gallery_serializer.projection).to_list(1000)
+    return gallery_serializer.many(images)
 
 @api_router.post("/gallery", response_model=Gallery)
 async def create_gallery_image(gallery_data: GalleryCreate, admin = Depends(get_current_admin)):
     image = Gallery(**gallery_data.model_dump())
     await db.gallery.insert_one(image.model_dump())
+    await task_queue.enqueue(generate_image_variants, collection="gallery", doc_id=image.id)
     return image
 
 @api_router.delete("/gallery/{image_id}")
@@ -1362,6 +3688,132 @@ async def get_analytics_overview(brand_id: Optional[str] = None, admin = Depends
         }
     }
 
+# ========== MEMBER DIRECTORY ==========
+
+SUGGEST_MAX_RESULTS = 25
+DIRECTORY_FIELDS = {"_id": 0, "id": 1, "name": 1, "email": 1, "phone": 1, "brand_id": 1, "is_active": 1}
+
+def normalize_search_text(value: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).strip()
+
+def phone_digits(value: Optional[str]) -> str:
+    return "".join(ch for ch in value if ch.isdigit()) if value else ""
+
+def directory_keys(user: dict) -> set:
+    """Every string a prefix query should be able to find this user by"""
+    keys = set()
+    name = normalize_search_text(user.get("name") or "")
+    if name:
+        keys.add(name)
+        keys.update(TOKEN_RE.findall(name))
+    email = (user.get("email") or "").lower()
+    if email:
+        keys.add(email)
+        keys.update(TOKEN_RE.findall(email.split("@")[0]))
+    digits = phone_digits(user.get("phone"))
+    if digits:
+        keys.add(digits)
+        # Also findable without the country code
+        if len(digits) > 10:
+            keys.add(digits[-10:])
+    return keys
+
+class MemberDirectory:
+    """Brand-partitioned sorted arrays of (key, user_id) for bisect-based typeahead"""
+
+    def __init__(self):
+        self._keys: Dict[str, List[tuple]] = {}
+        self._users: Dict[str, dict] = {}
+        self._entries: Dict[str, tuple] = {}
+
+    def upsert(self, user: dict, presorted: bool = True):
+        self.remove(user["id"])
+        summary = {field: user.get(field) for field in DIRECTORY_FIELDS if field != "_id"}
+        keys = directory_keys(summary)
+        partition = self._keys.setdefault(summary["brand_id"], [])
+        for key in keys:
+            if presorted:
+                bisect.insort(partition, (key, summary["id"]))
+            else:
+                partition.append((key, summary["id"]))
+        self._users[summary["id"]] = summary
+        self._entries[summary["id"]] = (summary["brand_id"], keys)
+
+    def remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        brand_id, keys = entry
+        partition = self._keys[brand_id]
+        for key in keys:
+            i = bisect.bisect_left(partition, (key, user_id))
+            if i < len(partition) and partition[i] == (key, user_id):
+                del partition[i]
+        del self._users[user_id]
+
+    def set_active(self, user_id: str, is_active: bool):
+        if user_id in self._users:
+            self._users[user_id]["is_active"] = is_active
+
+    def _scan(self, partition: List[tuple], prefix: str, others: List[str], seen: set, limit: int) -> List[str]:
+        """Walk the bisect range for prefix in key order (an exact key sorts first) until limit users match"""
+        found = []
+        i = bisect.bisect_left(partition, (prefix, ""))
+        while i < len(partition) and len(found) < limit:
+            key, user_id = partition[i]
+            if not key.startswith(prefix):
+                break
+            i += 1
+            if user_id in seen:
+                continue
+            keys = self._entries[user_id][1]
+            if all(any(k.startswith(term) for k in keys) for term in others):
+                seen.add(user_id)
+                found.append(user_id)
+        return found
+
+    def suggest(self, q: str, brand_id: Optional[str], limit: int) -> List[dict]:
+        query = normalize_search_text(q)
+        compact = re.sub(r"[\s+\-().]", "", query)
+        if compact.isdigit():
+            terms = [compact]
+        else:
+            terms = [query] if "@" in query else TOKEN_RE.findall(query)
+        if not terms:
+            return []
+        # The longest term narrows the range the most; the others are checked against each candidate's keys
+        terms.sort(key=len, reverse=True)
+        partitions = [self._keys.get(brand_id, [])] if brand_id else list(self._keys.values())
+        seen: set = set()
+        user_ids: List[str] = []
+        for partition in partitions:
+            user_ids.extend(self._scan(partition, terms[0], terms[1:], seen, limit - len(user_ids)))
+            if len(user_ids) >= limit:
+                break
+        return [self._users[user_id] for user_id in user_ids]
+
+    async def build(self):
+        # Append everything, then sort each partition once instead of inserting one key at a time
+        async for user in db.users.find({}, DIRECTORY_FIELDS):
+            self.upsert(user, presorted=False)
+        for partition in self._keys.values():
+            partition.sort()
+
+member_directory = MemberDirectory()
+
+@app.on_event("startup")
+async def build_member_directory():
+    try:
+        await member_directory.build()
+    except PyMongoError as e:
+        logger.error(f"Could not build member directory: {e}")
+
+@api_router.get("/users/suggest")
+async def suggest_users(q: str, limit: int = 10, brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
+    """Typeahead over member name, email and phone"""
+    return FastJSONResponse(member_directory.suggest(q, brand_id, max(1, min(limit, SUGGEST_MAX_RESULTS))))
+
 # ========== MEMBER USER ROUTES ==========
 
 @api_router.post("/users/register", response_model=UserRegisterResponse)
@@ -1378,9 +3830,10 @@ async def register_user(user_data: UserCreate):
         brand_id=user_data.brand_id
     )
     doc = user.model_dump()
-    doc["password_hash"] = hash_password(user_data.password)
+    doc["password_hash"] = await hash_password(user_data.password)
     
     await db.users.insert_one(doc)
+    member_directory.upsert(doc)
     
     token = create_access_token({"email": user.email, "role": "member"})
     return UserRegisterResponse(token=token, user=user)
@@ -1388,7 +3841,7 @@ async def register_user(user_data: UserCreate):
 @api_router.post("/users/login", response_model=UserLoginResponse)
 async def login_user(login_data: UserLogin):
     user = await db.users.find_one({"email": login_data.email}, {"_id": 0})
-    if not user or not verify_password(login_data.password, user["password_hash"]):
+    if not user or not await verify_password(login_data.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user.get("is_active"):
@@ -1414,13 +3867,14 @@ async def update_current_user(user_data: UserUpdate, user = Depends(get_current_
         )
     
     updated_user = await db.users.find_one({"id": user["id"]}, {"_id": 0})
+    member_directory.upsert(updated_user)
     return User(**updated_user)
 
 @api_router.get("/users", response_model=List[User])
 async def get_all_users(brand_id: Optional[str] = None, admin = Depends(get_current_admin)):
     query = {"brand_id": brand_id} if brand_id else {}
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
-    return users
+    users = await db.users.find(query, user_serializer.projection).to_list(1000)
+    return user_serializer.many(users)
 
 @api_router.post("/users", response_model=User)
 async def create_user_by_admin(user_data: UserCreate, admin = Depends(get_current_admin)):
@@ -1436,9 +3890,10 @@ async def create_user_by_admin(user_data: UserCreate, admin = Depends(get_curren
         brand_id=user_data.brand_id
     )
     doc = user.model_dump()
-    doc["password_hash"] = hash_password(user_data.password)
+    doc["password_hash"] = await hash_password(user_data.password)
     
     await db.users.insert_one(doc)
+    member_directory.upsert(doc)
     return user
 
 @api_router.put("/users/{user_id}/status")
@@ -1449,6 +3904,7 @@ async def toggle_user_status(user_id: str, is_active: bool, admin = Depends(get_
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    member_directory.set_active(user_id, is_active)
     return {"message": "User status updated"}
 
 @api_router.delete("/users/{user_id}")
@@ -1456,20 +3912,22 @@ async def delete_user(user_id: str, admin = Depends(get_current_admin)):
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    member_directory.remove(user_id)
     return {"message": "User deleted"}
 
 # ========== GIVING CATEGORY ROUTES ==========
 
 @api_router.get("/giving-categories", response_model=List[GivingCategory])
-async def get_giving_categories(brand_id: Optional[str] = None):
+async def get_giving_categories(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"brand_id": brand_id, "is_active": True} if brand_id else {"is_active": True}
-    categories = await db.giving_categories.find(query, {"_id": 0}).to_list(100)
-    return categories
+    categories = await find_published("giving_categories", query, "giving_categories", brand_id, 100, giving_category_serializer.projection)
+    return giving_category_serializer.many(categories)
 
 @api_router.post("/giving-categories", response_model=GivingCategory)
 async def create_giving_category(category_data: GivingCategoryCreate, admin = Depends(get_current_admin)):
     category = GivingCategory(**category_data.model_dump())
     await db.giving_categories.insert_one(category.model_dump())
+    site_snapshots.invalidate("giving_categories", category.brand_id)
     return category
 
 @api_router.put("/giving-categories/{category_id}", response_model=GivingCategory)
@@ -1480,6 +3938,7 @@ async def update_giving_category(category_id: str, category_data: GivingCategory
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    site_snapshots.invalidate("giving_categories")
     category = await db.giving_categories.find_one({"id": category_id}, {"_id": 0})
     return category
 
@@ -1488,8 +3947,158 @@ async def delete_giving_category(category_id: str, admin = Depends(get_current_a
     result = await db.giving_categories.delete_one({"id": category_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Category not found")
+    site_snapshots.invalidate("giving_categories")
     return {"message": "Category deleted"}
 
+# ========== PAYMENT GATEWAY ==========
+
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE')  # point at a local fake gateway in tests
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_CONNECT_TIMEOUT', '3'))
+PAYMENT_GATEWAY_READ_TIMEOUT = float(os.environ.get('PAYMENT_GATEWAY_READ_TIMEOUT', '10'))
+PAYMENT_GATEWAY_MAX_CONCURRENCY = int(os.environ.get('PAYMENT_GATEWAY_MAX_CONCURRENCY', '20'))
+PAYMENT_GATEWAY_FAILURE_THRESHOLD = int(os.environ.get('PAYMENT_GATEWAY_FAILURE_THRESHOLD', '5'))
+PAYMENT_GATEWAY_RESET_SECONDS = float(os.environ.get('PAYMENT_GATEWAY_RESET_SECONDS', '30'))
+
+# Errors that say the gateway itself is unhealthy, as opposed to a bad request or signature
+GATEWAY_FAILURES = (asyncio.TimeoutError, ConnectionError, stripe.APIConnectionError, stripe.APIError, stripe.RateLimitError)
+
+metrics.describe("payment_gateway_calls_total", "Payment gateway calls by operation and outcome")
+metrics.describe("payment_gateway_call_duration_seconds", "Payment gateway call latency by operation and outcome", kind="histogram")
+
+class PaymentGatewayUnavailable(Exception):
+    pass
+
+class CircuitBreaker:
+    """closed -> open after consecutive failures -> half_open (one trial call) after reset_timeout"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Let another caller make the half-open trial when this one ended without an outcome (e.g. cancelled)"""
+        self._trial_in_flight = False
+
+class PaymentGateway:
+    """Process-wide Stripe checkout client: one pooled keep-alive HTTP session, timeouts,
+    bounded concurrency and a circuit breaker that fails fast while Stripe is degraded."""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(PAYMENT_GATEWAY_FAILURE_THRESHOLD, PAYMENT_GATEWAY_RESET_SECONDS)
+        self.call_timeout = PAYMENT_GATEWAY_CONNECT_TIMEOUT + PAYMENT_GATEWAY_READ_TIMEOUT
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[requests.Session] = None
+        self._checkouts: Dict[str, StripeCheckout] = {}
+
+    def start(self):
+        self._semaphore = asyncio.Semaphore(PAYMENT_GATEWAY_MAX_CONCURRENCY)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PAYMENT_GATEWAY_MAX_CONCURRENCY)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        stripe.default_http_client = stripe.RequestsClient(
+            timeout=(PAYMENT_GATEWAY_CONNECT_TIMEOUT, PAYMENT_GATEWAY_READ_TIMEOUT),
+            session=self._session,
+        )
+        stripe.max_network_retries = 0  # retries would stack on top of our own timeout budget
+        if STRIPE_API_BASE:
+            stripe.api_base = STRIPE_API_BASE
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def checkout(self, webhook_url: str) -> StripeCheckout:
+        checkout = self._checkouts.get(webhook_url)
+        if checkout is None:
+            checkout = self._checkouts[webhook_url] = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+        return checkout
+
+    async def call(self, operation: str, coro_factory):
+        if self._semaphore is None:
+            self.start()
+        # Take a slot before asking the breaker, so a half-open trial is only granted to a call that will run
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.call_timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("payment_gateway_calls_total", operation=operation, outcome="saturated")
+            raise PaymentGatewayUnavailable("Payment gateway is busy")
+        if not self.breaker.allow():
+            self._semaphore.release()
+            metrics.inc("payment_gateway_calls_total", operation=operation, outcome="rejected")
+            raise PaymentGatewayUnavailable("Payment gateway is temporarily unavailable")
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            result = await asyncio.wait_for(coro_factory(), timeout=self.call_timeout)
+            outcome = "success"
+        except GATEWAY_FAILURES as e:
+            outcome = "failure"
+            self.breaker.record_failure()
+            raise PaymentGatewayUnavailable(f"Payment gateway error: {type(e).__name__}") from e
+        except Exception:
+            # The gateway answered; the request itself was bad
+            outcome = "error"
+            self.breaker.record_success()
+            raise
+        finally:
+            if outcome == "cancelled":
+                self.breaker.release_trial()
+            self._semaphore.release()
+            metrics.inc("payment_gateway_calls_total", operation=operation, outcome=outcome)
+            metrics.observe("payment_gateway_call_duration_seconds", time.perf_counter() - started, operation=operation, outcome=outcome)
+        self.breaker.record_success()
+        return result
+
+    async def create_checkout_session(self, webhook_url: str, checkout_request: CheckoutSessionRequest):
+        checkout = self.checkout(webhook_url)
+        return await self.call("create_checkout_session", lambda: checkout.create_checkout_session(checkout_request))
+
+    async def get_checkout_status(self, webhook_url: str, session_id: str):
+        checkout = self.checkout(webhook_url)
+        return await self.call("get_checkout_status", lambda: checkout.get_checkout_status(session_id))
+
+    async def handle_webhook(self, webhook_url: str, body: bytes, signature: Optional[str]):
+        checkout = self.checkout(webhook_url)
+        return await checkout.handle_webhook(body, signature)
+
+payment_gateway = PaymentGateway()
+
+@app.on_event("startup")
+async def start_payment_gateway():
+    payment_gateway.start()
+
+@app.on_event("shutdown")
+async def close_payment_gateway():
+    payment_gateway.close()
+
 # ========== STRIPE PAYMENT ROUTES ==========
 
 @api_router.post("/payments/create-checkout")
@@ -1502,9 +4111,7 @@ async def create_checkout_session(
         # Get host URL from request
         host_url = str(request.base_url).rstrip('/')
         
-        # Initialize Stripe checkout
         webhook_url = f"{host_url}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
         
         # Build success and cancel URLs
         success_url = f"{host_url}/giving/success?session_id={{CHECKOUT_SESSION_ID}}"
@@ -1533,7 +4140,7 @@ async def create_checkout_session(
             metadata=metadata
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        session = await payment_gateway.create_checkout_session(webhook_url, checkout_request)
         
         # Create payment transaction record
         transaction = PaymentTransaction(
@@ -1558,49 +4165,261 @@ async def create_checkout_session(
             "session_id": session.session_id
         }
         
+    except PaymentGatewayUnavailable as e:
+        logger.warning(f"Checkout unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Payments are temporarily unavailable, please try again shortly")
     except Exception as e:
         logger.error(f"Error creating checkout session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to create checkout session: {str(e)}")
 
+PAYMENT_STATUS_CACHE_SECONDS = float(os.environ.get('PAYMENT_STATUS_CACHE_SECONDS', '3'))
+TERMINAL_TRANSACTION_STATUSES = {"completed", "failed", "expired"}
+
+payment_status_cache = TTLCache("payment_status", PAYMENT_STATUS_CACHE_SECONDS)
+payment_status_flight = SingleFlight("payment_status")
+
+def is_terminal_transaction(transaction: dict) -> bool:
+    return transaction.get("payment_status") == "paid" or transaction.get("status") in TERMINAL_TRANSACTION_STATUSES
+
+def payment_webhook_url() -> str:
+    return f"{os.environ.get('BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
+
+def checkout_status_update(checkout_status) -> dict:
+    return {
+        "payment_status": checkout_status.payment_status,
+        "status": "completed" if checkout_status.payment_status == "paid" else checkout_status.status,
+        "updated_at": datetime.now(timezone.utc).isoformat()
+    }
+
+async def refresh_payment_status(session_id: str) -> dict:
+    # Get transaction from database
+    transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    
+    if not transaction:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    
+    # Settled transactions never change again, so the document is the answer
+    if is_terminal_transaction(transaction):
+        return transaction
+    
+    # Check status with Stripe
+    checkout_status = await payment_gateway.get_checkout_status(payment_webhook_url(), session_id)
+    
+    # Update transaction in database and read it back in the same round trip
+    update_data = checkout_status_update(checkout_status)
+    
+    updated_transaction = await db.payment_transactions.find_one_and_update(
+        {"session_id": session_id},
+        {"$set": update_data},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    
+    if not is_terminal_transaction(updated_transaction):
+        payment_status_cache.set(session_id, updated_transaction)
+    return updated_transaction
+
 @api_router.get("/payments/status/{session_id}")
 async def get_payment_status(session_id: str):
     try:
-        # Get transaction from database
-        transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-        
-        if not transaction:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        # If already completed, return existing status
-        if transaction.get("payment_status") == "paid":
-            return transaction
+        cached = payment_status_cache.get(session_id)
+        if cached is not None:
+            return cached
+        # Concurrent polls for the same session share one gateway call
+        return await payment_status_flight.do(session_id, lambda: refresh_payment_status(session_id))
         
-        # Check status with Stripe
-        webhook_url = f"{os.environ.get('BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-        
-        checkout_status = await stripe_checkout.get_checkout_status(session_id)
-        
-        # Update transaction in database
+    except HTTPException:
+        raise
+    except PaymentGatewayUnavailable as e:
+        logger.warning(f"Payment status check unavailable: {str(e)}")
+        raise HTTPException(status_code=503, detail="Payment status is temporarily unavailable, please try again shortly")
+    except Exception as e:
+        logger.error(f"Error checking payment status: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to check payment status: {str(e)}")
+
+# ========== STRIPE WEBHOOK INBOX ==========
+
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_LEASE_SECONDS = 60
+WEBHOOK_POLL_SECONDS = 5
+
+metrics.describe("stripe_webhook_events_total", "Stripe webhook events by outcome")
+
+def utc_after(seconds: float) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+class WebhookInbox:
+    """Durable inbox for Stripe webhook events.
+
+    The route only verifies, stores the event under a unique event_id and acknowledges.
+    This worker applies the transitions afterwards: in arrival order per checkout session
+    (a session's events wait while an older one is unfinished, even across batches and
+    workers), with exponential-backoff retries, parking events as "dead" after WEBHOOK_MAX_ATTEMPTS.
+    """
+
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await db.stripe_webhook_events.create_index("event_id", unique=True)
+        await db.stripe_webhook_events.create_index([("status", 1), ("next_attempt_at", 1)])
+        await db.stripe_webhook_events.create_index([("session_id", 1), ("status", 1)])
+
+    async def accept(self, webhook_response, body: bytes) -> bool:
+        """Persist a verified event; False if it was already received"""
+        event_id = getattr(webhook_response, "event_id", None) or hashlib.sha256(body).hexdigest()
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            await db.stripe_webhook_events.insert_one({
+                "event_id": event_id,
+                "event_type": getattr(webhook_response, "event_type", None),
+                "session_id": webhook_response.session_id,
+                "payment_status": webhook_response.payment_status,
+                "payload": body.decode("utf-8", errors="replace"),
+                "status": "pending",
+                "attempts": 0,
+                "last_error": None,
+                "received_at": now,
+                "next_attempt_at": now,
+            })
+        except DuplicateKeyError:
+            metrics.inc("stripe_webhook_events_total", outcome="duplicate")
+            return False
+        metrics.inc("stripe_webhook_events_total", outcome="received")
+        self._wakeup.set()
+        return True
+
+    async def apply(self, event: dict):
+        if not event.get("session_id"):
+            return
         update_data = {
-            "payment_status": checkout_status.payment_status,
-            "status": "completed" if checkout_status.payment_status == "paid" else checkout_status.status,
+            "payment_status": event["payment_status"],
+            "status": "completed" if event["payment_status"] == "paid" else "failed",
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
-        
+        # A late or out-of-order event must never take a paid transaction back
         await db.payment_transactions.update_one(
-            {"session_id": session_id},
+            {"session_id": event["session_id"], "payment_status": {"$ne": "paid"}},
             {"$set": update_data}
         )
-        
-        # Get updated transaction
-        updated_transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-        
-        return updated_transaction
-        
-    except Exception as e:
-        logger.error(f"Error checking payment status: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to check payment status: {str(e)}")
+        payment_status_cache.pop(event["session_id"])
+
+    async def _claim_batch(self) -> List[dict]:
+        now = datetime.now(timezone.utc).isoformat()
+        due = await db.stripe_webhook_events.find(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lte": now}},
+            ]},
+            {"_id": 0, "payload": 0}
+        ).sort("received_at", 1).limit(WEBHOOK_BATCH_SIZE).to_list(WEBHOOK_BATCH_SIZE)
+        # A session waits while an older event of it is still unfinished outside this batch
+        # (backing off, or leased by another worker), so its events are applied in order
+        first_due: Dict[str, str] = {}
+        for event in due:
+            if event.get("session_id"):
+                first_due.setdefault(event["session_id"], event["received_at"])
+        blocked = set()
+        if first_due:
+            unfinished = db.stripe_webhook_events.find(
+                {
+                    "session_id": {"$in": list(first_due)},
+                    "status": {"$in": ["pending", "processing"]},
+                    "event_id": {"$nin": [event["event_id"] for event in due]},
+                },
+                {"_id": 0, "session_id": 1, "received_at": 1}
+            )
+            async for event in unfinished:
+                if event["received_at"] < first_due[event["session_id"]]:
+                    blocked.add(event["session_id"])
+        claimed = []
+        for event in due:
+            if event.get("session_id") in blocked:
+                continue
+            # Conditional claim so several workers never apply the same event twice; an expired
+            # lease is only taken over if nobody renewed or reclaimed it since we read it
+            claim = {"event_id": event["event_id"], "status": event["status"]}
+            if event["status"] == "processing":
+                claim["locked_until"] = event["locked_until"]
+            result = await db.stripe_webhook_events.update_one(
+                claim,
+                {"$set": {"status": "processing", "locked_until": utc_after(WEBHOOK_LEASE_SECONDS)}}
+            )
+            if result.modified_count:
+                claimed.append(event)
+            elif event.get("session_id"):
+                blocked.add(event["session_id"])  # another worker has it; later events of the session wait
+        return claimed
+
+    async def _process_session(self, events: List[dict]):
+        for i, event in enumerate(events):
+            try:
+                await self.apply(event)
+            except Exception as e:
+                attempts = event.get("attempts", 0) + 1
+                dead = attempts >= WEBHOOK_MAX_ATTEMPTS
+                # Later events for this session wait behind the failed one to keep their order
+                for later in events[i:]:
+                    await db.stripe_webhook_events.update_one(
+                        {"event_id": later["event_id"]},
+                        {"$set": {
+                            "status": "dead" if dead and later is event else "pending",
+                            "attempts": attempts if later is event else later.get("attempts", 0),
+                            "last_error": str(e) if later is event else later.get("last_error"),
+                            "next_attempt_at": utc_after(min(2 ** attempts, 300)),
+                        }}
+                    )
+                metrics.inc("stripe_webhook_events_total", outcome="dead" if dead else "retried")
+                logger.error(f"Applying webhook event {event['event_id']} failed (attempt {attempts}): {e}")
+                return
+            await db.stripe_webhook_events.update_one(
+                {"event_id": event["event_id"]},
+                {"$set": {"status": "applied", "applied_at": datetime.now(timezone.utc).isoformat()}}
+            )
+            metrics.inc("stripe_webhook_events_total", outcome="applied")
+
+    async def run(self):
+        while True:
+            try:
+                events = await self._claim_batch()
+                by_session: Dict[str, List[dict]] = {}
+                for event in events:
+                    by_session.setdefault(event.get("session_id") or event["event_id"], []).append(event)
+                await asyncio.gather(*(self._process_session(session_events) for session_events in by_session.values()))
+                if len(events) == WEBHOOK_BATCH_SIZE:
+                    continue
+            except PyMongoError as e:
+                logger.error(f"Webhook inbox worker error: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=WEBHOOK_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+webhook_inbox = WebhookInbox()
+
+@app.on_event("startup")
+async def start_webhook_inbox():
+    try:
+        await webhook_inbox.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create webhook inbox indexes: {e}")
+    webhook_inbox.start()
+
+@app.on_event("shutdown")
+async def stop_webhook_inbox():
+    await webhook_inbox.stop()
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
@@ -1609,28 +4428,14 @@ async def stripe_webhook(request: Request):
         signature = request.headers.get("Stripe-Signature")
         
         webhook_url = f"{str(request.base_url).rstrip('/')}/api/webhook/stripe"
-        stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-        
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        # Update transaction based on webhook
-        if webhook_response.session_id:
-            update_data = {
-                "payment_status": webhook_response.payment_status,
-                "status": "completed" if webhook_response.payment_status == "paid" else "failed",
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            await db.payment_transactions.update_one(
-                {"session_id": webhook_response.session_id},
-                {"$set": update_data}
-            )
-        
-        return {"status": "success"}
-        
+        webhook_response = await payment_gateway.handle_webhook(webhook_url, body, signature)
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    
+    # Acknowledge as soon as the event is durable; the inbox worker applies it
+    accepted = await webhook_inbox.accept(webhook_response, body)
+    return {"status": "success" if accepted else "duplicate"}
 
 @api_router.get("/payments/history")
 async def get_payment_history(
@@ -1674,21 +4479,225 @@ async def get_payment_stats(
         "recent_transactions": transactions[:10]
     }
 
+# ========== PAYMENT RECONCILIATION ==========
+
+RECONCILE_AFTER_MINUTES = float(os.environ.get('RECONCILE_AFTER_MINUTES', '60'))
+RECONCILE_INTERVAL_SECONDS = float(os.environ.get('RECONCILE_INTERVAL_SECONDS', '900'))  # 0 disables the periodic sweep
+RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', '5'))
+RECONCILE_RATE_PER_SECOND = float(os.environ.get('RECONCILE_RATE_PER_SECOND', '10'))
+RECONCILE_CHUNK_SIZE = 200
+RECONCILE_SAMPLE_SIZE = 50
+STALE_PAYMENT_STATUSES = ["pending", "unpaid"]
+
+metrics.describe("payment_reconcile_transactions_total", "Stale transactions checked by the reconciliation sweep, by outcome")
+
+class TokenBucket:
+    """Async token bucket: at most `rate` acquisitions per second with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class PaymentReconciler:
+    """Settles transactions that never heard back from a webhook or a status poll.
+
+    Walks stale pending transactions oldest first, asks the gateway about each one with
+    bounded parallelism and a request rate limit, and writes every chunk's changes back
+    in one unordered bulk_write. Progress is readable while a sweep runs.
+    """
+
+    def __init__(self):
+        self.progress: Optional[dict] = None
+        self._running: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_indexes(self):
+        await db.payment_transactions.create_index([("payment_status", 1), ("created_at", 1)])
+
+    @property
+    def running(self) -> bool:
+        return self._running is not None and not self._running.done()
+
+    def stale_query(self, older_than_minutes: float) -> dict:
+        cutoff = (datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)).isoformat()
+        return {
+            "payment_status": {"$in": STALE_PAYMENT_STATUSES},
+            "created_at": {"$lt": cutoff},
+            "status": {"$nin": list(TERMINAL_TRANSACTION_STATUSES)},
+        }
+
+    async def _check(self, transaction: dict, semaphore: asyncio.Semaphore, bucket: TokenBucket):
+        async with semaphore:
+            await bucket.acquire()
+            return await payment_gateway.get_checkout_status(payment_webhook_url(), transaction["session_id"])
+
+    async def _reconcile_chunk(self, chunk: List[dict], report: dict, semaphore: asyncio.Semaphore, bucket: TokenBucket):
+        results = await asyncio.gather(*(self._check(t, semaphore, bucket) for t in chunk), return_exceptions=True)
+        operations, session_ids = [], []
+        for transaction, result in zip(chunk, results):
+            report["checked"] += 1
+            if isinstance(result, PaymentGatewayUnavailable):
+                raise result
+            if isinstance(result, Exception):
+                report["errors"] += 1
+                metrics.inc("payment_reconcile_transactions_total", outcome="error")
+                logger.warning(f"Reconciling {transaction['session_id']} failed: {result}")
+                continue
+            update_data = checkout_status_update(result)
+            if (update_data["payment_status"], update_data["status"]) == (transaction.get("payment_status"), transaction.get("status")):
+                report["unchanged"] += 1
+                metrics.inc("payment_reconcile_transactions_total", outcome="unchanged")
+                continue
+            report["changed"] += 1
+            metrics.inc("payment_reconcile_transactions_total", outcome="changed")
+            if len(report["changes"]) < RECONCILE_SAMPLE_SIZE:
+                report["changes"].append({
+                    "session_id": transaction["session_id"],
+                    "from": {"payment_status": transaction.get("payment_status"), "status": transaction.get("status")},
+                    "to": {"payment_status": update_data["payment_status"], "status": update_data["status"]},
+                })
+            session_ids.append(transaction["session_id"])
+            operations.append(UpdateOne(
+                {"session_id": transaction["session_id"], "payment_status": {"$ne": "paid"}},
+                {"$set": update_data}
+            ))
+        if operations and not report["dry_run"]:
+            result = await db.payment_transactions.bulk_write(operations, ordered=False)
+            report["applied"] += result.modified_count
+            for session_id in session_ids:
+                payment_status_cache.pop(session_id)
+
+    async def sweep(self, dry_run: bool = False, older_than_minutes: float = RECONCILE_AFTER_MINUTES, limit: Optional[int] = None) -> dict:
+        report = self.progress = {
+            "state": "running",
+            "dry_run": dry_run,
+            "older_than_minutes": older_than_minutes,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "finished_at": None,
+            "scanned": 0,
+            "checked": 0,
+            "changed": 0,
+            "applied": 0,
+            "unchanged": 0,
+            "errors": 0,
+            "changes": [],
+            "aborted": None,
+        }
+        semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+        bucket = TokenBucket(RECONCILE_RATE_PER_SECOND)
+        cursor = db.payment_transactions.find(
+            self.stale_query(older_than_minutes),
+            {"_id": 0, "session_id": 1, "payment_status": 1, "status": 1}
+        ).sort("created_at", 1).batch_size(RECONCILE_CHUNK_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        try:
+            chunk = []
+            async for transaction in cursor:
+                report["scanned"] += 1
+                chunk.append(transaction)
+                if len(chunk) >= RECONCILE_CHUNK_SIZE:
+                    await self._reconcile_chunk(chunk, report, semaphore, bucket)
+                    chunk = []
+            if chunk:
+                await self._reconcile_chunk(chunk, report, semaphore, bucket)
+            report["state"] = "finished"
+        except PaymentGatewayUnavailable as e:
+            # No point hammering a tripped breaker; the next sweep picks up where this stopped
+            report["state"] = "aborted"
+            report["aborted"] = str(e)
+        except Exception as e:
+            report["state"] = "failed"
+            report["aborted"] = str(e)
+            logger.error(f"Payment reconciliation failed: {e}")
+        report["finished_at"] = datetime.now(timezone.utc).isoformat()
+        if report["scanned"]:
+            logger.info(
+                f"Payment reconciliation {report['state']}{' (dry run)' if dry_run else ''}: "
+                f"{report['scanned']} stale, {report['changed']} changed, {report['applied']} applied, {report['errors']} errors"
+            )
+        return report
+
+    def start_sweep(self, **kwargs) -> bool:
+        if self.running:
+            return False
+        self._running = spawn_background(self.sweep(**kwargs), "payment reconciliation")
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(RECONCILE_INTERVAL_SECONDS)
+            if not self.running:
+                self.start_sweep()
+
+    def start(self):
+        if self._task is None and RECONCILE_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+payment_reconciler = PaymentReconciler()
+
+@app.on_event("startup")
+async def start_payment_reconciler():
+    try:
+        await payment_reconciler.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create payment reconciliation index: {e}")
+    payment_reconciler.start()
+
+@app.on_event("shutdown")
+async def stop_payment_reconciler():
+    await payment_reconciler.stop()
+
+@api_router.post("/payments/reconcile", status_code=202)
+async def reconcile_payments(
+    dry_run: bool = False,
+    older_than_minutes: float = RECONCILE_AFTER_MINUTES,
+    limit: Optional[int] = None,
+    admin = Depends(get_current_admin)
+):
+    if not payment_reconciler.start_sweep(dry_run=dry_run, older_than_minutes=older_than_minutes, limit=limit):
+        raise HTTPException(status_code=409, detail="A reconciliation sweep is already running")
+    await asyncio.sleep(0)  # let the sweep publish its progress report
+    return payment_reconciler.progress
+
+@api_router.get("/payments/reconcile")
+async def get_reconcile_progress(admin = Depends(get_current_admin)):
+    return payment_reconciler.progress or {"state": "idle"}
+
 # ========== LIVE STREAM ROUTES ==========
 
 @api_router.get("/live-streams", response_model=List[LiveStream])
-async def get_live_streams(brand_id: Optional[str] = None, is_live: Optional[bool] = None):
+async def get_live_streams(brand_id: Optional[str] = Depends(resolve_brand_id), is_live: Optional[bool] = None):
     query = {}
     if brand_id:
         query["brand_id"] = brand_id
     if is_live is not None:
         query["is_live"] = is_live
     
-    streams = await db.live_streams.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return streams
+    streams = await db.live_streams.find(query, live_stream_serializer.projection).sort("created_at", -1).to_list(100)
+    return live_stream_serializer.many(streams)
 
 @api_router.get("/live-streams/active")
-async def get_active_stream(brand_id: Optional[str] = None):
+async def get_active_stream(brand_id: Optional[str] = Depends(resolve_brand_id)):
     query = {"is_live": True}
     if brand_id:
         query["brand_id"] = brand_id
@@ -1723,50 +4732,231 @@ async def delete_live_stream(stream_id: str, admin = Depends(get_current_admin))
     return {"message": "Live stream deleted"}
 
 
+# ========== FOUNDATION DONATION COUNTERS ==========
+
+FOUNDATION_COUNTER_SHARDS = int(os.environ.get('FOUNDATION_COUNTER_SHARDS', '16'))
+FOUNDATION_TOTALS_CACHE_SECONDS = float(os.environ.get('FOUNDATION_TOTALS_CACHE_SECONDS', '2'))
+FOUNDATION_RECONCILE_SECONDS = float(os.environ.get('FOUNDATION_RECONCILE_SECONDS', '300'))
+DONATION_APPLY_GRACE_SECONDS = 60
+
+class FoundationCounters:
+    """Sharded raised_amount counters.
+
+    Each donation increments one of FOUNDATION_COUNTER_SHARDS documents in
+    `foundation_counters` picked at random, so concurrent gifts to the same
+    foundation land on different documents. Reads sum the shards and cache the
+    total briefly. `donations_baseline` on the foundation holds money raised
+    outside recorded donations (seeded or offline totals), so the authoritative
+    amount is always baseline + sum(foundation_donations).
+    """
+
+    def __init__(self):
+        self.totals_cache = TTLCache("foundation_totals", FOUNDATION_TOTALS_CACHE_SECONDS)
+        self.transactions_supported = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def setup(self):
+        await db.foundation_counters.create_index([("foundation_id", 1), ("shard", 1)], unique=True)
+        await db.foundation_donations.create_index([("counter_applied", 1), ("created_at", 1)])
+        await db.foundation_donations.create_index("counter_applied_at")
+        try:
+            hello = await client.admin.command("hello")
+            self.transactions_supported = bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+        except PyMongoError:
+            self.transactions_supported = False
+
+    def _increment(self, donation: dict) -> tuple:
+        return (
+            {"foundation_id": donation["foundation_id"], "shard": random.randrange(FOUNDATION_COUNTER_SHARDS)},
+            {"$inc": {"amount": donation["amount"]}},
+        )
+
+    async def record_donation(self, donation: dict):
+        """Insert the donation and bump one counter shard as a single logical write"""
+        if self.transactions_supported:
+            shard_filter, increment = self._increment(donation)
+            applied_at = datetime.now(timezone.utc).isoformat()
+            async def write(session):
+                await db.foundation_donations.insert_one(
+                    {**donation, "counter_applied": True, "counter_applied_at": applied_at}, session=session
+                )
+                await db.foundation_counters.update_one(shard_filter, increment, upsert=True, session=session)
+            async with await client.start_session() as session:
+                await session.with_transaction(write)
+            return
+        # Standalone servers: insert unapplied, then apply through the same claim reconcile() uses
+        await db.foundation_donations.insert_one({**donation, "counter_applied": False})
+        await self.apply(donation["id"])
+
+    async def apply(self, donation_id: str) -> bool:
+        """Add an unapplied donation to a shard. Only the caller that flips counter_applied
+        applies it, so a donation is never counted by both a request and reconcile()."""
+        donation = await db.foundation_donations.find_one_and_update(
+            {"id": donation_id, "counter_applied": False},
+            {"$set": {"counter_applied": True, "counter_applied_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0, "foundation_id": 1, "amount": 1}
+        )
+        if donation is None:
+            return False
+        shard_filter, increment = self._increment(donation)
+        # A crash before this increment is repaired by reconcile()'s correction
+        await db.foundation_counters.update_one(shard_filter, increment, upsert=True)
+        return True
+
+    async def totals(self, foundation_ids: List[str]) -> Dict[str, float]:
+        """Summed shard totals; foundations without counters yet are left out"""
+        result, missing = {}, []
+        for foundation_id in foundation_ids:
+            cached = self.totals_cache.get(foundation_id)
+            if cached is None:
+                missing.append(foundation_id)
+            else:
+                result[foundation_id] = cached
+        if missing:
+            rows = await db.foundation_counters.aggregate([
+                {"$match": {"foundation_id": {"$in": missing}}},
+                {"$group": {"_id": "$foundation_id", "amount": {"$sum": "$amount"}}},
+            ]).to_list(None)
+            for row in rows:
+                result[row["_id"]] = round(row["amount"], 2)
+                self.totals_cache.set(row["_id"], result[row["_id"]])
+        return result
+
+    async def overlay(self, foundations: List[dict]) -> List[dict]:
+        """Replace raised_amount with the live shard total on foundations reconcile() has migrated"""
+        migrated = [f["id"] for f in foundations if f.pop("donations_baseline", None) is not None]
+        totals = await self.totals(migrated)
+        for foundation in foundations:
+            if foundation.get("id") in totals:
+                foundation["raised_amount"] = totals[foundation["id"]]
+        return foundations
+
+    async def _sums(self, collection, match: dict) -> Dict[str, float]:
+        rows = await collection.aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$foundation_id", "amount": {"$sum": "$amount"}}},
+        ]).to_list(None)
+        return {row["_id"]: row["amount"] for row in rows}
+
+    async def reconcile(self) -> dict:
+        """Rebuild every foundation's counters and raised_amount from its applied donations.
+
+        The shard and donation sums are read at slightly different times, so foundations with a
+        donation applied (or still waiting to be) since shortly before this sweep started are
+        skipped and left for the next one; the rest cannot have changed between the two reads.
+        """
+        report = {"foundations": 0, "migrated": 0, "corrected": 0, "skipped": 0, "repaired_donations": 0}
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=DONATION_APPLY_GRACE_SECONDS)).isoformat()
+        stale = await db.foundation_donations.find(
+            {"counter_applied": False, "created_at": {"$lt": cutoff}}, {"_id": 0, "id": 1}
+        ).to_list(None)
+        for donation in stale:
+            if await self.apply(donation["id"]):
+                report["repaired_donations"] += 1
+        # Donations written before counters existed carry no counter_applied field
+        legacy = await self._sums(db.foundation_donations, {"counter_applied": {"$exists": False}})
+        shard_totals = await self._sums(db.foundation_counters, {})
+        donation_totals = await self._sums(db.foundation_donations, {"counter_applied": {"$ne": False}})
+        busy = set(await db.foundation_donations.distinct("foundation_id", {"$or": [
+            {"counter_applied": False}, {"counter_applied_at": {"$gte": cutoff}},
+        ]}))
+
+        async for foundation in db.foundations.find({}, {"_id": 0, "id": 1, "raised_amount": 1, "donations_baseline": 1}):
+            foundation_id = foundation["id"]
+            report["foundations"] += 1
+            if foundation_id in busy:
+                report["skipped"] += 1
+                continue
+            baseline = foundation.get("donations_baseline")
+            if baseline is None:
+                baseline = round(foundation.get("raised_amount", 0.0) - legacy.get(foundation_id, 0.0), 2)
+                report["migrated"] += 1
+            expected = round(baseline + donation_totals.get(foundation_id, 0.0), 2)
+            delta = round(expected - shard_totals.get(foundation_id, 0.0), 2)
+            if delta:
+                await db.foundation_counters.update_one(
+                    {"foundation_id": foundation_id, "shard": 0}, {"$inc": {"amount": delta}}, upsert=True
+                )
+                report["corrected"] += 1
+            await db.foundations.update_one(
+                {"id": foundation_id}, {"$set": {"raised_amount": expected, "donations_baseline": baseline}}
+            )
+            self.totals_cache.pop(foundation_id)
+        return report
+
+    async def run(self):
+        while True:
+            try:
+                report = await self.reconcile()
+                if report["corrected"] or report["migrated"]:
+                    logger.info(f"Foundation counters reconciled: {report}")
+            except PyMongoError as e:
+                logger.error(f"Foundation counter reconciliation failed: {e}")
+            await asyncio.sleep(FOUNDATION_RECONCILE_SECONDS)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+foundation_counters = FoundationCounters()
+
+@app.on_event("startup")
+async def start_foundation_counters():
+    try:
+        await foundation_counters.setup()
+    except PyMongoError as e:
+        logger.error(f"Could not set up foundation counters: {e}")
+    foundation_counters.start()
+
+@app.on_event("shutdown")
+async def stop_foundation_counters():
+    await foundation_counters.stop()
+
 # ========== FOUNDATION ROUTES ==========
 
 @api_router.get("/foundations", response_model=List[Foundation])
-async def get_foundations(brand_id: Optional[str] = None, is_active: Optional[bool] = None):
+async def get_foundations(brand_id: Optional[str] = Depends(resolve_brand_id), is_active: Optional[bool] = None):
     query = {}
     if brand_id:
         query["brand_id"] = brand_id
     if is_active is not None:
         query["is_active"] = is_active
     
-    foundations = await db.foundations.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return foundations
+    foundations = await db.foundations.find(query, {**foundation_serializer.projection, "donations_baseline": 1}).sort("created_at", -1).to_list(100)
+    return foundation_serializer.many(await foundation_counters.overlay(foundations))
 
 @api_router.get("/foundations/{foundation_id}", response_model=Foundation)
 async def get_foundation(foundation_id: str):
     foundation = await db.foundations.find_one({"id": foundation_id}, {"_id": 0})
     if not foundation:
         raise HTTPException(status_code=404, detail="Foundation not found")
+    await foundation_counters.overlay([foundation])
     return foundation
 
 @api_router.post("/foundations", response_model=Foundation)
 async def create_foundation(foundation: FoundationCreate, admin = Depends(get_current_admin)):
     foundation_dict = foundation.model_dump()
     foundation_obj = Foundation(**foundation_dict)
-    await db.foundations.insert_one(foundation_obj.model_dump())
+    await db.foundations.insert_one({**foundation_obj.model_dump(), "donations_baseline": 0.0})
+    await task_queue.enqueue(generate_image_variants, collection="foundations", doc_id=foundation_obj.id)
     return foundation_obj
 
 @api_router.post("/foundations/donate")
 async def donate_to_foundation(donation: FoundationDonationCreate):
     # Verify foundation exists
-    foundation = await db.foundations.find_one({"id": donation.foundation_id}, {"_id": 0})
+    foundation = await db.foundations.find_one({"id": donation.foundation_id}, {"_id": 0, "id": 1})
     if not foundation:
         raise HTTPException(status_code=404, detail="Foundation not found")
     
-    # Create donation record
+    # Create donation record and count it towards a raised_amount shard
     donation_dict = donation.model_dump()
     donation_obj = FoundationDonation(**donation_dict, payment_status="completed")
-    await db.foundation_donations.insert_one(donation_obj.model_dump())
-    
-    # Update foundation raised amount
-    await db.foundations.update_one(
-        {"id": donation.foundation_id},
-        {"$inc": {"raised_amount": donation.amount}}
-    )
+    await foundation_counters.record_donation(donation_obj.model_dump())
     
     return donation_obj
 
@@ -1774,15 +4964,19 @@ async def donate_to_foundation(donation: FoundationDonationCreate):
 async def get_foundation_donations(foundation_id: str, admin = Depends(get_current_admin)):
     donations = await db.foundation_donations.find(
         {"foundation_id": foundation_id}, 
-        {"_id": 0}
+        {"_id": 0, "counter_applied": 0}
     ).sort("created_at", -1).to_list(1000)
     return donations
 
+@api_router.post("/foundations/reconcile")
+async def reconcile_foundation_totals(admin = Depends(get_current_admin)):
+    return await foundation_counters.reconcile()
+
 
 # ========== PAGE BANNER ENDPOINTS ==========
 
 @api_router.get("/page-banners", response_model=List[PageBanner])
-async def get_page_banners(brand_id: Optional[str] = None, page_type: Optional[str] = None):
+async def get_page_banners(brand_id: Optional[str] = Depends(resolve_brand_id), page_type: Optional[str] = None):
     """Get all page banners, optionally filtered by brand_id and page_type"""
     query = {}
     if brand_id:
@@ -1790,8 +4984,8 @@ async def get_page_banners(brand_id: Optional[str] = None, page_type: Optional[s
     if page_type:
         query["page_type"] = page_type
     
-    banners = await db.page_banners.find(query, {"_id": 0}).to_list(1000)
-    return banners
+    banners = await find_published("page_banners", query, "banners", brand_id, 1000, page_banner_serializer.projection)
+    return page_banner_serializer.many(banners)
 
 @api_router.get("/page-banners/{banner_id}", response_model=PageBanner)
 async def get_page_banner(banner_id: str):
@@ -1818,6 +5012,8 @@ async def create_page_banner(banner: PageBannerCreate, admin = Depends(get_curre
     
     banner_dict = PageBanner(**banner.model_dump()).model_dump()
     await db.page_banners.insert_one(banner_dict)
+    site_snapshots.invalidate("banners", banner.brand_id)
+    await task_queue.enqueue(generate_image_variants, collection="page_banners", doc_id=banner_dict["id"])
     return banner_dict
 
 @api_router.put("/page-banners/{banner_id}", response_model=PageBanner)
@@ -1829,11 +5025,17 @@ async def update_page_banner(banner_id: str, banner_update: PageBannerUpdate, ad
     
     update_data = {k: v for k, v in banner_update.model_dump().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    image_changed = "image_url" in update_data and update_data["image_url"] != existing_banner.get("image_url")
+    if image_changed:
+        update_data["image_variants"] = None
     
     await db.page_banners.update_one(
         {"id": banner_id},
         {"$set": update_data}
     )
+    site_snapshots.invalidate("banners")
+    if image_changed:
+        await task_queue.enqueue(generate_image_variants, collection="page_banners", doc_id=banner_id)
     
     updated_banner = await db.page_banners.find_one({"id": banner_id}, {"_id": 0})
     return updated_banner
@@ -1844,11 +5046,1105 @@ async def delete_page_banner(banner_id: str, admin = Depends(get_current_admin))
     result = await db.page_banners.delete_one({"id": banner_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Page banner not found")
+    site_snapshots.invalidate("banners")
     return {"message": "Page banner deleted successfully"}
 
+# ========== PUBLISHED SITE SNAPSHOT ==========
+
+# section name -> (collection, extra filter, max documents); each matches what its public list route
+# returns, since find_published serves these sections when Mongo is degraded
+SNAPSHOT_SECTIONS = {
+    "banners": ("page_banners", {}, 1000),
+    "events": ("events", {}, 1000),
+    "ministries": ("ministries", {}, 1000),
+    "announcements": ("announcements", {}, 1000),
+    "testimonials": ("testimonials", {}, 1000),
+    "giving_categories": ("giving_categories", {"is_active": True}, 100),
+}
+
+class SiteSnapshot:
+    """Immutable, precompressed JSON document holding everything a public page needs for one brand"""
+    __slots__ = ("brand_id", "brand", "sections", "body", "gzip_body", "br_body", "etag", "built_at")
+
+    def __init__(self, brand_id: str, brand: dict, sections: Dict[str, list]):
+        self.brand_id = brand_id
+        self.brand = brand
+        self.sections = sections
+        self.built_at = datetime.now(timezone.utc).isoformat()
+        payload = {"brand": brand, **sections, "built_at": self.built_at}
+        self.body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.br_body = brotli.compress(self.body, quality=11) if brotli is not None else None
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+
+SITE_SNAPSHOT_SYNC_SECONDS = float(os.environ.get('SITE_SNAPSHOT_SYNC_SECONDS', '5'))
+
+class SiteSnapshotStore:
+    """Keeps one SiteSnapshot per brand in memory and rebuilds only the sections an admin write touched.
+
+    Writes also bump a per-section version in site_snapshot_versions, and every process compares
+    those versions every SITE_SNAPSHOT_SYNC_SECONDS, so workers that did not handle the write
+    catch up too.
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, SiteSnapshot] = {}
+        self._dirty: Dict[str, set] = {}
+        self._rebuilds: Dict[str, asyncio.Task] = {}
+        self._versions: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def get(self, brand_id: str) -> Optional[SiteSnapshot]:
+        return self._snapshots.get(brand_id)
+
+    def section(self, brand_id: str, name: str) -> Optional[list]:
+        snapshot = self._snapshots.get(brand_id)
+        if snapshot is None:
+            return None
+        if name == "brand":
+            return [snapshot.brand]
+        return snapshot.sections.get(name)
+
+    async def _load_section(self, brand_id: str, name: str) -> list:
+        collection, extra, limit = SNAPSHOT_SECTIONS[name]
+        query = {"brand_id": brand_id, **extra}
+        return await db[collection].find(query, {"_id": 0}).to_list(limit)
+
+    async def build(self, brand_id: str, names: Optional[set] = None) -> Optional[SiteSnapshot]:
+        brand = await db.brands.find_one({"id": brand_id}, {"_id": 0})
+        if not brand:
+            self._snapshots.pop(brand_id, None)
+            return None
+        previous = self._snapshots.get(brand_id)
+        if previous is None or names is None:
+            names = set(SNAPSHOT_SECTIONS)
+        sections = dict(previous.sections) if previous else {}
+        loaded = await asyncio.gather(*(self._load_section(brand_id, name) for name in names))
+        sections.update(zip(names, loaded))
+        snapshot = SiteSnapshot(brand_id, brand, sections)
+        self._snapshots[brand_id] = snapshot
+        return snapshot
+
+    async def _read_versions(self) -> Dict[str, int]:
+        return {doc["_id"]: doc["version"] async for doc in db.site_snapshot_versions.find({})}
+
+    async def build_all(self):
+        self._versions = await self._read_versions()
+        brands = await db.brands.find({}, {"_id": 0, "id": 1}).to_list(100)
+        for brand in brands:
+            await self.build(brand["id"])
+
+    async def sync(self):
+        """Rebuild sections another process has changed since the last check"""
+        versions = await self._read_versions()
+        changed = [name for name, version in versions.items() if self._versions.get(name) != version]
+        self._versions = versions
+        for name in changed:
+            self._mark_dirty(name, None)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(SITE_SNAPSHOT_SYNC_SECONDS)
+            try:
+                await self.sync()
+            except PyMongoError as e:
+                logger.warning(f"Could not check site snapshot versions: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _publish(self, name: str):
+        bumped = await db.site_snapshot_versions.find_one_and_update(
+            {"_id": name}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        # Our own bump needs no second rebuild; anything newer came from elsewhere and still will
+        if bumped and bumped["version"] == self._versions.get(name, 0) + 1:
+            self._versions[name] = bumped["version"]
+
+    def invalidate(self, name: str, brand_id: Optional[str] = None):
+        """Mark a section stale and rebuild it in the background; brand_id=None touches every cached brand"""
+        self._mark_dirty(name, brand_id)
+        spawn_background(self._publish(name), "site snapshot version bump")
+
+    def _mark_dirty(self, name: str, brand_id: Optional[str]):
+        brand_ids = [brand_id] if brand_id else list(self._snapshots)
+        for bid in brand_ids:
+            self._dirty.setdefault(bid, set()).add(name)
+            if bid not in self._rebuilds:
+                self._rebuilds[bid] = asyncio.create_task(self._rebuild(bid))
+
+    async def _rebuild(self, brand_id: str):
+        try:
+            while self._dirty.get(brand_id):
+                names = self._dirty.pop(brand_id)
+                names.discard("brand")
+                try:
+                    await self.build(brand_id, names)
+                except PyMongoError as e:
+                    # Keep serving the last good snapshot; the next write retries
+                    logger.error(f"Site snapshot rebuild failed for brand {brand_id}: {e}")
+                    break
+        finally:
+            self._rebuilds.pop(brand_id, None)
+
+site_snapshots = SiteSnapshotStore()
+
+def _matches(doc: dict, query: dict) -> bool:
+    return all(doc.get(k) == v for k, v in query.items())
+
+async def find_published(collection: str, query: dict, section: str, brand_id: Optional[str], limit: int, projection: Optional[dict] = None) -> list:
+    """Read published content from Mongo, falling back to the in-memory site snapshot when Mongo is degraded"""
+    try:
+        return await db[collection].find(query, projection or {"_id": 0}).to_list(limit)
+    except PyMongoError as e:
+        cached = site_snapshots.section(brand_id, section) if brand_id else None
+        if cached is None:
+            raise
+        logger.warning(f"Serving {section} for brand {brand_id} from site snapshot: {e}")
+        return [doc for doc in cached if _matches(doc, query)][:limit]
+
+@api_router.get("/site-snapshot")
+async def get_site_snapshot(request: Request, brand_id: Optional[str] = Depends(resolve_brand_id)):
+    """Everything a public page needs for one brand in a single precompressed response, served from memory"""
+    if not brand_id:
+        raise HTTPException(status_code=400, detail="brand_id is required")
+    snapshot = site_snapshots.get(brand_id)
+    if snapshot is None:
+        snapshot = await site_snapshots.build(brand_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Brand not found")
+    
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        body = snapshot.br_body if encoding == "br" else snapshot.gzip_body
+        return Response(content=body, media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+@app.on_event("startup")
+async def warm_site_snapshots():
+    try:
+        await site_snapshots.build_all()
+    except PyMongoError as e:
+        logger.error(f"Could not warm site snapshots: {e}")
+    site_snapshots.start()
+
+@app.on_event("shutdown")
+async def stop_site_snapshots():
+    await site_snapshots.stop()
+
+# ========== SITE SEARCH ==========
+
+# kind -> (collection, {field: weight})
+SEARCH_SOURCES = {
+    "sermons": ("sermons", {"title": 3.0, "speaker": 2.0, "description": 1.0, "transcript": 0.5}),
+    "events": ("events", {"title": 3.0, "description": 1.0, "location": 0.5}),
+    "announcements": ("announcements", {"title": 3.0, "content": 1.0}),
+    "ministries": ("ministries", {"title": 3.0, "description": 1.0}),
+    "testimonials": ("testimonials", {"name": 2.0, "content": 1.0}),
+}
+SEARCH_MAX_PREFIX_EXPANSIONS = 50
+SEARCH_SNIPPET_CHARS = 160
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+class SearchIndex:
+    """Inverted index over one brand's content, ranked with BM25 over field-weighted term frequencies"""
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_len: Dict[str, float] = {}
+        self.docs: Dict[str, dict] = {}
+        self.vocabulary: List[str] = []
+        self.total_len = 0.0
+
+    def add(self, kind: str, doc: dict):
+        key = f"{kind}:{doc['id']}"
+        self.remove(key)
+        weights = SEARCH_SOURCES[kind][1]
+        terms: Dict[str, float] = {}
+        for field, weight in weights.items():
+            for token in tokenize(doc.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+        for term, tf in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.vocabulary, term)
+            posting[key] = tf
+        length = sum(terms.values())
+        self.doc_terms[key] = terms
+        self.doc_len[key] = length
+        self.total_len += length
+        self.docs[key] = {"type": kind, "id": doc["id"], "brand_id": doc.get("brand_id"),
+                          "title": doc.get("title") or doc.get("name"),
+                          "fields": {field: doc.get(field) or "" for field in weights}}
+
+    def remove(self, key: str):
+        terms = self.doc_terms.pop(key, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(key, None)
+            if not posting:
+                del self.postings[term]
+                i = bisect.bisect_left(self.vocabulary, term)
+                if i < len(self.vocabulary) and self.vocabulary[i] == term:
+                    del self.vocabulary[i]
+        self.total_len -= self.doc_len.pop(key)
+        del self.docs[key]
+
+    def expand(self, term: str) -> List[str]:
+        """The term itself plus vocabulary entries it is a prefix of"""
+        start = bisect.bisect_left(self.vocabulary, term)
+        matches = []
+        for candidate in self.vocabulary[start:start + SEARCH_MAX_PREFIX_EXPANSIONS]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def search(self, terms: List[str], kinds: Optional[set] = None) -> List[tuple]:
+        """Return (coverage, score, key, matched terms) tuples, best first"""
+        n = len(self.doc_len)
+        if n == 0:
+            return []
+        avg_len = self.total_len / n
+        scores: Dict[str, float] = {}
+        coverage: Dict[str, int] = {}
+        matched: Dict[str, set] = {}
+        for term in terms:
+            best: Dict[str, float] = {}
+            for candidate in self.expand(term):
+                posting = self.postings[candidate]
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                # Prefix expansions rank below exact hits
+                boost = 1.0 if candidate == term else 0.7
+                for key, tf in posting.items():
+                    if kinds and self.docs[key]["type"] not in kinds:
+                        continue
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self.doc_len[key] / avg_len))
+                    score = boost * idf * norm
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+                    matched.setdefault(key, set()).add(candidate)
+            for key, score in best.items():
+                scores[key] = scores.get(key, 0.0) + score
+                coverage[key] = coverage.get(key, 0) + 1
+        ranked = [(coverage[key], score, key, matched[key]) for key, score in scores.items()]
+        ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        return ranked
+
+def highlight_snippet(fields: Dict[str, str], matched: set) -> str:
+    """Escape a short window around the first hit in the first body field that has one, and wrap hits in <mark>"""
+    best_text, best_pos = "", None
+    ordered = [t for f, t in fields.items() if f not in ("title", "name")] + [t for f, t in fields.items() if f in ("title", "name")]
+    for text in ordered:
+        m = next((m for m in TOKEN_RE.finditer(text) if m.group(0).lower() in matched), None)
+        if m is not None:
+            best_text, best_pos = text, m.start()
+            break
+    if best_pos is None:
+        best_text = next((t for t in fields.values() if t), "")
+        best_pos = 0
+    start = max(0, best_pos - SEARCH_SNIPPET_CHARS // 3)
+    end = min(len(best_text), start + SEARCH_SNIPPET_CHARS)
+    window = best_text[start:end]
+    parts = []
+    last = 0
+    for m in TOKEN_RE.finditer(window):
+        if m.group(0).lower() in matched:
+            parts.append(html.escape(window[last:m.start()]))
+            parts.append(f"<mark>{html.escape(m.group(0))}</mark>")
+            last = m.end()
+    parts.append(html.escape(window[last:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(best_text) else "")
+
+class SiteSearch:
+    """Per-brand SearchIndexes, built at startup and updated incrementally by the write routes"""
+
+    def __init__(self):
+        self.indexes: Dict[str, SearchIndex] = {}
+        self._brand_of: Dict[str, str] = {}
+
+    def index(self, kind: str, doc: Optional[dict]):
+        if not doc:
+            return
+        key = f"{kind}:{doc['id']}"
+        previous_brand = self._brand_of.get(key)
+        if previous_brand is not None and previous_brand != doc["brand_id"]:
+            self.indexes[previous_brand].remove(key)
+        self.indexes.setdefault(doc["brand_id"], SearchIndex()).add(kind, doc)
+        self._brand_of[key] = doc["brand_id"]
+
+    def remove(self, kind: str, doc_id: str):
+        key = f"{kind}:{doc_id}"
+        brand_id = self._brand_of.pop(key, None)
+        if brand_id is not None:
+            self.indexes[brand_id].remove(key)
+
+    async def build_all(self):
+        for kind, (collection, weights) in SEARCH_SOURCES.items():
+            projection = {"_id": 0, "id": 1, "brand_id": 1, **{field: 1 for field in weights}}
+            async for doc in db[collection].find({}, projection):
+                self.index(kind, doc)
+
+    def search(self, q: str, brand_id: Optional[str], kinds: Optional[set], limit: int) -> List[dict]:
+        terms = list(dict.fromkeys(tokenize(q)))
+        if not terms:
+            return []
+        indexes = [self.indexes[brand_id]] if brand_id in self.indexes else ([] if brand_id else list(self.indexes.values()))
+        ranked = []
+        for index in indexes:
+            ranked.extend((cov, score, key, found, index) for cov, score, key, found in index.search(terms, kinds))
+        ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        results = []
+        for cov, score, key, found, index in ranked[:limit]:
+            doc = index.docs[key]
+            results.append({
+                "type": doc["type"],
+                "id": doc["id"],
+                "brand_id": doc["brand_id"],
+                "title": doc["title"],
+                "score": round(score, 4),
+                "snippet": highlight_snippet(doc["fields"], found),
+            })
+        return results
+
+site_search = SiteSearch()
+
+@app.on_event("startup")
+async def build_search_index():
+    try:
+        await site_search.build_all()
+    except PyMongoError as e:
+        logger.error(f"Could not build search index: {e}")
+
+@api_router.get("/search")
+async def search_site(q: str, types: Optional[str] = None, limit: int = 20, brand_id: Optional[str] = Depends(resolve_brand_id)):
+    """Ranked full-text search over sermons, events, announcements, ministries and testimonials"""
+    kinds = set(types.split(",")) if types else None
+    if kinds and not kinds <= set(SEARCH_SOURCES):
+        raise HTTPException(status_code=400, detail=f"types must be a subset of {', '.join(SEARCH_SOURCES)}")
+    limit = max(1, min(limit, 100))
+    started = time.perf_counter()
+    results = site_search.search(q, brand_id, kinds, limit)
+    return FastJSONResponse({
+        "query": q,
+        "results": results,
+        "took_ms": round((time.perf_counter() - started) * 1000, 3),
+    })
+
+# ========== RESPONSE COMPRESSION ==========
+
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '500'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+COMPRESSION_CACHE_MAX_BYTES = int(os.environ.get('COMPRESSION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Bodies above this size are compressed off the event loop
+COMPRESSION_THREAD_THRESHOLD = 64 * 1024
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+metrics.describe("http_compression_responses_total", "Responses compressed, by encoding and variant cache result")
+metrics.describe("http_compression_cpu_seconds_total", "CPU time spent compressing response bodies")
+metrics.describe("http_compression_input_bytes_total", "Uncompressed bytes of compressed responses")
+metrics.describe("http_compression_output_bytes_total", "Compressed bytes actually sent")
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br over gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.partition(";")
+        params = params.strip()
+        q = 1.0
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+def compress_body(body: bytes, encoding: str):
+    """Return (compressed bytes, CPU seconds spent)"""
+    started = time.thread_time()
+    if encoding == "br":
+        data = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        data = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return data, time.thread_time() - started
+
+class CompressedVariantCache:
+    """LRU of compressed variants keyed by a digest of the raw body, so a hot response is compressed once"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[bytes, Dict[str, bytes]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, digest: bytes, encoding: str) -> Optional[bytes]:
+        variants = self._entries.get(digest)
+        if variants is None or encoding not in variants:
+            return None
+        self._entries.move_to_end(digest)
+        return variants[encoding]
+
+    def put(self, digest: bytes, encoding: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        variants = self._entries.setdefault(digest, {})
+        if encoding in variants:
+            return
+        variants[encoding] = data
+        self._size += len(data)
+        self._entries.move_to_end(digest)
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= sum(len(v) for v in evicted.values())
+
+compressed_variants = CompressedVariantCache(COMPRESSION_CACHE_MAX_BYTES)
+
+class CompressionMiddleware:
+    """gzip/brotli response compression; cacheable GET responses reuse precompressed variants"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        cacheable_request = scope["method"] == "GET" and "authorization" not in request_headers
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or message.get("more_body"):
+                # Streaming and file responses go out untouched
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(scope=start_message)
+            if self._should_compress(start_message["status"], headers, body):
+                cacheable = (
+                    cacheable_request
+                    and start_message["status"] == 200
+                    and "set-cookie" not in headers
+                    and not any(d in headers.get("cache-control", "") for d in ("no-store", "private"))
+                )
+                body = await self._compress(body, encoding, cacheable)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _should_compress(self, status_code: int, headers: MutableHeaders, body: bytes) -> bool:
+        if status_code < 200 or status_code in (204, 206, 304) or len(body) < self.minimum_size:
+            return False
+        # Byte offsets of ranged responses refer to the uncompressed representation
+        if "content-encoding" in headers or "content-range" in headers or "accept-ranges" in headers:
+            return False
+        return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+    async def _compress(self, body: bytes, encoding: str, cacheable: bool) -> bytes:
+        digest = hashlib.blake2b(body, digest_size=16).digest() if cacheable else None
+        cached = compressed_variants.get(digest, encoding) if digest else None
+        if cached is not None:
+            result = "hit"
+            data = cached
+        else:
+            result = "miss" if cacheable else "uncacheable"
+            if len(body) > COMPRESSION_THREAD_THRESHOLD:
+                data, cpu_seconds = await asyncio.to_thread(compress_body, body, encoding)
+            else:
+                data, cpu_seconds = compress_body(body, encoding)
+            metrics.inc("http_compression_cpu_seconds_total", cpu_seconds, encoding=encoding)
+            if digest:
+                compressed_variants.put(digest, encoding, data)
+        metrics.inc("http_compression_responses_total", encoding=encoding, cache=result)
+        metrics.inc("http_compression_input_bytes_total", len(body), encoding=encoding)
+        metrics.inc("http_compression_output_bytes_total", len(data), encoding=encoding)
+        return data
+
+# ========== RATE LIMITING ==========
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # memory, or mongo to share state across workers
+# Trusted proxies appending to X-Forwarded-For; 0 uses the peer address, since the header is client-controlled without a proxy
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+RATE_LIMIT_MAX_KEYS = 100000
+
+# route class -> requests per period with bursts up to `burst`; override with RATE_LIMITS (JSON, same shape)
+DEFAULT_RATE_LIMITS = {
+    "read": {"rate": 600, "period": 60, "burst": 120},
+    "write": {"rate": 120, "period": 60, "burst": 60},
+    "submit": {"rate": 20, "period": 60, "burst": 10},
+    "payments": {"rate": 10, "period": 60, "burst": 5},
+    "auth": {"rate": 10, "period": 60, "burst": 10},
+}
+
+# (methods, path pattern, route class), first match wins; None exempts the route
+RATE_LIMIT_ROUTES = [
+    ({"POST"}, re.compile(r"^/api/webhook/"), None),
+    ({"GET", "HEAD"}, re.compile(r"^/api/media/"), None),
+    ({"PUT"}, re.compile(r"^/api/uploads/[^/]+/chunks/\d+$"), None),
+    ({"POST"}, re.compile(r"^/api/(auth|users)/(login|register)$"), "auth"),
+    ({"POST"}, re.compile(r"^/api/(payments/create-checkout|foundations/donate|donations)$"), "payments"),
+    ({"POST"}, re.compile(r"^/api/(contact|prayer-requests|volunteers|subscribers|testimonials|events/[^/]+/register)$"), "submit"),
+    ({"GET", "HEAD"}, re.compile(r"^/api/"), "read"),
+    ({"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"^/api/"), "write"),
+]
+
+metrics.describe("rate_limit_decisions_total", "Rate limiter decisions by route class, limit scope and outcome")
+
+class RateLimit:
+    def __init__(self, rate: float, period: float, burst: int):
+        self.rate = rate
+        self.period = period
+        self.burst = burst
+        self.emission_interval = period / rate
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RateLimit":
+        return cls(float(config["rate"]), float(config.get("period", 60)), int(config.get("burst", config["rate"])))
+
+    @property
+    def policy(self) -> str:
+        return f"{self.burst};w={int(self.period)}"
+
+def load_rate_limits() -> Dict[str, RateLimit]:
+    configured = json.loads(os.environ.get('RATE_LIMITS', '{}'))
+    return {name: RateLimit.from_config({**DEFAULT_RATE_LIMITS.get(name, {}), **configured.get(name, {})})
+            for name in {*DEFAULT_RATE_LIMITS, *configured}}
+
+def load_brand_quotas() -> Dict[str, Dict[str, RateLimit]]:
+    """Aggregate per-brand quotas from RATE_LIMIT_BRAND_QUOTAS, e.g.
+    {"*": {"read": {"rate": 3000, "period": 60, "burst": 600}}, "faith-center": {...}}; "*" applies to brands without an entry"""
+    configured = json.loads(os.environ.get('RATE_LIMIT_BRAND_QUOTAS', '{}'))
+    return {brand: {name: RateLimit.from_config(c) for name, c in classes.items()} for brand, classes in configured.items()}
+
+def gcra(tat: Optional[float], now: float, limit: RateLimit) -> tuple:
+    """Generic cell rate algorithm: (allowed, new theoretical arrival time, remaining, reset seconds, retry after)"""
+    tat = max(tat or now, now)
+    new_tat = tat + limit.emission_interval
+    allow_at = new_tat - limit.emission_interval * limit.burst
+    if now < allow_at:
+        return False, tat, 0, tat - now, allow_at - now
+    remaining = int((now - allow_at) / limit.emission_interval)
+    return True, new_tat, remaining, new_tat - now, 0.0
+
+class MemoryRateLimitBackend:
+    """Per-process GCRA state; also the stand-in for the shared backend in tests"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+
+    async def apply(self, key: str, limit: RateLimit, now: float) -> tuple:
+        result = gcra(self._tats.get(key), now, limit)
+        if result[0]:
+            self._tats[key] = result[1]
+            self._tats.move_to_end(key)
+            while len(self._tats) > self.max_keys:
+                self._tats.popitem(last=False)
+        return result
+
+class MongoRateLimitBackend:
+    """GCRA state shared by every worker through compare-and-set on `rate_limits`"""
+
+    max_attempts = 5
+
+    async def ensure_indexes(self):
+        await db.rate_limits.create_index("key", unique=True)
+        await db.rate_limits.create_index("expires_at", expireAfterSeconds=0)
+
+    async def apply(self, key: str, limit: RateLimit, now: float) -> tuple:
+        for _ in range(self.max_attempts):
+            doc = await db.rate_limits.find_one({"key": key}, {"_id": 0, "tat": 1})
+            tat = doc["tat"] if doc else None
+            result = gcra(tat, now, limit)
+            if not result[0]:
+                return result
+            update = {"tat": result[1], "expires_at": datetime.fromtimestamp(result[1], timezone.utc)}
+            try:
+                if doc is None:
+                    await db.rate_limits.insert_one({"key": key, **update})
+                    return result
+                written = await db.rate_limits.update_one({"key": key, "tat": tat}, {"$set": update})
+                if written.modified_count:
+                    return result
+            except DuplicateKeyError:
+                pass  # another worker created the key first; retry against its state
+        # Heavy contention on one key: let the request through rather than stall it
+        return gcra(None, now, limit)
+
+class RateLimiter:
+    def __init__(self, backend, limits: Dict[str, RateLimit], brand_quotas: Dict[str, Dict[str, RateLimit]]):
+        self.backend = backend
+        self.limits = limits
+        self.brand_quotas = brand_quotas
+
+    @staticmethod
+    def route_class(method: str, path: str) -> Optional[str]:
+        for methods, pattern, route_class in RATE_LIMIT_ROUTES:
+            if method in methods and pattern.match(path):
+                return route_class
+        return None
+
+    @staticmethod
+    def client_ip(scope) -> str:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded and RATE_LIMIT_PROXY_HOPS:
+            hops = [h.strip() for h in forwarded.split(",")]
+            # Entries left of the ones our own proxies appended are client-controlled
+            return hops[-RATE_LIMIT_PROXY_HOPS] if len(hops) >= RATE_LIMIT_PROXY_HOPS else hops[0]
+        return scope["client"][0] if scope.get("client") else "unknown"
+
+    def brand_quota(self, brand_id: str, route_class: str) -> Optional[RateLimit]:
+        quotas = self.brand_quotas.get(brand_id) or self.brand_quotas.get("*") or {}
+        return quotas.get(route_class)
+
+    async def check(self, ip: str, brand_id: str, route_class: str) -> tuple:
+        """(allowed, limit, remaining, reset, retry_after) for the tightest limit that applies"""
+        now = time.time()
+        limit = self.limits[route_class]
+        allowed, _, remaining, reset, retry_after = await self.backend.apply(f"c:{route_class}:{brand_id}:{ip}", limit, now)
+        metrics.inc("rate_limit_decisions_total", route_class=route_class, scope="client", outcome="allowed" if allowed else "limited")
+        if not allowed:
+            return False, limit, remaining, reset, retry_after
+        quota = self.brand_quota(brand_id, route_class)
+        if quota is not None:
+            brand_allowed, _, brand_remaining, brand_reset, brand_retry = await self.backend.apply(f"b:{route_class}:{brand_id}", quota, now)
+            metrics.inc("rate_limit_decisions_total", route_class=route_class, scope="brand", outcome="allowed" if brand_allowed else "limited")
+            if not brand_allowed:
+                return False, quota, 0, brand_reset, brand_retry
+        return True, limit, remaining, reset, 0.0
+
+rate_limiter = RateLimiter(
+    MongoRateLimitBackend() if RATE_LIMIT_BACKEND == "mongo" else MemoryRateLimitBackend(),
+    load_rate_limits(),
+    load_brand_quotas(),
+)
+
+@app.on_event("startup")
+async def create_rate_limit_indexes():
+    if isinstance(rate_limiter.backend, MongoRateLimitBackend):
+        try:
+            await rate_limiter.backend.ensure_indexes()
+        except PyMongoError as e:
+            logger.error(f"Could not create rate limit indexes: {e}")
+
+class RateLimitMiddleware:
+    """GCRA limits per client IP, route class and brand, plus optional aggregate per-brand quotas.
+
+    Sits inside BrandResolutionMiddleware so the brand is known. Responses carry
+    RateLimit-Limit/Remaining/Reset/Policy headers; rejections are 429 with Retry-After.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        route_class = self.limiter.route_class(scope["method"], scope["path"])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+        brand_id = scope.get("state", {}).get("brand_id")
+        if brand_id is None:
+            # Only known brands get their own buckets, so made-up ids cannot mint fresh quota
+            requested = re.search(r"(?:^|&)brand_id=([^&]+)", scope.get("query_string", b"").decode("latin-1"))
+            brand_id = requested.group(1) if requested and brand_registry.get(requested.group(1)) else "-"
+        try:
+            allowed, limit, remaining, reset, retry_after = await self.limiter.check(self.limiter.client_ip(scope), brand_id, route_class)
+        except PyMongoError as e:
+            logger.error(f"Rate limiter unavailable, allowing request: {e}")
+            await self.app(scope, receive, send)
+            return
+        rate_headers = [
+            (b"ratelimit-limit", str(limit.burst).encode()),
+            (b"ratelimit-remaining", str(remaining).encode()),
+            (b"ratelimit-reset", str(math.ceil(reset)).encode()),
+            (b"ratelimit-policy", limit.policy.encode()),
+        ]
+        if not allowed:
+            body = json.dumps({"detail": "Too many requests, please slow down"}).encode()
+            await send({"type": "http.response.start", "status": 429, "headers": rate_headers + [
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + rate_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+# ========== IDEMPOTENCY KEYS ==========
+
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', str(24 * 3600)))
+IDEMPOTENCY_CACHE_SECONDS = float(os.environ.get('IDEMPOTENCY_CACHE_SECONDS', '300'))
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '30'))
+IDEMPOTENCY_LEASE_SECONDS = 60
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+# Public POST routes that create rows or gateway sessions and are retried by mobile clients
+IDEMPOTENT_ROUTES = [re.compile(p) for p in (
+    r"^/api/contact$",
+    r"^/api/prayer-requests$",
+    r"^/api/volunteers$",
+    r"^/api/subscribers$",
+    r"^/api/events/[^/]+/register$",
+    r"^/api/payments/create-checkout$",
+)]
+
+metrics.describe("idempotency_requests_total", "Requests carrying an Idempotency-Key, by outcome")
+
+class IdempotencyStore:
+    """First responses per Idempotency-Key.
+
+    `idempotency_keys` holds one document per key: claimed "in_progress" under a lease
+    by the first request, then "completed" with the response. Its created_at is a BSON
+    date (unlike the ISO strings elsewhere) because the TTL index only expires dates.
+    Completed responses are also kept in an in-process cache, and requests racing
+    inside this process wait on the first one's future instead of polling Mongo.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache("idempotency", IDEMPOTENCY_CACHE_SECONDS)
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+    async def ensure_indexes(self):
+        await db.idempotency_keys.create_index("key", unique=True)
+        await db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[dict]:
+        """None if this request now owns the key, otherwise the existing record"""
+        now = datetime.now(timezone.utc)
+        try:
+            await db.idempotency_keys.insert_one({
+                "key": key,
+                "fingerprint": fingerprint,
+                "state": "in_progress",
+                "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS),
+                "created_at": now,
+            })
+            return None
+        except DuplicateKeyError:
+            pass
+        record = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+        if record and record["state"] == "in_progress" and record["locked_until"].replace(tzinfo=timezone.utc) < now:
+            # The first request's process died mid-flight; take over its lease
+            result = await db.idempotency_keys.update_one(
+                {"key": key, "state": "in_progress", "locked_until": record["locked_until"]},
+                {"$set": {"fingerprint": fingerprint, "locked_until": now + timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)}}
+            )
+            if result.modified_count:
+                return None
+        return record
+
+    async def wait_for_completion(self, key: str) -> Optional[dict]:
+        """Poll a key another process is working on until it completes or the wait runs out"""
+        deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            record = await db.idempotency_keys.find_one({"key": key}, {"_id": 0})
+            if record is None or record["state"] == "completed":
+                return record
+        return None
+
+    async def complete(self, key: str, response: dict):
+        self.cache.set(key, response)
+        await db.idempotency_keys.update_one(
+            {"key": key},
+            {"$set": {"state": "completed", **response}, "$unset": {"locked_until": ""}}
+        )
+
+    async def release(self, key: str):
+        await db.idempotency_keys.delete_one({"key": key, "state": "in_progress"})
+
+idempotency_store = IdempotencyStore()
+
+@app.on_event("startup")
+async def create_idempotency_indexes():
+    try:
+        await idempotency_store.ensure_indexes()
+    except PyMongoError as e:
+        logger.error(f"Could not create idempotency key indexes: {e}")
+
+class IdempotencyMiddleware:
+    """Replay the first response for retries of a POST carrying the same Idempotency-Key.
+
+    Keys are scoped to the caller's Authorization header. A key reused with a different
+    path or body is rejected with 422. Server errors are not stored, so they stay retryable.
+    """
+
+    def __init__(self, app, store: IdempotencyStore):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not any(p.match(scope["path"]) for p in IDEMPOTENT_ROUTES):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        client_key = headers.get("idempotency-key")
+        if not client_key:
+            await self.app(scope, receive, send)
+            return
+        if len(client_key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+            await self._error(send, 400, "Idempotency-Key is too long")
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        key = hashlib.sha256(f"{headers.get('authorization', '')}\n{client_key}".encode()).hexdigest()
+        fingerprint = hashlib.sha256(scope["path"].encode() + b"\n" + body).hexdigest()
+
+        # Requests racing inside this process wait for the first one
+        while key in self.store.inflight:
+            await asyncio.shield(self.store.inflight[key])
+        record = self.store.cache.get(key)
+        owner = False
+        if record is None:
+            future = self.store.inflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                record = await self.store.claim(key, fingerprint)
+                if record is None:
+                    owner = True
+                elif record["state"] == "in_progress":
+                    metrics.inc("idempotency_requests_total", outcome="waited")
+                    record = await self.store.wait_for_completion(key)
+                    if record is None:
+                        await self._error(send, 409, "A request with this Idempotency-Key is still being processed")
+                        return
+            except PyMongoError as e:
+                # Without the store the request still goes through, just unprotected
+                logger.error(f"Idempotency store unavailable: {e}")
+                owner = None
+            finally:
+                if not owner:
+                    self.store.inflight.pop(key, None)
+                    future.set_result(None)
+
+        if owner is None:
+            await self.app(scope, self._replay_receive(body, receive), send)
+            return
+        if not owner:
+            if record["fingerprint"] != fingerprint:
+                metrics.inc("idempotency_requests_total", outcome="mismatch")
+                await self._error(send, 422, "Idempotency-Key was already used for a different request")
+                return
+            metrics.inc("idempotency_requests_total", outcome="replayed")
+            self.store.cache.set(key, record)
+            await self._replay(send, record)
+            return
+
+        metrics.inc("idempotency_requests_total", outcome="first")
+        try:
+            try:
+                response = await self._run(scope, body, receive, send)
+            except BaseException:
+                # The app raised or the client went away: free the key so a retry can run
+                try:
+                    await self.store.release(key)
+                except PyMongoError as e:
+                    logger.error(f"Could not release idempotency key: {e}")
+                raise
+            if response is not None and response["status"] < 500:
+                await self.store.complete(key, {**response, "fingerprint": fingerprint})
+            else:
+                await self.store.release(key)
+        finally:
+            self.store.inflight.pop(key, None)
+            future.set_result(None)
+
+    @staticmethod
+    def _replay_receive(body: bytes, receive):
+        sent = False
+
+        async def replay_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        return replay_receive
+
+    async def _run(self, scope, body: bytes, receive, send) -> Optional[dict]:
+        response = {"status": None, "headers": [], "body": b""}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [[k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+            await send(message)
+
+        await self.app(scope, self._replay_receive(body, receive), capture_send)
+        return response if response["status"] is not None else None
+
+    async def _replay(self, send, record: dict):
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in record["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": bytes(record["body"])})
+
+    async def _error(self, send, status_code: int, detail: str):
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status_code, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+# ========== BATCH REQUESTS ==========
+
+MAX_BATCH_REQUESTS = int(os.environ.get('MAX_BATCH_REQUESTS', '20'))
+BATCH_FORWARDED_HEADERS = {b"authorization", b"host", b"x-forwarded-for", b"x-forwarded-host", b"x-forwarded-proto"}
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str  # e.g. /api/events?brand_id=...
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+async def dispatch_subrequest(request: Request, path: str):
+    """Run a GET against this app in-process, through the same middleware and dependency chain as a real request"""
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": request.url.scheme,
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query_string.encode("utf-8"),
+        "root_path": request.scope.get("root_path", ""),
+        "headers": [(k, v) for k, v in request.scope["headers"] if k in BATCH_FORWARDED_HEADERS],
+        "client": request.scope.get("client"),
+        "server": request.scope.get("server"),
+    }
+    request_sent = False
+    response = {"status": 500, "headers": [], "body": []}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await request.app(scope, receive, send)
+    return response["status"], dict(response["headers"]), b"".join(response["body"])
+
+async def run_batch_item(request: Request, item: BatchSubRequest) -> bytes:
+    """Return one combined-response entry as JSON bytes, embedding JSON sub-responses without re-parsing them"""
+    status_code, body, is_json = 200, b"", False
+    if item.method.upper() != "GET":
+        status_code, body = 405, json.dumps({"detail": "Only GET sub-requests are supported"}).encode()
+        is_json = True
+    elif not item.path.startswith("/api/") or item.path.split("?")[0].rstrip("/") == "/api/batch":
+        status_code, body = 400, json.dumps({"detail": "Invalid sub-request path"}).encode()
+        is_json = True
+    else:
+        try:
+            status_code, headers, body = await dispatch_subrequest(request, item.path)
+            is_json = headers.get(b"content-type", b"").startswith(b"application/json")
+        except Exception as e:
+            logger.error(f"Batch sub-request {item.path} failed: {e}")
+            status_code, body = 500, json.dumps({"detail": "Internal Server Error"}).encode()
+            is_json = True
+    
+    if not body:
+        payload = b"null"
+    elif is_json:
+        payload = body
+    else:
+        payload = json.dumps(body.decode("utf-8", errors="replace")).encode()
+    head = json.dumps({"id": item.id, "path": item.path, "status": status_code})[:-1].encode()
+    return head + b',"body":' + payload + b"}"
+
+@api_router.post("/batch")
+async def batch_requests(request: Request, batch: BatchRequest):
+    """Run several GET requests against the API concurrently and return all results in one response"""
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="No sub-requests given")
+    if len(batch.requests) > MAX_BATCH_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_REQUESTS} sub-requests")
+    
+    items = await asyncio.gather(*(run_batch_item(request, item) for item in batch.requests))
+    return Response(content=b'{"responses":[' + b",".join(items) + b"]}", media_type="application/json")
+
 # Include router
 app.include_router(api_router)
 
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store)
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+app.add_middleware(BrandResolutionMiddleware)
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1857,6 +6153,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Standalone background task worker.
+
+Runs the task queues defined in server.py in their own process, so slow work never
+shares an event loop with request handling. Start the web process with
+TASK_WORKERS_ENABLED=false when using it.
+
+Usage: python worker.py [queue ...]
+"""
+
+import asyncio
+import signal
+import sys
+
+from server import task_queue, smtp_pool, image_pipeline, client, logger
+
+async def main(queues):
+    await task_queue.ensure_indexes()
+    task_queue.start(queues or None)
+    logger.info(f"Task worker running queues: {', '.join(queues or task_queue.concurrency)}")
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+
+    logger.info("Task worker stopping")
+    await task_queue.stop()
+    await asyncio.to_thread(smtp_pool.close)
+    image_pipeline.close()
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
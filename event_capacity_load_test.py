@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Event Capacity Load Test
+Fires concurrent registrations at one capacity-limited event and checks that
+seats are never overbooked, the waitlist is ordered, and cancellations promote
+waitlisted attendees into the freed seats.
+
+Usage: python event_capacity_load_test.py [registrations] [capacity] [workers]
+
+All registrations come from one client IP, far beyond the public "submit" rate
+limit (20/min), so start the backend with RATE_LIMIT_ENABLED=false (or raise the
+"submit" limit through RATE_LIMITS) for the duration of the test.
+"""
+
+import os
+import random
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Backend URL from environment
+BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8001/api")
+ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL", "admin@faithcenter.com")
+ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "Admin@2025")
+
+def admin_login():
+    response = requests.post(f"{BACKEND_URL}/auth/login", json={"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}, timeout=10)
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+def create_event(headers, capacity):
+    event = {
+        "title": f"Load Test Conference {uuid.uuid4().hex[:6]}",
+        "description": "Capacity load test",
+        "date": "2030-01-01",
+        "location": "Main Sanctuary",
+        "capacity": capacity,
+        "brand_id": "load-test"
+    }
+    response = requests.post(f"{BACKEND_URL}/events", json=event, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.json()["id"]
+
+def register(event_id, i, session):
+    attendee = {
+        "event_id": event_id,
+        "name": f"Attendee {i}",
+        "email": f"attendee{i}@loadtest.example.com",
+        "guests": random.randint(1, 3),
+        "brand_id": "load-test"
+    }
+    try:
+        response = session.post(f"{BACKEND_URL}/events/{event_id}/register", json=attendee, timeout=30)
+        return response.status_code, response.json() if response.status_code == 200 else None
+    except requests.RequestException as e:
+        return str(e), None
+
+def check_invariants(headers, event_id, capacity):
+    event = requests.get(f"{BACKEND_URL}/events/{event_id}", timeout=10).json()
+    attendees = requests.get(f"{BACKEND_URL}/events/{event_id}/attendees", headers=headers, timeout=30).json()
+    registered = [a for a in attendees if a["status"] == "registered"]
+    waitlisted = sorted((a for a in attendees if a["status"] == "waitlisted"), key=lambda a: a["waitlist_position"])
+    seats = sum(a["guests"] for a in registered)
+    positions = [a["waitlist_position"] for a in waitlisted]
+
+    ok = True
+    print(f"   Seats taken: {event['seats_taken']} / {capacity} (registered guests: {seats}, waitlisted: {len(waitlisted)})")
+    if seats > capacity:
+        print("   ❌ Overbooked!")
+        ok = False
+    if seats != event["seats_taken"]:
+        print("   ❌ seats_taken counter does not match registered guests")
+        ok = False
+    if len(set(positions)) != len(positions):
+        print("   ❌ Duplicate waitlist positions")
+        ok = False
+    if ok:
+        print("   ✅ No overbooking, counter consistent, waitlist ordered")
+    return ok, registered, waitlisted
+
+def main():
+    registrations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    print(f"🔍 Event capacity load test: {registrations} registrations, capacity {capacity}, {workers} workers")
+    headers = admin_login()
+    event_id = create_event(headers, capacity)
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: register(event_id, i, session), range(registrations)))
+        # Every attendee registering a second time must be rejected
+        duplicates = list(pool.map(lambda i: register(event_id, i, session), range(min(50, registrations))))
+
+    statuses = {}
+    for code, _ in results:
+        statuses[code] = statuses.get(code, 0) + 1
+    print(f"   Response codes: {statuses}")
+    if statuses.get(429):
+        print("   ❌ Registrations were rate limited; run the backend with RATE_LIMIT_ENABLED=false for this test")
+        requests.delete(f"{BACKEND_URL}/events/{event_id}", headers=headers, timeout=10)
+        return 1
+    duplicate_ok = all(code == 409 for code, _ in duplicates)
+    print(f"   {'✅' if duplicate_ok else '❌'} Duplicate registrations rejected: {sum(code == 409 for code, _ in duplicates)}/{len(duplicates)}")
+
+    ok, registered, waitlisted = check_invariants(headers, event_id, capacity)
+
+    print("🔍 Cancelling registrations to promote the waitlist...")
+    head = waitlisted[0]["id"] if waitlisted else None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(
+            lambda a: session.post(f"{BACKEND_URL}/events/{event_id}/registrations/{a['id']}/cancel", timeout=30),
+            registered[:max(1, len(registered) // 5)]
+        ))
+    after_ok, registered, _ = check_invariants(headers, event_id, capacity)
+    if head:
+        promoted = any(a["id"] == head for a in registered)
+        print(f"   {'✅' if promoted else '❌'} Head of the waitlist was promoted")
+        after_ok = after_ok and promoted
+
+    requests.delete(f"{BACKEND_URL}/events/{event_id}", headers=headers, timeout=10)
+
+    if ok and after_ok and duplicate_ok:
+        print("🎉 EVENT CAPACITY LOAD TEST PASSED")
+        return 0
+    print("⚠️  EVENT CAPACITY LOAD TEST FAILED")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
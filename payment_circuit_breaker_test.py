@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Payment Circuit Breaker Test
+Starts a fake Stripe API that answers every call with a 500 and its own backend pointed
+at it (STRIPE_API_BASE), then checks that checkout fails with 503, that the breaker opens
+after PAYMENT_GATEWAY_FAILURE_THRESHOLD failures so further checkouts fail fast without
+reaching the gateway, and that it closes again once the gateway recovers and
+PAYMENT_GATEWAY_RESET_SECONDS have passed.
+
+Needs a reachable MongoDB and the backend's requirements installed. The test uses a
+throwaway database (dropped at the end unless KEEP_DB=true).
+
+Usage: python payment_circuit_breaker_test.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+from pymongo import MongoClient
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("TEST_DB_NAME", f"circuit_breaker_test_{uuid.uuid4().hex[:8]}")
+BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8012"))
+BACKEND_URL = f"http://127.0.0.1:{BACKEND_PORT}/api"
+BACKEND_DIR = Path(__file__).resolve().parent / "backend"
+FAILURE_THRESHOLD = 3
+RESET_SECONDS = 3
+
+class FakeStripe(ThreadingHTTPServer):
+    """Just enough of the Stripe API for checkout: fails with a 500 until `healthy` is set"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeStripeHandler)
+        self.healthy = False
+        self.hits = 0
+        self.lock = threading.Lock()
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.hits += 1
+        if self.server.healthy:
+            session_id = f"cs_test_{uuid.uuid4().hex}"
+            self.reply(200, {
+                "id": session_id, "object": "checkout.session", "url": f"https://checkout.example.com/{session_id}",
+                "payment_status": "unpaid", "status": "open", "metadata": {},
+            })
+        else:
+            self.reply(500, {"error": {"type": "api_error", "message": "Fake gateway is down"}})
+
+    do_GET = do_POST
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def start_backend(gateway_url):
+    env = {
+        **os.environ,
+        "MONGO_URL": MONGO_URL,
+        "DB_NAME": DB_NAME,
+        "STRIPE_API_KEY": "sk_test_fake",
+        "STRIPE_API_BASE": gateway_url,
+        "PAYMENT_GATEWAY_FAILURE_THRESHOLD": str(FAILURE_THRESHOLD),
+        "PAYMENT_GATEWAY_RESET_SECONDS": str(RESET_SECONDS),
+        "RATE_LIMIT_ENABLED": "false",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(BACKEND_PORT)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            if requests.get(f"{BACKEND_URL}/brands", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Backend did not become ready within 60s")
+
+def checkout():
+    started = time.perf_counter()
+    response = requests.post(f"{BACKEND_URL}/payments/create-checkout", json={
+        "amount": 25.0, "category": "General Offering", "brand_id": "load-test", "donor_name": "Breaker Test"
+    }, timeout=30)
+    return response.status_code, time.perf_counter() - started
+
+def main():
+    gateway = FakeStripe()
+    threading.Thread(target=gateway.serve_forever, daemon=True).start()
+    db = MongoClient(MONGO_URL)[DB_NAME]
+    print(f"🔍 Payment circuit breaker test: threshold {FAILURE_THRESHOLD}, reset after {RESET_SECONDS}s, database {DB_NAME}")
+    backend = None
+
+    try:
+        backend = start_backend(f"http://127.0.0.1:{gateway.server_address[1]}")
+
+        print("🔍 Checkout while the gateway fails...")
+        failing = [checkout() for _ in range(FAILURE_THRESHOLD)]
+        failing_ok = all(status == 503 for status, _ in failing) and gateway.hits == FAILURE_THRESHOLD
+        print(f"   {'✅' if failing_ok else '❌'} {FAILURE_THRESHOLD} checkouts answered {[s for s, _ in failing]}, gateway saw {gateway.hits} calls")
+
+        print("🔍 Checkout with the breaker open...")
+        hits_before = gateway.hits
+        rejected = [checkout() for _ in range(10)]
+        slowest = max(elapsed for _, elapsed in rejected)
+        open_ok = all(status == 503 for status, _ in rejected) and gateway.hits == hits_before
+        print(f"   {'✅' if open_ok else '❌'} 10 checkouts answered {sorted(set(s for s, _ in rejected))}, "
+              f"gateway saw {gateway.hits - hits_before} calls, slowest {slowest * 1000:.0f}ms")
+
+        print("🔍 Checkout after the gateway recovers...")
+        gateway.healthy = True
+        time.sleep(RESET_SECONDS + 0.5)
+        recovered = [checkout() for _ in range(3)]
+        closed_ok = all(status == 200 for status, _ in recovered)
+        print(f"   {'✅' if closed_ok else '❌'} Checkouts after {RESET_SECONDS}s answered {[s for s, _ in recovered]}")
+    finally:
+        if backend is not None and backend.poll() is None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        gateway.shutdown()
+        if os.environ.get("KEEP_DB", "false").lower() != "true":
+            db.client.drop_database(DB_NAME)
+
+    if failing_ok and open_ok and closed_ok:
+        print("🎉 PAYMENT CIRCUIT BREAKER TEST PASSED")
+        return 0
+    print("⚠️  PAYMENT CIRCUIT BREAKER TEST FAILED")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
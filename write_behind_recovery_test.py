@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Write-Behind Recovery Test
+Starts its own backend with WRITE_BEHIND_ENABLED=true, kills it with SIGKILL in the
+middle of a burst of public form submissions (while batches are being flushed), starts
+it again and checks that every acknowledged submission reaches MongoDB exactly once,
+together with exactly one notification task per contact message. A second burst ends
+with a graceful shutdown to check that the drain on shutdown loses nothing either.
+
+Needs a reachable MongoDB and the backend's requirements installed. The test uses a
+throwaway database (dropped at the end unless KEEP_DB=true) and its own journal dir.
+
+Usage: python write_behind_recovery_test.py [submissions] [workers]
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from pymongo import MongoClient
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("TEST_DB_NAME", f"write_behind_test_{uuid.uuid4().hex[:8]}")
+BACKEND_PORT = int(os.environ.get("BACKEND_PORT", "8011"))
+BACKEND_URL = f"http://127.0.0.1:{BACKEND_PORT}/api"
+BACKEND_DIR = Path(__file__).resolve().parent / "backend"
+JOURNAL_DIR = Path(tempfile.mkdtemp(prefix="write_behind_journal_"))
+
+def start_backend():
+    env = {
+        **os.environ,
+        "MONGO_URL": MONGO_URL,
+        "DB_NAME": DB_NAME,
+        "WRITE_BEHIND_ENABLED": "true",
+        "WRITE_BEHIND_JOURNAL_DIR": str(JOURNAL_DIR),
+        # Small, frequent batches so the kill lands while flushes are in progress
+        "WRITE_BEHIND_BATCH_SIZE": "25",
+        "WRITE_BEHIND_FLUSH_SECONDS": "0.05",
+        "RATE_LIMIT_ENABLED": "false",  # every submission comes from this one client
+        "TASK_WORKERS_ENABLED": "false",  # leave notification tasks in `tasks` to be counted
+        "SMTP_HOST": "",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(BACKEND_PORT)],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with code {process.returncode}")
+        try:
+            if requests.get(f"{BACKEND_URL}/brands", timeout=2).status_code == 200:
+                return process
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Backend did not become ready within 60s")
+
+def submit(i, session):
+    if i % 2:
+        collection, path = "contact_messages", "contact"
+        payload = {"name": f"Visitor {i}", "email": f"visitor{i}@loadtest.example.com", "subject": "Hello", "message": f"Message {i}", "brand_id": "load-test"}
+    else:
+        collection, path = "prayer_requests", "prayer-requests"
+        payload = {"name": f"Visitor {i}", "request": f"Prayer {i}", "brand_id": "load-test"}
+    try:
+        response = session.post(f"{BACKEND_URL}/{path}", json=payload, timeout=30)
+    except requests.RequestException:
+        return collection, None  # cut off by the kill; not acknowledged
+    return collection, response.json()["id"] if response.status_code == 200 else None
+
+def burst(submissions, workers, stop_backend=None, stop_after=None):
+    """Submit in parallel; call stop_backend once stop_after responses came back. Returns acknowledged ids per collection."""
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+    done = {"n": 0}
+    lock = threading.Lock()
+
+    def run(i):
+        result = submit(i, session)
+        with lock:
+            done["n"] += 1
+            if stop_backend and done["n"] == stop_after:
+                stop_backend()
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(run, range(submissions)))
+    acknowledged = {"contact_messages": set(), "prayer_requests": set()}
+    for collection, doc_id in results:
+        if doc_id:
+            acknowledged[collection].add(doc_id)
+    return acknowledged
+
+def wait_until_stored(db, acknowledged, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(db[c].count_documents({"id": {"$in": list(ids)}}) == len(ids) for c, ids in acknowledged.items()):
+            return True
+        time.sleep(0.5)
+    return False
+
+def check_exactly_once(db, acknowledged):
+    ok = True
+    for collection, ids in acknowledged.items():
+        stored = db[collection].count_documents({"id": {"$in": list(ids)}})
+        duplicates = list(db[collection].aggregate([
+            {"$group": {"_id": "$id", "n": {"$sum": 1}}}, {"$match": {"n": {"$gt": 1}}}
+        ]))
+        print(f"   {collection}: {stored}/{len(ids)} acknowledged stored, {len(duplicates)} duplicated ids")
+        if stored != len(ids) or duplicates:
+            ok = False
+    message_ids = list(acknowledged["contact_messages"])
+    tasks = db.tasks.count_documents({"name": "notify_admins_of_contact_message", "payload.message_id": {"$in": message_ids}})
+    task_duplicates = list(db.tasks.aggregate([
+        {"$match": {"name": "notify_admins_of_contact_message"}},
+        {"$group": {"_id": "$payload.message_id", "n": {"$sum": 1}}}, {"$match": {"n": {"$gt": 1}}}
+    ]))
+    print(f"   notification tasks: {tasks}/{len(message_ids)}, {len(task_duplicates)} duplicated")
+    if tasks != len(message_ids) or task_duplicates:
+        ok = False
+    print(f"   {'✅' if ok else '❌'} Every acknowledged submission stored exactly once")
+    return ok
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    db = MongoClient(MONGO_URL)[DB_NAME]
+    print(f"🔍 Write-behind recovery test: {submissions} submissions per burst, {workers} workers, database {DB_NAME}")
+
+    try:
+        print("🔍 Killing the backend mid-flush...")
+        backend = start_backend()
+        crashed = burst(submissions, workers, stop_backend=backend.kill, stop_after=submissions // 2)
+        backend.wait()
+        segments = sorted(p.name for p in JOURNAL_DIR.rglob("*.jsonl"))
+        print(f"   Acknowledged before the kill: {sum(len(ids) for ids in crashed.values())}, journal segments left: {len(segments)}")
+
+        print("🔍 Restarting to replay the journal...")
+        backend = start_backend()
+        replayed = wait_until_stored(db, crashed)
+        print(f"   {'✅' if replayed else '❌'} Journal replayed after restart")
+        crash_ok = check_exactly_once(db, crashed)
+
+        print("🔍 Stopping the backend gracefully mid-burst...")
+        drained = burst(submissions, workers, stop_backend=lambda: backend.send_signal(signal.SIGTERM), stop_after=submissions // 2)
+        backend.wait(timeout=60)
+        acknowledged = {c: crashed[c] | drained[c] for c in crashed}
+        drain_ok = check_exactly_once(db, acknowledged)
+        leftover = list(JOURNAL_DIR.rglob("*.jsonl"))
+        print(f"   {'✅' if not leftover else '❌'} Journal empty after the drain ({len(leftover)} segments left)")
+    finally:
+        if "backend" in locals() and backend.poll() is None:
+            backend.kill()
+        if os.environ.get("KEEP_DB", "false").lower() != "true":
+            db.client.drop_database(DB_NAME)
+
+    if replayed and crash_ok and drain_ok and not leftover:
+        print("🎉 WRITE-BEHIND RECOVERY TEST PASSED")
+        return 0
+    print("⚠️  WRITE-BEHIND RECOVERY TEST FAILED")
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())